@@ -18,6 +18,7 @@ CREATE TABLE IF NOT EXISTS users (
 -- Индексы для users
 CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id);
 CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
+CREATE INDEX IF NOT EXISTS idx_users_phone ON users(phone);
 
 -- =====================================================
 -- 2. Таблица services - услуги
@@ -77,8 +78,10 @@ CREATE INDEX IF NOT EXISTS idx_calendar_events_owner_date ON calendar_events(own
 -- =====================================================
 -- 5. Таблица bookings - записи клиентов
 -- =====================================================
+-- Секционирование по месяцам booking_date (bookings_YYYY_MM, даты вне секций - в bookings_default).
+-- Первичный ключ обязан включать ключ секционирования; уникальность id даёт последовательность
 CREATE TABLE IF NOT EXISTS bookings (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     client_id INTEGER NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
     service_id INTEGER NOT NULL REFERENCES services(id) ON DELETE CASCADE,
     owner_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
@@ -88,14 +91,86 @@ CREATE TABLE IF NOT EXISTS bookings (
     end_time TIME NOT NULL,
     status VARCHAR(50) NOT NULL DEFAULT 'pending',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, booking_date)
+) PARTITION BY RANGE (booking_date);
+
+CREATE TABLE IF NOT EXISTS bookings_default PARTITION OF bookings DEFAULT;
+
+-- Секции по месяцам на период [from_date, to_date]; строки этих месяцев из bookings_default переносятся.
+-- Вызывается из send_reminders бота на BOOKING_PARTITIONS_AHEAD месяцев вперёд
+CREATE OR REPLACE FUNCTION create_bookings_partitions(from_date DATE, to_date DATE) RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_date)::DATE;
+    month_end DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    -- Параллельные вызовы создают секции по очереди, а не падают на "relation already exists"
+    PERFORM pg_advisory_xact_lock(hashtext('create_bookings_partitions'));
+    WHILE month_start <= to_date LOOP
+        month_end := (month_start + INTERVAL '1 month')::DATE;
+        partition_name := 'bookings_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            IF EXISTS (SELECT 1 FROM bookings_default WHERE booking_date >= month_start AND booking_date < month_end) THEN
+                -- Пока в bookings_default есть строки месяца, секцию под него не создать: переносим их
+                ALTER TABLE bookings DETACH PARTITION bookings_default;
+                EXECUTE format('CREATE TABLE %I PARTITION OF bookings FOR VALUES FROM (%L) TO (%L)',
+                               partition_name, month_start, month_end);
+                EXECUTE format('WITH moved AS (DELETE FROM bookings_default WHERE booking_date >= %L AND booking_date < %L RETURNING *) '
+                               'INSERT INTO %I SELECT * FROM moved', month_start, month_end, partition_name);
+                ALTER TABLE bookings ATTACH PARTITION bookings_default DEFAULT;
+            ELSE
+                EXECUTE format('CREATE TABLE %I PARTITION OF bookings FOR VALUES FROM (%L) TO (%L)',
+                               partition_name, month_start, month_end);
+            END IF;
+            created := created + 1;
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Отсоединение секций целиком старше before_date (удаление старых месяцев без DELETE).
+-- Отсоединённые таблицы остаются под своими именами - архивировать или DROP TABLE по их списку
+CREATE OR REPLACE FUNCTION detach_bookings_partitions(before_date DATE) RETURNS SETOF TEXT AS $$
+DECLARE
+    partition_name TEXT;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'bookings'::regclass
+        AND c.relname ~ '^bookings_\d{4}_\d{2}$'
+        AND (to_date(substring(c.relname FROM 10), 'YYYY_MM') + INTERVAL '1 month')::DATE <= before_date
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('DELETE FROM reminders WHERE booking_id IN (SELECT id FROM %I)', partition_name);
+        EXECUTE format('INSERT INTO calendar_versions (owner_id, day, version) '
+                       'SELECT owner_id, booking_date, nextval(''calendar_version_seq'') '
+                       'FROM (SELECT DISTINCT owner_id, booking_date FROM %I) days '
+                       'ON CONFLICT (owner_id, day) DO UPDATE SET version = EXCLUDED.version', partition_name);
+        EXECUTE format('ALTER TABLE bookings DETACH PARTITION %I', partition_name);
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_bookings_partitions(CURRENT_DATE, (CURRENT_DATE + INTERVAL '6 months')::DATE);
 
--- Индексы для bookings
+-- Индексы для bookings (объявлены на таблице, создаются в каждой секции)
 CREATE INDEX IF NOT EXISTS idx_bookings_client ON bookings(client_id);
-CREATE INDEX IF NOT EXISTS idx_bookings_owner ON bookings(owner_id);
-CREATE INDEX IF NOT EXISTS idx_bookings_date ON bookings(booking_date);
 CREATE INDEX IF NOT EXISTS idx_bookings_owner_date ON bookings(owner_id, booking_date);
+CREATE INDEX IF NOT EXISTS idx_bookings_service ON bookings(service_id);
+CREATE INDEX IF NOT EXISTS idx_bookings_event ON bookings(event_id) WHERE event_id IS NOT NULL;
+-- Частичные индексы по статусу: /pending, напоминания и конфликты, свободные слоты
+CREATE INDEX IF NOT EXISTS idx_bookings_pending ON bookings(owner_id, booking_date, start_time)
+    WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_bookings_confirmed ON bookings(owner_id, booking_date, start_time)
+    WHERE status = 'confirmed';
+CREATE INDEX IF NOT EXISTS idx_bookings_active ON bookings(owner_id, booking_date, start_time)
+    WHERE status <> 'cancelled';
 
 -- =====================================================
 -- 6. Таблица week_schedule - расписание учёбы
@@ -143,6 +218,154 @@ CREATE TABLE IF NOT EXISTS settings (
 -- Индексы для settings
 CREATE INDEX IF NOT EXISTS idx_settings_owner ON settings(owner_id);
 
+-- =====================================================
+-- 9. Таблица reminders - очередь напоминаний клиентам
+-- =====================================================
+CREATE TABLE IF NOT EXISTS reminders (
+    id SERIAL PRIMARY KEY,
+    -- Внешний ключ на секционированную bookings(id) невозможен - удаление записи чистит триггер ниже
+    booking_id INTEGER NOT NULL UNIQUE,
+    owner_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    due_at TIMESTAMP NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sent', 'skipped', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    sent_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Индексы для reminders
+CREATE INDEX IF NOT EXISTS idx_reminders_due ON reminders(due_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_reminders_owner ON reminders(owner_id);
+
+-- Замена ON DELETE CASCADE: перенос записи в другой месяц - это DELETE + INSERT, напоминание остаётся
+CREATE OR REPLACE FUNCTION delete_booking_reminders() RETURNS TRIGGER AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM reminders WHERE booking_id = OLD.id)
+       AND NOT EXISTS (SELECT 1 FROM bookings WHERE id = OLD.id) THEN
+        DELETE FROM reminders WHERE booking_id = OLD.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bookings_delete_reminders ON bookings;
+CREATE TRIGGER bookings_delete_reminders AFTER DELETE ON bookings
+    FOR EACH ROW EXECUTE FUNCTION delete_booking_reminders();
+
+-- =====================================================
+-- 10. Таблица telegram_dead_letters - недоставленные сообщения бота
+-- =====================================================
+CREATE TABLE IF NOT EXISTS telegram_dead_letters (
+    id SERIAL PRIMARY KEY,
+    chat_id BIGINT,
+    method VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Индексы для telegram_dead_letters
+CREATE INDEX IF NOT EXISTS idx_telegram_dead_letters_created ON telegram_dead_letters(created_at);
+CREATE INDEX IF NOT EXISTS idx_telegram_dead_letters_chat ON telegram_dead_letters(chat_id);
+
+-- =====================================================
+-- 11. Таблица processed_updates - журнал обработанных обновлений Telegram
+-- =====================================================
+CREATE TABLE IF NOT EXISTS processed_updates (
+    update_id BIGINT PRIMARY KEY,
+    processed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP
+);
+
+-- Индексы для processed_updates
+CREATE INDEX IF NOT EXISTS idx_processed_updates_processed_at ON processed_updates(processed_at);
+
+-- =====================================================
+-- 12. Таблица calendar_versions - версии дней календаря для кэша повестки бота
+-- =====================================================
+CREATE SEQUENCE IF NOT EXISTS calendar_version_seq;
+
+CREATE TABLE IF NOT EXISTS calendar_versions (
+    owner_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    version BIGINT NOT NULL,
+    PRIMARY KEY (owner_id, day)
+);
+
+-- Запись, мероприятие или блокировка меняют свой день (при переносе - оба дня).
+-- Без аргумента триггера (расписание учёбы, услуги) меняется версия владельца целиком - день '-infinity'
+CREATE OR REPLACE FUNCTION touch_calendar_version() RETURNS TRIGGER AS $$
+DECLARE
+    row_data JSONB;
+BEGIN
+    FOREACH row_data IN ARRAY ARRAY[
+        CASE WHEN TG_OP <> 'INSERT' THEN to_jsonb(OLD) END,
+        CASE WHEN TG_OP <> 'DELETE' THEN to_jsonb(NEW) END
+    ] LOOP
+        CONTINUE WHEN row_data IS NULL;
+        INSERT INTO calendar_versions (owner_id, day, version)
+        VALUES (
+            (row_data->>'owner_id')::INTEGER,
+            CASE WHEN TG_NARGS > 0 THEN (row_data->>TG_ARGV[0])::DATE ELSE '-infinity'::DATE END,
+            nextval('calendar_version_seq')
+        )
+        ON CONFLICT (owner_id, day) DO UPDATE SET version = EXCLUDED.version;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Имя и телефон клиента выводятся в повестке всех владельцев, у которых он клиент
+CREATE OR REPLACE FUNCTION touch_calendar_version_for_user() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO calendar_versions (owner_id, day, version)
+    SELECT owners.owner_id, '-infinity'::DATE, nextval('calendar_version_seq')
+    FROM (SELECT DISTINCT owner_id FROM clients WHERE user_id = NEW.id) owners
+    ON CONFLICT (owner_id, day) DO UPDATE SET version = EXCLUDED.version;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bookings_calendar_version ON bookings;
+CREATE TRIGGER bookings_calendar_version AFTER INSERT OR UPDATE OR DELETE ON bookings
+    FOR EACH ROW EXECUTE FUNCTION touch_calendar_version('booking_date');
+
+DROP TRIGGER IF EXISTS calendar_events_calendar_version ON calendar_events;
+CREATE TRIGGER calendar_events_calendar_version AFTER INSERT OR UPDATE OR DELETE ON calendar_events
+    FOR EACH ROW EXECUTE FUNCTION touch_calendar_version('event_date');
+
+DROP TRIGGER IF EXISTS blocked_dates_calendar_version ON blocked_dates;
+CREATE TRIGGER blocked_dates_calendar_version AFTER INSERT OR UPDATE OR DELETE ON blocked_dates
+    FOR EACH ROW EXECUTE FUNCTION touch_calendar_version('blocked_date');
+
+DROP TRIGGER IF EXISTS week_schedule_calendar_version ON week_schedule;
+CREATE TRIGGER week_schedule_calendar_version AFTER INSERT OR UPDATE OR DELETE ON week_schedule
+    FOR EACH ROW EXECUTE FUNCTION touch_calendar_version();
+
+DROP TRIGGER IF EXISTS services_calendar_version ON services;
+CREATE TRIGGER services_calendar_version AFTER UPDATE OR DELETE ON services
+    FOR EACH ROW EXECUTE FUNCTION touch_calendar_version();
+
+DROP TRIGGER IF EXISTS users_calendar_version ON users;
+CREATE TRIGGER users_calendar_version AFTER UPDATE OF name, phone ON users
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name OR OLD.phone IS DISTINCT FROM NEW.phone)
+    EXECUTE FUNCTION touch_calendar_version_for_user();
+
+-- =====================================================
+-- 13. Таблица auth_rate_limits - общий лимит попыток входа (RATE_LIMIT_BACKEND=postgres)
+-- =====================================================
+CREATE UNLOGGED TABLE IF NOT EXISTS auth_rate_limits (
+    key VARCHAR(64) PRIMARY KEY,
+    window_start BIGINT NOT NULL,
+    current_count INTEGER NOT NULL,
+    previous_count INTEGER NOT NULL,
+    allowed BOOLEAN NOT NULL
+);
+
+-- Индексы для auth_rate_limits
+CREATE INDEX IF NOT EXISTS idx_auth_rate_limits_window ON auth_rate_limits(window_start);
+
 -- =====================================================
 -- КОНЕЦ МИГРАЦИИ
 -- =====================================================
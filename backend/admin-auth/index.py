@@ -1,14 +1,99 @@
 '''
 Business: Проверка доступа к админ-панели владельца по groupId
 Args: event с queryStringParameters (groupId)
-Returns: Статус доступа (authorized/unauthorized)
+Returns: Статус доступа (authorized/unauthorized) и подписанный токен для api, если задан AUTH_TOKEN_SECRET
 '''
 
 import json
 import os
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List, Optional
+
+# ==== Токен сессии: блок одинаков в auth/index.py и admin-auth/index.py ====
+# Функции деплоятся по отдельности и общих модулей не имеют; scripts/run_backend_tests.py сверяет копии.
+# Токен проверяет verify_token в api/index.py
+AUTH_TOKEN_TTL = 12 * 3600  # Секунды; переопределяется AUTH_TOKEN_TTL
+
+def b64url(data: bytes) -> str:
+    import base64
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def issue_token(telegram_id: str, role: str) -> Optional[Dict[str, Any]]:
+    '''
+    Компактный токен: base64url(JSON payload) + '.' + base64url(HMAC-SHA256 этой части).
+    api проверяет его в процессе тем же AUTH_TOKEN_SECRET. None, если секрет не задан
+    '''
+    secret = os.environ.get('AUTH_TOKEN_SECRET', '')
+    if not secret:
+        return None
+    import hashlib
+    import hmac
+    
+    expires_at = int(time.time()) + int(os.environ.get('AUTH_TOKEN_TTL') or AUTH_TOKEN_TTL)
+    payload = {
+        'telegram_id': telegram_id,
+        'role': role,
+        'owner_id': int(os.environ.get('OWNER_USER_ID') or 1),
+        'exp': expires_at
+    }
+    body = b64url(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    signature = hmac.new(secret.encode('utf-8'), body.encode('ascii'), hashlib.sha256).digest()
+    return {'token': f'{body}.{b64url(signature)}', 'expiresAt': expires_at}
+# ==== Конец блока токена сессии ====
+
+FUNCTION_NAME = 'admin-auth'
+
+# Первый вызов после загрузки модуля - холодный старт инстанса
+_cold_start = True
+
+def log_invocation(event: Dict[str, Any], context: Any, response: Dict[str, Any], started: float,
+                   errors: Optional[List[str]] = None) -> None:
+    '''Одна JSON-строка на вызов в том же формате, что у api и telegram-bot (без БД поля нулевые)'''
+    global _cold_start
+    body = response.get('body') or ''
+    total_ms = round((time.perf_counter() - started) * 1000, 2)
+    record = {
+        'type': 'invocation',
+        'ts': round(time.time(), 3),
+        'function': FUNCTION_NAME,
+        'requestId': getattr(context, 'request_id', None),
+        'resource': None,
+        'action': None,
+        'method': event.get('httpMethod'),
+        'coldStart': _cold_start,
+        'status': response.get('statusCode'),
+        'responseBytes': len(body.encode('utf-8')),
+        'queries': 0,
+        'rows': 0,
+        'connectMs': 0.0,
+        'dbMs': 0.0,
+        'serializeMs': 0.0,
+        'httpCalls': 0,
+        'httpMs': 0.0,
+        'appMs': total_ms,
+        'totalMs': total_ms,
+        'errors': errors or []
+    }
+    _cold_start = False
+    print(json.dumps(record, ensure_ascii=False))
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    started = time.perf_counter()
+    errors: List[str] = []
+    try:
+        response = handle_request(event)
+    except Exception as e:
+        errors.append(f'{type(e).__name__}: {e}')
+        response = {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    log_invocation(event, context, response, started, errors)
+    return response
+
+def handle_request(event: Dict[str, Any]) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     # Handle CORS OPTIONS request
@@ -57,10 +142,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     # Проверяем совпадение groupId
     if str(group_id) == str(allowed_group_id):
+        result: Dict[str, Any] = {'authorized': True}
+        token = issue_token(str(group_id), 'owner')
+        if token:
+            result.update(token)
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'authorized': True}),
+            'body': json.dumps(result),
             'isBase64Encoded': False
         }
     else:
@@ -4,14 +4,448 @@ Args: event с httpMethod, body, queryStringParameters, pathParams; context с r
 Returns: HTTP response с данными в зависимости от resource
 '''
 
+import datetime
 import json
 import os
-from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import urllib.request
+import sys
+import time
+from functools import lru_cache
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+# Тяжёлые модули загружаются лениво, чтобы не платить за них на холодном старте:
+# psycopg2 - при первом подключении к БД (OPTIONS его не трогает),
+# urllib.request - только при отправке уведомления о новой записи
+psycopg2 = None
+RealDictCursor = None
+
+def load_db_driver() -> None:
+    global psycopg2, RealDictCursor
+    if psycopg2 is None:
+        # psycopg2 публикуем последним: параллельный поток, увидевший его, уже видит и RealDictCursor
+        import psycopg2.extras as extras
+        RealDictCursor = extras.RealDictCursor
+        psycopg2 = sys.modules['psycopg2']
+
+class RequestMetrics:
+    '''Счётчики одного запроса: подключение, SQL, сериализация и исходящие HTTP-вызовы'''
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.rows = 0
+        self.db_ms = 0.0
+        self.connect_ms = 0.0
+        self.serialize_ms = 0.0
+        self.http_calls = 0
+        self.http_ms = 0.0
+        self.db_target: Optional[str] = None
+        self.resource: Optional[str] = None
+        self.action: Optional[str] = None
+        self.errors: List[str] = []
+    
+    def dumps(self, data: Any) -> str:
+        started = time.perf_counter()
+        try:
+            return json.dumps(data)
+        finally:
+            self.serialize_ms += (time.perf_counter() - started) * 1000
+    
+    def as_dict(self) -> Dict[str, Any]:
+        total_ms = (time.perf_counter() - self.started) * 1000
+        app_ms = max(total_ms - self.connect_ms - self.db_ms - self.serialize_ms - self.http_ms, 0.0)
+        return {
+            'queries': self.queries,
+            'rows': self.rows,
+            'dbTarget': self.db_target,
+            'connectMs': round(self.connect_ms, 2),
+            'dbMs': round(self.db_ms, 2),
+            'serializeMs': round(self.serialize_ms, 2),
+            'httpCalls': self.http_calls,
+            'httpMs': round(self.http_ms, 2),
+            'appMs': round(app_ms, 2),
+            'totalMs': round(total_ms, 2)
+        }
+    
+    def server_timing(self) -> str:
+        m = self.as_dict()
+        return ', '.join([
+            f'connect;dur={m["connectMs"]}',
+            f'db;dur={m["dbMs"]};desc="{m["queries"]} queries, {m["rows"]} rows, {m["dbTarget"]}"',
+            f'serialize;dur={m["serializeMs"]}',
+            f'http;dur={m["httpMs"]};desc="{m["httpCalls"]} calls"',
+            f'app;dur={m["appMs"]}',
+            f'total;dur={m["totalMs"]}'
+        ])
+
+class InstrumentedCursor:
+    '''Обёртка курсора: время execute/fetch и число строк идут в RequestMetrics'''
+    
+    def __init__(self, cursor, metrics: RequestMetrics):
+        self._cursor = cursor
+        self._metrics = metrics
+    
+    def execute(self, query, params=None):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params)
+        finally:
+            self._metrics.queries += 1
+            self._metrics.db_ms += (time.perf_counter() - started) * 1000
+    
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._metrics.db_ms += (time.perf_counter() - started) * 1000
+        if row is not None:
+            self._metrics.rows += 1
+        return row
+    
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._metrics.db_ms += (time.perf_counter() - started) * 1000
+        self._metrics.rows += len(rows)
+        return rows
+    
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return self._cursor.__exit__(exc_type, exc, tb)
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class InstrumentedConnection:
+    def __init__(self, conn, metrics: RequestMetrics, pool: Any = None):
+        self._conn = conn
+        self.metrics = metrics
+        self.pool = pool
+    
+    def cursor(self, *args, **kwargs) -> InstrumentedCursor:
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self.metrics)
+    
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return self._conn.commit()
+        finally:
+            self.metrics.db_ms += (time.perf_counter() - started) * 1000
+    
+    def close(self):
+        if self.pool is None:
+            return self._conn.close()
+        # Соединение из пула возвращаем без незавершённой транзакции; разорванное пул закроет
+        if not self._conn.closed:
+            try:
+                self._conn.rollback()
+            except psycopg2.Error:
+                pass
+        self.pool.putconn(self._conn, close=bool(self._conn.closed))
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+# Подставляются единым процессом (backend/server.py): общий с ботом пул соединений к primary
+# и вызов handler бота вместо HTTPS-запроса. В обычном деплое функции оба None
+db_pool: Any = None
+booking_notifier: Optional[Callable[[bytes], None]] = None
+
+# GET этих ресурсов можно обслуживать с реплики (DATABASE_READ_URL), остальное - только primary
+READ_REPLICA_RESOURCES = {'services', 'booking_data', 'available_slots', 'week_schedule', 'blocked_dates', 'admin_data'}
+
+REPLICA_LAG_CHECK_INTERVAL = 5.0
+
+REPLICA_LAG_QUERY = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+'''
+
+# Последний замер отставания реплики; живёт между тёплыми вызовами
+_replica_lag = {'checked_at': 0.0, 'seconds': 0.0}
+
+def replica_max_staleness() -> float:
+    '''Допустимое отставание реплики и окно read-your-writes после записи клиента, секунд'''
+    return float(os.environ.get('DATABASE_READ_MAX_STALENESS', '5'))
+
+def wants_replica(event: Dict[str, Any], method: str, resource: str) -> bool:
+    if method != 'GET' or resource not in READ_REPLICA_RESOURCES or not os.environ.get('DATABASE_READ_URL'):
+        return False
+    
+    # Клиент, недавно писавший данные, должен увидеть свои изменения - читаем с primary
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    last_write_at = headers.get('x-last-write-at')
+    if last_write_at:
+        try:
+            if time.time() - float(last_write_at) < replica_max_staleness():
+                return False
+        except ValueError:
+            pass
+    
+    return True
+
+def connect_replica(metrics: RequestMetrics) -> Optional[InstrumentedConnection]:
+    '''Подключение к реплике или None, если она недоступна либо отстаёт сильнее допустимого'''
+    started = time.perf_counter()
+    load_db_driver()
+    try:
+        conn = psycopg2.connect(os.environ.get('DATABASE_READ_URL'), connect_timeout=2)
+    except psycopg2.OperationalError as e:
+        metrics.errors.append(f'Read replica unavailable: {e}')
+        return None
+    finally:
+        metrics.connect_ms += (time.perf_counter() - started) * 1000
+    
+    replica = InstrumentedConnection(conn, metrics)
+    now = time.monotonic()
+    if now - _replica_lag['checked_at'] > REPLICA_LAG_CHECK_INTERVAL:
+        try:
+            with replica.cursor() as cur:
+                cur.execute(REPLICA_LAG_QUERY)
+                _replica_lag['seconds'] = float(cur.fetchone()[0])
+        except psycopg2.Error as e:
+            # Реплика приняла соединение, но не отвечает на запрос - читаем с основной базы
+            conn.close()
+            metrics.errors.append(f'Read replica lag check failed: {e}')
+            return None
+        _replica_lag['checked_at'] = now
+    
+    if _replica_lag['seconds'] > replica_max_staleness():
+        conn.close()
+        return None
+    
+    return replica
+
+def connect_db(metrics: RequestMetrics, read_only: bool = False) -> InstrumentedConnection:
+    if read_only:
+        replica = connect_replica(metrics)
+        if replica is not None:
+            metrics.db_target = 'replica'
+            return replica
+    
+    started = time.perf_counter()
+    load_db_driver()
+    pool = db_pool
+    conn = None
+    if pool is not None:
+        try:
+            conn = pool.getconn()
+        except psycopg2.pool.PoolError:
+            pool = None
+    if conn is None:
+        conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
+    metrics.connect_ms += (time.perf_counter() - started) * 1000
+    metrics.db_target = 'primary'
+    return InstrumentedConnection(conn, metrics, pool)
+
+def finalize_response(response: Dict[str, Any], metrics: RequestMetrics, debug: bool) -> Dict[str, Any]:
+    headers = response.setdefault('headers', {})
+    headers['Server-Timing'] = metrics.server_timing()
+    headers['Access-Control-Expose-Headers'] = 'Server-Timing, X-Write-At'
+    
+    # Отладочное поле добавляется только по запросу (?debug=timing), чтобы не менять обычные ответы
+    if debug and response.get('body'):
+        try:
+            body = json.loads(response['body'])
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            body['_timing'] = metrics.as_dict()
+            response['body'] = json.dumps(body)
+    
+    return response
+
+# Постановка напоминаний в очередь: due_at = начало записи минус reminder_hours владельца.
+# Повторное подтверждение не создаёт дублей (booking_id уникален в reminders)
+ENQUEUE_REMINDERS_QUERY = '''
+    INSERT INTO reminders (booking_id, owner_id, due_at)
+    SELECT b.id, b.owner_id, b.booking_date + b.start_time - INTERVAL '1 hour' * s.value::numeric
+    FROM bookings b
+    JOIN settings s ON s.owner_id = b.owner_id AND s.key = 'reminder_hours'
+    WHERE {condition}
+    AND b.status = 'confirmed'
+    AND s.value::numeric > 0
+    ON CONFLICT (booking_id) DO NOTHING
+'''
+
+def enqueue_reminders(cur, booking_ids: List[int]) -> None:
+    cur.execute(ENQUEUE_REMINDERS_QUERY.format(condition='b.id = ANY(%s)'), (booking_ids,))
+
+def requeue_owner_reminders(cur, owner_id: int) -> None:
+    '''Пересчёт неотправленных напоминаний владельца после смены reminder_hours'''
+    cur.execute("DELETE FROM reminders WHERE owner_id = %s AND status = 'pending'", (owner_id,))
+    cur.execute(
+        ENQUEUE_REMINDERS_QUERY.format(condition='b.owner_id = %s AND b.booking_date >= CURRENT_DATE'),
+        (owner_id,)
+    )
+
+FUNCTION_NAME = 'api'
+
+# Первый вызов после загрузки модуля - холодный старт инстанса
+_cold_start = True
+
+# Методы ресурсов, доступные только из админки: с AUTH_TOKEN_SECRET требуют X-Auth-Token.
+# Открыто только то, что нужно публичным страницам записи (Booking.tsx, PublicBooking.tsx):
+# GET booking_data и available_slots, POST clients и bookings. Остальные GET отдают данные админки -
+# записи дня с именами и телефонами клиентов, мероприятия, настройки
+ADMIN_ENDPOINTS = {
+    'admin_data': {'GET'},
+    'clients': {'GET', 'PUT', 'DELETE'},
+    'bookings': {'GET', 'PUT', 'DELETE'},
+    'settings': {'GET', 'PUT'},
+    'services': {'GET', 'POST', 'PUT', 'DELETE'},
+    'week_schedule': {'GET', 'POST', 'PUT', 'DELETE'},
+    'blocked_dates': {'GET', 'POST', 'PUT', 'DELETE'},
+    'events': {'GET', 'POST', 'PUT', 'DELETE'},
+}
+
+# Таблицы ресурсов, строки которых меняются по id: владелец с токеном меняет только свои строки
+OWNED_ROW_TABLES = {
+    'bookings': 'bookings',
+    'events': 'calendar_events',
+    'clients': 'clients',
+    'services': 'services',
+    'week_schedule': 'week_schedule',
+    'blocked_dates': 'blocked_dates',
+}
+
+@lru_cache(maxsize=1)
+def token_signer() -> Any:
+    '''HMAC с ключом AUTH_TOKEN_SECRET, подготовленный один раз на инстанс; на проверку - copy()'''
+    import hashlib
+    import hmac
+    return hmac.new(os.environ['AUTH_TOKEN_SECRET'].encode('utf-8'), digestmod=hashlib.sha256)
+
+def verify_token(token: str) -> Optional[Dict[str, Any]]:
+    '''Payload токена от auth/admin-auth, если подпись верна и срок не истёк; без БД и сетевых вызовов'''
+    import base64
+    import hmac
+    
+    body, _, signature = token.partition('.')
+    if not body or not signature:
+        return None
+    signer = token_signer().copy()
+    signer.update(body.encode('ascii', 'replace'))
+    expected = base64.urlsafe_b64encode(signer.digest()).rstrip(b'=')
+    if not hmac.compare_digest(expected, signature.encode('ascii', 'replace')):
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(body + '=' * (-len(body) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(payload, dict) or payload.get('exp', 0) < time.time():
+        return None
+    return payload
+
+def access_error(status: int, error: str) -> Dict[str, Any]:
+    return {
+        'statusCode': status,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': error}),
+        'isBase64Encoded': False
+    }
+
+def request_body(event: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        body = json.loads(event.get('body') or '{}')
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+def check_admin_access(event: Dict[str, Any], method: str,
+                       resource: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    '''(ответ 401/403 или None, payload токена) для админского запроса; без AUTH_TOKEN_SECRET - (None, None)'''
+    if method not in ADMIN_ENDPOINTS.get(resource, ()) or not os.environ.get('AUTH_TOKEN_SECRET'):
+        return None, None
+    
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    payload = verify_token(headers.get('x-auth-token', ''))
+    if payload is None or payload.get('role') not in ('admin', 'owner'):
+        return access_error(401, 'Unauthorized'), None
+    
+    # Владелец видит и меняет только свои данные; администратор - любого владельца.
+    # owner_id сверяется и в query, и в теле: POST/PUT берут владельца из тела (settings - '1' по умолчанию)
+    if payload['role'] == 'owner':
+        owner_ids = [(event.get('queryStringParameters') or {}).get('owner_id')]
+        if method in ('POST', 'PUT'):
+            body = request_body(event)
+            owner_ids.append(body.get('owner_id', '1' if resource == 'settings' else None))
+        if any(owner_id is not None and str(owner_id) != str(payload.get('owner_id')) for owner_id in owner_ids):
+            return access_error(403, 'Access denied'), payload
+    return None, payload
+
+def check_row_owner(conn, event: Dict[str, Any], method: str, resource: str,
+                    token: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    '''403, если владелец с токеном меняет по id (в query или теле) строку другого владельца'''
+    table = OWNED_ROW_TABLES.get(resource)
+    if token is None or token.get('role') != 'owner' or table is None or method not in ('PUT', 'DELETE'):
+        return None
+    
+    row_ids = []
+    for row_id in ((event.get('queryStringParameters') or {}).get('id'), request_body(event).get('id')):
+        try:
+            row_ids.append(int(row_id))
+        except (TypeError, ValueError):
+            continue
+    if not row_ids:
+        return None
+    
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT DISTINCT owner_id FROM {table} WHERE id = ANY(%s)', (row_ids,))
+        owners = [row[0] for row in cur.fetchall()]
+    if any(str(owner_id) != str(token.get('owner_id')) for owner_id in owners):
+        return access_error(403, 'Access denied')
+    return None
+
+def log_invocation(event: Dict[str, Any], context: Any, response: Dict[str, Any], metrics: RequestMetrics) -> None:
+    '''Одна JSON-строка на вызов; набор полей стабилен для офлайн-агрегации перцентилей'''
+    global _cold_start
+    body = response.get('body') or ''
+    record = {
+        'type': 'invocation',
+        'ts': round(time.time(), 3),
+        'function': FUNCTION_NAME,
+        'requestId': getattr(context, 'request_id', None),
+        'resource': metrics.resource,
+        'action': metrics.action,
+        'method': event.get('httpMethod'),
+        'coldStart': _cold_start,
+        'status': response.get('statusCode'),
+        'responseBytes': len(body.encode('utf-8')) if isinstance(body, str) else len(body),
+        **metrics.as_dict(),
+        'errors': metrics.errors
+    }
+    _cold_start = False
+    print(json.dumps(record, ensure_ascii=False))
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    metrics = RequestMetrics()
+    try:
+        response = route_request(event, metrics)
+    except Exception as e:
+        # Исключение вне обработчиков ресурсов (например, БД недоступна): ответ и строка трейса всё равно нужны
+        metrics.errors.append(f'{type(e).__name__}: {e}')
+        response = {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    
+    # Метка записи по часам сервера: клиент возвращает её в X-Last-Write-At, чтобы читать свои изменения
+    if event.get('httpMethod') in ('POST', 'PUT', 'DELETE') and response.get('statusCode', 500) < 400:
+        response.setdefault('headers', {})['X-Write-At'] = f'{time.time():.3f}'
+    
+    debug = (event.get('queryStringParameters') or {}).get('debug') == 'timing'
+    response = finalize_response(response, metrics, debug)
+    log_invocation(event, context, response, metrics)
+    return response
+
+def route_request(event: Dict[str, Any], metrics: RequestMetrics) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     # Handle CORS OPTIONS request
@@ -21,7 +455,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, X-Last-Write-At',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -30,11 +464,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     # Получаем resource из path или query параметра
     resource = event.get('queryStringParameters', {}).get('resource', 'bookings')
+    metrics.resource = resource
+    
+    denied, token = check_admin_access(event, method, resource)
+    if denied:
+        return denied
     
-    db_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(db_url)
+    conn = connect_db(metrics, read_only=wants_replica(event, method, resource))
     
     try:
+        denied = check_row_owner(conn, event, method, resource, token)
+        if denied:
+            return denied
+        
         # BOOKINGS
         if resource == 'bookings':
             if method == 'GET':
@@ -87,7 +529,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'bookings': result})
+                        'body': metrics.dumps({'bookings': result})
                     }
             
             elif method == 'POST':
@@ -111,6 +553,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     ))
                     
                     booking_id = cur.fetchone()['id']
+                    if body_data.get('status') == 'confirmed':
+                        enqueue_reminders(cur, [booking_id])
                     conn.commit()
                     
                     # Получаем полные данные записи для уведомления
@@ -150,15 +594,24 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                                 'time': booking_data['start_time'].strftime('%H:%M')
                             }
                             
-                            data = json.dumps(notification_payload).encode('utf-8')
-                            req = urllib.request.Request(
-                                telegram_bot_url,
-                                data=data,
-                                headers={'Content-Type': 'application/json'}
-                            )
-                            urllib.request.urlopen(req, timeout=5)
+                            data = metrics.dumps(notification_payload).encode('utf-8')
+                            if booking_notifier is not None:
+                                booking_notifier(data)
+                            else:
+                                import urllib.request
+                                req = urllib.request.Request(
+                                    telegram_bot_url,
+                                    data=data,
+                                    headers={'Content-Type': 'application/json'}
+                                )
+                                http_started = time.perf_counter()
+                                try:
+                                    urllib.request.urlopen(req, timeout=5)
+                                finally:
+                                    metrics.http_calls += 1
+                                    metrics.http_ms += (time.perf_counter() - http_started) * 1000
                         except Exception as e:
-                            print(f'Failed to send Telegram notification: {e}')
+                            metrics.errors.append(f'Failed to send Telegram notification: {e}')
                     
                     return {
                         'statusCode': 201,
@@ -167,7 +620,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'id': booking_id, 'message': 'Booking created'})
+                        'body': metrics.dumps({'id': booking_id, 'message': 'Booking created'})
                     }
             
             elif method == 'PUT':
@@ -181,6 +634,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         WHERE id = %s
                     '''
                     cur.execute(query, (body_data['status'], booking_id))
+                    if body_data['status'] == 'confirmed':
+                        enqueue_reminders(cur, [booking_id])
                     conn.commit()
                     
                     return {
@@ -190,7 +645,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'message': 'Booking updated'})
+                        'body': metrics.dumps({'message': 'Booking updated'})
                     }
         
         # CALENDAR EVENTS
@@ -237,7 +692,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'Access-Control-Allow-Origin': '*'
                     },
                     'isBase64Encoded': False,
-                    'body': json.dumps({'events': result})
+                    'body': metrics.dumps({'events': result})
                 }
             
             elif method == 'POST':
@@ -255,7 +710,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                                 'Access-Control-Allow-Origin': '*'
                             },
                             'isBase64Encoded': False,
-                            'body': json.dumps({
+                            'body': metrics.dumps({
                                 'error': f'Missing required fields: {", ".join(missing)}'
                             })
                         }
@@ -302,7 +757,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                                     'Access-Control-Allow-Origin': '*'
                                 },
                                 'isBase64Encoded': False,
-                                'body': json.dumps({
+                                'body': metrics.dumps({
                                     'conflict': True,
                                     'bookings': conflicts,
                                     'message': 'Событие конфликтует с подтверждёнными записями'
@@ -347,7 +802,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'id': event_id, 'message': 'Event created'})
+                        'body': metrics.dumps({'id': event_id, 'message': 'Event created'})
                     }
                 except Exception as e:
                     import traceback
@@ -360,7 +815,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({
+                        'body': metrics.dumps({
                             'error': f'Server error: {error_msg}',
                             'type': type(e).__name__,
                             'trace': error_trace[:500]
@@ -382,7 +837,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'message': 'Event deleted'})
+                        'body': metrics.dumps({'message': 'Event deleted'})
                     }
         
         # CLIENTS
@@ -419,7 +874,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'clients': result})
+                        'body': metrics.dumps({'clients': result})
                     }
             
             elif method == 'POST':
@@ -487,7 +942,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'id': client_id, 'message': 'Client created or found'})
+                        'body': metrics.dumps({'id': client_id, 'message': 'Client created or found'})
                     }
         
         # SETTINGS
@@ -511,7 +966,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'Access-Control-Allow-Origin': '*'
                     },
                     'isBase64Encoded': False,
-                    'body': json.dumps({'settings': settings})
+                    'body': metrics.dumps({'settings': settings})
                 }
             
             elif method == 'PUT':
@@ -532,6 +987,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             ''',
                             (int(owner_id), key, str(value))
                         )
+                    if 'reminder_hours' in body_data:
+                        requeue_owner_reminders(cur, int(owner_id))
                     conn.commit()
                 
                 return {
@@ -541,7 +998,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'Access-Control-Allow-Origin': '*'
                     },
                     'isBase64Encoded': False,
-                    'body': json.dumps({'message': 'Settings updated'})
+                    'body': metrics.dumps({'message': 'Settings updated'})
                 }
         
         # AVAILABLE SLOTS
@@ -556,7 +1013,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     return {
                         'statusCode': 400,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'owner_id, date, and service_id required'})
+                        'body': metrics.dumps({'error': 'owner_id, date, and service_id required'})
                     }
                 
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
@@ -571,7 +1028,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'statusCode': 200,
                             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                             'isBase64Encoded': False,
-                            'body': json.dumps({'slots': [], 'message': 'Date is blocked'})
+                            'body': metrics.dumps({'slots': [], 'message': 'Date is blocked'})
                         }
                     
                     # Get service duration
@@ -581,7 +1038,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         return {
                             'statusCode': 404,
                             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                            'body': json.dumps({'error': 'Service not found'})
+                            'body': metrics.dumps({'error': 'Service not found'})
                         }
                     
                     duration = service['duration_minutes']
@@ -601,7 +1058,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     total_time_needed = prep_time + duration + buffer_time
                     
                     # Определяем день недели для даты
-                    import datetime
                     date_obj = datetime.datetime.strptime(date, '%Y-%m-%d')
                     day_names = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
                     day_of_week = day_names[date_obj.weekday()]
@@ -620,7 +1076,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     study_periods = []
                     
                     if cycle_row:
-                        cycle_start_date = cycle_row[0]
+                        cycle_start_date = cycle_row['cycle_start_date']
                         
                         # Считаем номер недели
                         days_diff = (date_obj - datetime.datetime.strptime(str(cycle_start_date), '%Y-%m-%d')).days
@@ -642,8 +1098,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     else:
                         study_periods = []
                     
-                    study_periods = cur.fetchall()
-                    
                     # Получаем разовые события на эту дату
                     cur.execute('''
                         SELECT TO_CHAR(start_time, 'HH24:MI') as start_time,
@@ -843,7 +1297,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'isBase64Encoded': False,
-                    'body': json.dumps({'slots': slots})
+                    'body': metrics.dumps({'slots': slots})
                 }
         
         # WEEK SCHEDULE (долгосрочное расписание учёбы)
@@ -855,7 +1309,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     if selected_date:
                         # Если передана дата - возвращаем расписание для конкретной даты
-                        import datetime
                         date_obj = datetime.datetime.strptime(selected_date, '%Y-%m-%d')
                         
                         # Находим актуальный цикл для этой даты
@@ -876,7 +1329,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                                     'Access-Control-Allow-Origin': '*'
                                 },
                                 'isBase64Encoded': False,
-                                'body': json.dumps({'schedule': [], 'cycleStartDate': None, 'weekNumber': None})
+                                'body': metrics.dumps({'schedule': [], 'cycleStartDate': None, 'weekNumber': None})
                             }
                         
                         cycle_start_date = cycle_row['cycle_start_date']
@@ -925,7 +1378,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                                 'Access-Control-Allow-Origin': '*'
                             },
                             'isBase64Encoded': False,
-                            'body': json.dumps({
+                            'body': metrics.dumps({
                                 'schedule': result,
                                 'cycleStartDate': cycle_start_date.strftime('%Y-%m-%d'),
                                 'weekNumber': week_number
@@ -971,7 +1424,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                                 'Access-Control-Allow-Origin': '*'
                             },
                             'isBase64Encoded': False,
-                            'body': json.dumps({'schedule': result})
+                            'body': metrics.dumps({'schedule': result})
                         }
             
             elif method == 'POST':
@@ -1003,7 +1456,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'id': schedule_id, 'message': 'Schedule created'})
+                        'body': metrics.dumps({'id': schedule_id, 'message': 'Schedule created'})
                     }
             
             elif method == 'DELETE':
@@ -1020,7 +1473,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'message': 'Schedule deleted'})
+                        'body': metrics.dumps({'message': 'Schedule deleted'})
                     }
         
         # SERVICES
@@ -1054,7 +1507,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'services': services})
+                        'body': metrics.dumps({'services': services})
                     }
             
             elif method == 'POST':
@@ -1085,7 +1538,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'id': service_id, 'message': 'Service created'})
+                        'body': metrics.dumps({'id': service_id, 'message': 'Service created'})
                     }
             
             elif method == 'PUT':
@@ -1114,7 +1567,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'message': 'Service updated'})
+                        'body': metrics.dumps({'message': 'Service updated'})
                     }
             
             elif method == 'DELETE':
@@ -1131,7 +1584,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'message': 'Service deleted'})
+                        'body': metrics.dumps({'message': 'Service deleted'})
                     }
         
         # BLOCKED DATES (флаги "Занят")
@@ -1162,7 +1615,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'blockedDates': result})
+                        'body': metrics.dumps({'blockedDates': result})
                     }
             
             elif method == 'POST':
@@ -1201,7 +1654,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                                 'Access-Control-Allow-Origin': '*'
                             },
                             'isBase64Encoded': False,
-                            'body': json.dumps({
+                            'body': metrics.dumps({
                                 'conflict': True,
                                 'bookings': conflicts,
                                 'message': 'На эту дату есть подтверждённые записи'
@@ -1234,7 +1687,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'id': blocked_id, 'message': 'Date blocked'})
+                        'body': metrics.dumps({'id': blocked_id, 'message': 'Date blocked'})
                     }
             
             elif method == 'DELETE':
@@ -1251,7 +1704,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({'message': 'Block removed'})
+                        'body': metrics.dumps({'message': 'Block removed'})
                     }
         
         # ADMIN DATA (all data in one request)
@@ -1397,7 +1850,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({
+                        'body': metrics.dumps({
                             'bookings': bookings,
                             'services': services,
                             'clients': clients,
@@ -1410,8 +1863,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 except Exception as e:
                     import traceback
                     error_trace = traceback.format_exc()
-                    print(f"[ERROR] admin_data failed: {str(e)}")
-                    print(f"[ERROR] Traceback: {error_trace}")
+                    metrics.errors.append(f'admin_data failed: {str(e)}\n{error_trace}')
                     return {
                         'statusCode': 500,
                         'headers': {
@@ -1419,7 +1871,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({
+                        'body': metrics.dumps({
                             'error': str(e),
                             'trace': error_trace[:500]
                         })
@@ -1461,7 +1913,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'Access-Control-Allow-Origin': '*'
                         },
                         'isBase64Encoded': False,
-                        'body': json.dumps({
+                        'body': metrics.dumps({
                             'services': services,
                             'settings': settings
                         })
@@ -1471,7 +1923,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 400,
             'headers': {'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Invalid resource or method'})
+            'body': metrics.dumps({'error': 'Invalid resource or method'})
         }
     
     finally:
@@ -1,44 +1,215 @@
 import json
 import os
-from typing import Dict, Any
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
 import time
 
-# Simple in-memory rate limiting (per process)
-rate_limit_storage: Dict[str, list] = {}
 MAX_ATTEMPTS = 5  # Maximum attempts
 TIME_WINDOW = 300  # 5 minutes in seconds
+RATE_LIMIT_MAX_KEYS = 10000  # Keys tracked in memory; least recently seen are evicted first
+RATE_LIMIT_KEY_LENGTH = 64
+RATE_LIMIT_PRUNE_EVERY = 100  # Shared backend: delete idle rows every N checks
 
-def check_rate_limit(telegram_id: str) -> bool:
+class SlidingWindowLimiter:
     '''
-    Check if telegram_id exceeded rate limit
-    Returns True if allowed, False if rate limited
+    Sliding window counter: per key only the current and previous window counts are kept,
+    the previous one weighted by how much of it still overlaps the last TIME_WINDOW seconds.
+    O(1) per check, memory bounded by max_keys (LRU eviction of idle keys).
     '''
-    current_time = time.time()
     
-    if telegram_id not in rate_limit_storage:
-        rate_limit_storage[telegram_id] = []
+    def __init__(self, limit: int, window: int, max_keys: int):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        # key -> [window index, current count, previous count]
+        self.entries: 'OrderedDict[str, List[int]]' = OrderedDict()
+        self.lock = threading.Lock()
     
-    # Remove old attempts outside time window
-    rate_limit_storage[telegram_id] = [
-        attempt_time for attempt_time in rate_limit_storage[telegram_id]
-        if current_time - attempt_time < TIME_WINDOW
-    ]
+    def allow(self, key: str, now: Optional[float] = None) -> bool:
+        window_index, offset = divmod(time.time() if now is None else now, self.window)
+        window_index = int(window_index)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = [window_index, 0, 0]
+                if len(self.entries) > self.max_keys:
+                    self.entries.popitem(last=False)
+            else:
+                self.entries.move_to_end(key)
+            
+            if entry[0] != window_index:
+                entry[2] = entry[1] if entry[0] == window_index - 1 else 0
+                entry[1] = 0
+                entry[0] = window_index
+            
+            # Only allowed attempts are counted, as before
+            if entry[2] * (1 - offset / self.window) + entry[1] >= self.limit:
+                return False
+            entry[1] += 1
+            return True
+
+# Per process instance; RATE_LIMIT_BACKEND=postgres shares limits across instances
+_local_limiter = SlidingWindowLimiter(MAX_ATTEMPTS, TIME_WINDOW, RATE_LIMIT_MAX_KEYS)
+
+# The same sliding window computed atomically in one upsert; %(estimate)s is the weighted count
+# before this attempt, `allowed` records whether this attempt was counted
+SHARED_ESTIMATE = '''
+    (CASE WHEN r.window_start = %(window)s THEN r.previous_count
+          WHEN r.window_start = %(window)s - 1 THEN r.current_count
+          ELSE 0 END) * %(weight)s
+    + (CASE WHEN r.window_start = %(window)s THEN r.current_count ELSE 0 END)
+'''
+SHARED_RATE_LIMIT_QUERY = f'''
+    INSERT INTO auth_rate_limits AS r (key, window_start, current_count, previous_count, allowed)
+    VALUES (%(key)s, %(window)s, 1, 0, true)
+    ON CONFLICT (key) DO UPDATE SET
+        previous_count = CASE WHEN r.window_start = %(window)s THEN r.previous_count
+                              WHEN r.window_start = %(window)s - 1 THEN r.current_count
+                              ELSE 0 END,
+        current_count = (CASE WHEN r.window_start = %(window)s THEN r.current_count ELSE 0 END)
+                        + CASE WHEN {SHARED_ESTIMATE} < %(limit)s THEN 1 ELSE 0 END,
+        allowed = {SHARED_ESTIMATE} < %(limit)s,
+        window_start = %(window)s
+    RETURNING allowed
+'''
+
+_shared_conn = None
+_shared_checks = 0
+
+def check_shared_rate_limit(key: str) -> bool:
+    '''Sliding window in the UNLOGGED auth_rate_limits table (shared by all instances)'''
+    global _shared_conn, _shared_checks
+    import psycopg2
     
-    # Check if exceeded limit
-    if len(rate_limit_storage[telegram_id]) >= MAX_ATTEMPTS:
-        return False
+    if _shared_conn is None or _shared_conn.closed:
+        _shared_conn = psycopg2.connect(os.environ['DATABASE_URL'], connect_timeout=2)
+        _shared_conn.autocommit = True
     
-    # Add current attempt
-    rate_limit_storage[telegram_id].append(current_time)
-    return True
+    window_index, offset = divmod(time.time(), TIME_WINDOW)
+    window_index = int(window_index)
+    with _shared_conn.cursor() as cur:
+        cur.execute(SHARED_RATE_LIMIT_QUERY, {
+            'key': key,
+            'window': window_index,
+            'weight': 1 - offset / TIME_WINDOW,
+            'limit': MAX_ATTEMPTS
+        })
+        allowed = cur.fetchone()[0]
+        
+        _shared_checks += 1
+        if _shared_checks % RATE_LIMIT_PRUNE_EVERY == 0:
+            # Keys idle for two windows no longer affect any decision
+            cur.execute('DELETE FROM auth_rate_limits WHERE window_start < %s', (window_index - 1,))
+    return allowed
+
+def check_rate_limit(telegram_id: str) -> bool:
+    '''
+    Check if telegram_id exceeded rate limit
+    Returns True if allowed, False if rate limited
+    '''
+    global _shared_conn
+    key = telegram_id[:RATE_LIMIT_KEY_LENGTH]
+    if os.environ.get('RATE_LIMIT_BACKEND') == 'postgres':
+        try:
+            return check_shared_rate_limit(key)
+        except Exception as e:
+            # The shared store is down - keep limiting per instance rather than failing logins
+            _shared_conn = None
+            print(json.dumps({'type': 'rate_limit_error', 'error': f'{type(e).__name__}: {e}'}))
+    return _local_limiter.allow(key)
+
+# ==== Токен сессии: блок одинаков в auth/index.py и admin-auth/index.py ====
+# Функции деплоятся по отдельности и общих модулей не имеют; scripts/run_backend_tests.py сверяет копии.
+# Токен проверяет verify_token в api/index.py
+AUTH_TOKEN_TTL = 12 * 3600  # Секунды; переопределяется AUTH_TOKEN_TTL
+
+def b64url(data: bytes) -> str:
+    import base64
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def issue_token(telegram_id: str, role: str) -> Optional[Dict[str, Any]]:
+    '''
+    Компактный токен: base64url(JSON payload) + '.' + base64url(HMAC-SHA256 этой части).
+    api проверяет его в процессе тем же AUTH_TOKEN_SECRET. None, если секрет не задан
+    '''
+    secret = os.environ.get('AUTH_TOKEN_SECRET', '')
+    if not secret:
+        return None
+    import hashlib
+    import hmac
+    
+    expires_at = int(time.time()) + int(os.environ.get('AUTH_TOKEN_TTL') or AUTH_TOKEN_TTL)
+    payload = {
+        'telegram_id': telegram_id,
+        'role': role,
+        'owner_id': int(os.environ.get('OWNER_USER_ID') or 1),
+        'exp': expires_at
+    }
+    body = b64url(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    signature = hmac.new(secret.encode('utf-8'), body.encode('ascii'), hashlib.sha256).digest()
+    return {'token': f'{body}.{b64url(signature)}', 'expiresAt': expires_at}
+# ==== Конец блока токена сессии ====
+
+FUNCTION_NAME = 'auth'
+
+# Первый вызов после загрузки модуля - холодный старт инстанса
+_cold_start = True
+
+def log_invocation(event: Dict[str, Any], context: Any, response: Dict[str, Any], started: float,
+                   errors: Optional[List[str]] = None) -> None:
+    '''Одна JSON-строка на вызов в том же формате, что у api и telegram-bot (без БД поля нулевые)'''
+    global _cold_start
+    body = response.get('body') or ''
+    total_ms = round((time.perf_counter() - started) * 1000, 2)
+    record = {
+        'type': 'invocation',
+        'ts': round(time.time(), 3),
+        'function': FUNCTION_NAME,
+        'requestId': getattr(context, 'request_id', None),
+        'resource': None,
+        'action': None,
+        'method': event.get('httpMethod'),
+        'coldStart': _cold_start,
+        'status': response.get('statusCode'),
+        'responseBytes': len(body.encode('utf-8')),
+        'queries': 0,
+        'rows': 0,
+        'connectMs': 0.0,
+        'dbMs': 0.0,
+        'serializeMs': 0.0,
+        'httpCalls': 0,
+        'httpMs': 0.0,
+        'appMs': total_ms,
+        'totalMs': total_ms,
+        'errors': errors or []
+    }
+    _cold_start = False
+    print(json.dumps(record, ensure_ascii=False))
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Authenticate user by Telegram ID using environment variables
     Args: event with httpMethod, queryStringParameters (telegram_id)
-    Returns: User data with role (admin or owner)
-    Security: Rate limited, no database queries, server-side validation only
+    Returns: User data with role (admin or owner) and a signed token when AUTH_TOKEN_SECRET is set
+    Security: Rate limited (in memory, or shared via Postgres with RATE_LIMIT_BACKEND=postgres), server-side validation only
     '''
+    started = time.perf_counter()
+    errors: List[str] = []
+    try:
+        response = handle_request(event)
+    except Exception as e:
+        errors.append(f'{type(e).__name__}: {e}')
+        response = {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    log_invocation(event, context, response, started, errors)
+    return response
+
+def handle_request(event: Dict[str, Any]) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -106,9 +277,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'role': role
     }
     
+    result: Dict[str, Any] = {'user': user_data}
+    token = issue_token(telegram_id, role)
+    if token:
+        result.update(token)
+    
     return {
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
         'isBase64Encoded': False,
-        'body': json.dumps({'user': user_data})
+        'body': json.dumps(result)
     }
\ No newline at end of file
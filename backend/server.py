@@ -0,0 +1,176 @@
+'''
+Business: Единый процесс для всех функций (api, auth, admin-auth, telegram-bot) вместо четырёх деплоев
+Args: --host, --port, --pool-size; окружение - объединение секретов всех функций (DATABASE_URL, TELEGRAM_*, ...)
+Returns: HTTP-сервер: /<функция>?... вызывает handler этой функции, например /api?resource=bookings,
+         /auth?telegram_id=..., /telegram-bot (webhook). handler(event, context) маршрутизирует так же,
+         если весь каталог backend/ развёрнут одной функцией
+
+Один холодный старт вместо четырёх, один пул соединений к БД на api и бота, один Telegram-клиент,
+а уведомление api о новой записи вызывает handler бота напрямую, без HTTPS-запроса.
+'''
+
+import argparse
+import base64
+import http.server
+import importlib.util
+import json
+import os
+import sys
+import threading
+import traceback
+import uuid
+from types import ModuleType, SimpleNamespace
+from typing import Any, Dict, Optional, Sequence
+from urllib.parse import parse_qsl, urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+FUNCTIONS = ('api', 'auth', 'admin-auth', 'telegram-bot')
+DEFAULT_POOL_SIZE = 10
+
+def load_function(name: str) -> ModuleType:
+    module_name = 'backend_' + name.replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(BACKEND_DIR, name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+handlers: Dict[str, ModuleType] = {name: load_function(name) for name in FUNCTIONS}
+_pool: Any = None
+_pool_lock = threading.Lock()
+
+def open_pool(maxconn: int, dsn: Optional[str]) -> Any:
+    '''ThreadedConnectionPool без соединений на старте: они открываются по требованию и остаются в пуле.
+
+    psycopg2 закрывает возвращённое соединение, если простаивающих уже minconn, поэтому minconn
+    поднимается до maxconn после создания: при создании пул не открывает ни одного соединения,
+    и без БД продолжают работать auth, admin-auth и OPTIONS
+    '''
+    import psycopg2.pool
+    pool = psycopg2.pool.ThreadedConnectionPool(0, maxconn, dsn)
+    pool.minconn = maxconn
+    return pool
+
+def setup_shared_resources(pool_size: int) -> None:
+    '''Общий пул для api и бота и прямой вызов бота из api; повторный вызов ничего не меняет'''
+    global _pool
+    if _pool is not None:
+        return
+    with _pool_lock:
+        if _pool is not None:
+            return
+
+        api, bot = handlers['api'], handlers['telegram-bot']
+        pool = open_pool(pool_size, os.environ.get('DATABASE_URL'))
+        api.db_pool = pool
+        # get_db_pool() бота вернёт уже созданный пул; DATABASE_POOL_SIZE ему не нужен
+        bot._db_pool = pool
+        api.booking_notifier = notify_bot
+        _pool = pool
+
+def notify_bot(data: bytes) -> None:
+    '''Уведомление api о новой записи: handler бота в этом же процессе вместо HTTPS-запроса'''
+    event = {
+        'httpMethod': 'POST',
+        'path': '/telegram-bot',
+        'headers': {'Content-Type': 'application/json'},
+        'queryStringParameters': {},
+        'body': data.decode('utf-8'),
+        'isBase64Encoded': False
+    }
+    context = SimpleNamespace(request_id=uuid.uuid4().hex, function_name='telegram-bot')
+    response = handlers['telegram-bot'].handler(event, context)
+    if response.get('statusCode', 500) >= 400:
+        raise RuntimeError(f'telegram-bot returned HTTP {response.get("statusCode")}')
+
+def route(event: Dict[str, Any]) -> Optional[str]:
+    '''Имя функции из первого сегмента пути (/api, /telegram-bot) или параметра ?fn='''
+    segment = (event.get('path') or '/').strip('/').split('/', 1)[0]
+    if segment in handlers:
+        return segment
+    fn = (event.get('queryStringParameters') or {}).get('fn')
+    return fn if fn in handlers else None
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Маршрутизация вызова в handler одной из четырёх функций
+    Args: event с path (/api, /auth, /admin-auth, /telegram-bot) или queryStringParameters.fn
+    Returns: Ответ выбранной функции; 404, если функция не распознана
+    '''
+    setup_shared_resources(int(os.environ.get('DATABASE_POOL_SIZE') or DEFAULT_POOL_SIZE))
+    name = route(event)
+    if name is None:
+        return {
+            'statusCode': 404,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Unknown function', 'functions': list(FUNCTIONS)}),
+            'isBase64Encoded': False
+        }
+    return handlers[name].handler(event, context)
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def handle_any(self) -> None:
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        event = {
+            'httpMethod': self.command,
+            'path': url.path,
+            'headers': dict(self.headers.items()),
+            'queryStringParameters': dict(parse_qsl(url.query)),
+            'body': self.rfile.read(length).decode('utf-8') if length else '',
+            'isBase64Encoded': False
+        }
+        try:
+            response = handler(event, SimpleNamespace(request_id=uuid.uuid4().hex, function_name=route(event)))
+        except Exception as e:
+            # Без ответа клиент увидел бы только разорванное соединение
+            traceback.print_exc()
+            response = {
+                'statusCode': 500,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': str(e)}),
+                'isBase64Encoded': False
+            }
+
+        body = response.get('body') or ''
+        data = base64.b64decode(body) if response.get('isBase64Encoded') else body.encode('utf-8')
+        self.send_response(response.get('statusCode', 200))
+        for key, value in (response.get('headers') or {}).items():
+            self.send_header(key, str(value))
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_OPTIONS = handle_any
+
+    def log_message(self, format, *args):
+        # Каждая функция сама пишет JSON-строку трейса на вызов
+        pass
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Serve api, auth, admin-auth and telegram-bot from one process')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT') or 8080))
+    parser.add_argument('--pool-size', type=int, default=int(os.environ.get('DATABASE_POOL_SIZE') or DEFAULT_POOL_SIZE),
+                        help='Connections shared by api and telegram-bot')
+    return parser.parse_args(argv)
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    setup_shared_resources(args.pool_size)
+    server = http.server.ThreadingHTTPServer((args.host, args.port), RequestHandler)
+    server.daemon_threads = True
+    print(f'Serving {", ".join(FUNCTIONS)} on http://{args.host}:{args.port}/<function>', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        _pool.closeall()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
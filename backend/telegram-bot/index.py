@@ -6,12 +6,215 @@ Returns: HTTP response 200 для Telegram
 
 import json
 import os
-from typing import Dict, Any, Optional
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime, timedelta
-import urllib.request
-import urllib.parse
+import sys
+import threading
+import time
+from contextvars import ContextVar, copy_context
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+# Тяжёлые модули загружаются лениво: путь уведомления о записи не ходит в БД
+# и не должен платить за импорт psycopg2; http.client (вместе с ssl) нужен только для отправки сообщений
+psycopg2 = None
+RealDictCursor = None
+
+def load_db_driver() -> None:
+    global psycopg2, RealDictCursor
+    if psycopg2 is None:
+        # psycopg2 публикуем последним: параллельный поток, увидевший его, уже видит и RealDictCursor
+        import psycopg2.extras as extras
+        RealDictCursor = extras.RealDictCursor
+        psycopg2 = sys.modules['psycopg2']
+
+class RequestMetrics:
+    '''Счётчики одного запроса: подключение, SQL, сериализация и исходящие HTTP-вызовы'''
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.rows = 0
+        self.db_ms = 0.0
+        self.connect_ms = 0.0
+        self.serialize_ms = 0.0
+        self.http_calls = 0
+        self.http_ms = 0.0
+        self.db_target: Optional[str] = None
+        self.resource: Optional[str] = None
+        self.action: Optional[str] = None
+        self.errors: List[str] = []
+        # Исходящие вызовы могут идти из пула потоков (рассылка напоминаний)
+        self.lock = threading.Lock()
+    
+    def dumps(self, data: Any) -> str:
+        started = time.perf_counter()
+        try:
+            return json.dumps(data)
+        finally:
+            self.serialize_ms += (time.perf_counter() - started) * 1000
+    
+    def as_dict(self) -> Dict[str, Any]:
+        total_ms = (time.perf_counter() - self.started) * 1000
+        app_ms = max(total_ms - self.connect_ms - self.db_ms - self.serialize_ms - self.http_ms, 0.0)
+        return {
+            'queries': self.queries,
+            'rows': self.rows,
+            'dbTarget': self.db_target,
+            'connectMs': round(self.connect_ms, 2),
+            'dbMs': round(self.db_ms, 2),
+            'serializeMs': round(self.serialize_ms, 2),
+            'httpCalls': self.http_calls,
+            'httpMs': round(self.http_ms, 2),
+            'appMs': round(app_ms, 2),
+            'totalMs': round(total_ms, 2)
+        }
+    
+    def server_timing(self) -> str:
+        m = self.as_dict()
+        return ', '.join([
+            f'connect;dur={m["connectMs"]}',
+            f'db;dur={m["dbMs"]};desc="{m["queries"]} queries, {m["rows"]} rows, {m["dbTarget"]}"',
+            f'serialize;dur={m["serializeMs"]}',
+            f'http;dur={m["httpMs"]};desc="{m["httpCalls"]} calls"',
+            f'app;dur={m["appMs"]}',
+            f'total;dur={m["totalMs"]}'
+        ])
+
+class InstrumentedCursor:
+    '''Обёртка курсора: время execute/fetch и число строк идут в RequestMetrics'''
+    
+    def __init__(self, cursor, metrics: RequestMetrics):
+        self._cursor = cursor
+        self._metrics = metrics
+    
+    def execute(self, query, params=None):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params)
+        finally:
+            self._metrics.queries += 1
+            self._metrics.db_ms += (time.perf_counter() - started) * 1000
+    
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._metrics.db_ms += (time.perf_counter() - started) * 1000
+        if row is not None:
+            self._metrics.rows += 1
+        return row
+    
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._metrics.db_ms += (time.perf_counter() - started) * 1000
+        self._metrics.rows += len(rows)
+        return rows
+    
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return self._cursor.__exit__(exc_type, exc, tb)
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class InstrumentedConnection:
+    def __init__(self, conn, metrics: RequestMetrics, pool: Any = None):
+        self._conn = conn
+        self.metrics = metrics
+        self.pool = pool
+    
+    def cursor(self, *args, **kwargs) -> InstrumentedCursor:
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self.metrics)
+    
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return self._conn.commit()
+        finally:
+            self.metrics.db_ms += (time.perf_counter() - started) * 1000
+    
+    def close(self):
+        if self.pool is None:
+            return self._conn.close()
+        # Соединение из пула возвращаем без незавершённой транзакции; разорванное пул закроет
+        if not self._conn.closed:
+            try:
+                self._conn.rollback()
+            except psycopg2.Error:
+                pass
+        self.pool.putconn(self._conn, close=bool(self._conn.closed))
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+# Метрики текущего вызова: send_telegram_message и connect_db пишут сюда без передачи через параметры
+_request_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar('request_metrics', default=None)
+
+def current_metrics() -> RequestMetrics:
+    metrics = _request_metrics.get()
+    if metrics is None:
+        # Вызов вне handler (например, из консоли) - считаем в отдельный объект
+        metrics = RequestMetrics()
+        _request_metrics.set(metrics)
+    return metrics
+
+# Пул соединений для долгоживущего процесса (polling.py); в serverless по умолчанию выключен:
+# DATABASE_POOL_SIZE не задан - каждое connect_db() открывает своё соединение, как раньше
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool() -> Any:
+    global _db_pool
+    size = int(os.environ.get('DATABASE_POOL_SIZE', '0'))
+    if size and _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                import psycopg2.pool
+                # Соединения открываются по требованию; minconn = size после создания, иначе psycopg2
+                # закрывает каждое возвращённое соединение сверх minconn простаивающих
+                pool = psycopg2.pool.ThreadedConnectionPool(0, size, os.environ.get('DATABASE_URL'))
+                pool.minconn = size
+                _db_pool = pool
+    return _db_pool
+
+def connect_db() -> InstrumentedConnection:
+    metrics = current_metrics()
+    started = time.perf_counter()
+    load_db_driver()
+    pool = get_db_pool()
+    conn = None
+    if pool is not None:
+        try:
+            conn = pool.getconn()
+        except psycopg2.pool.PoolError:
+            # Пул исчерпан (например, dead letter пишется при открытом основном соединении)
+            pool = None
+    if conn is None:
+        conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
+    metrics.connect_ms += (time.perf_counter() - started) * 1000
+    metrics.db_target = 'primary'
+    return InstrumentedConnection(conn, metrics, pool)
+
+def finalize_response(response: Dict[str, Any], metrics: RequestMetrics, debug: bool) -> Dict[str, Any]:
+    headers = response.setdefault('headers', {})
+    headers['Server-Timing'] = metrics.server_timing()
+    headers['Access-Control-Expose-Headers'] = 'Server-Timing'
+    
+    # Отладочное поле добавляется только по запросу (?debug=timing), чтобы не менять обычные ответы
+    if debug and response.get('body'):
+        try:
+            body = json.loads(response['body'])
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            body['_timing'] = metrics.as_dict()
+            response['body'] = json.dumps(body)
+    
+    return response
 
 def get_main_keyboard(group_id: Optional[int] = None) -> Dict:
     keyboard = [
@@ -42,28 +245,336 @@ def get_client_keyboard() -> Dict:
         'persistent': True
     }
 
-def send_telegram_message(chat_id: int, text: str, reply_markup: Optional[Dict] = None) -> bool:
-    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
-    url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
+KEYBOARD_LABELS = {
+    button['text']
+    for keyboard in (get_main_keyboard(1), get_client_keyboard())
+    for row in keyboard['keyboard']
+    for button in row
+}
+
+def command_label(text: str) -> str:
+    '''Метка команды для логов без пользовательских данных (телефон в /start, название события и т.п.)'''
+    if text.startswith('/'):
+        return text.split(' ', 1)[0]
+    if text in KEYBOARD_LABELS:
+        return text
+    return 'text'
+
+# Лимиты Bot API: ~30 сообщений в секунду на бота, около 1 в секунду в личный чат и 20 в минуту в группу.
+# Держим запас, чтобы не упираться в 429
+TELEGRAM_MAX_MESSAGES_PER_SECOND = 25
+PRIVATE_CHAT_RATE, PRIVATE_CHAT_BURST = 1.0, 5
+GROUP_CHAT_RATE, GROUP_CHAT_BURST = 20 / 60, 20
+TELEGRAM_TIMEOUT = 10
+# Повторы 5xx и 429; дольше ждать внутри вызова функции нельзя - сообщение уходит в dead letters
+TELEGRAM_MAX_ATTEMPTS = 3
+TELEGRAM_BACKOFF_BASE = 0.5
+TELEGRAM_MAX_RETRY_AFTER = 10
+
+class TokenBucket:
+    '''Потокобезопасный token bucket: rate токенов в секунду, не больше capacity про запас'''
     
-    payload = {
-        'chat_id': chat_id,
-        'text': text,
-        'parse_mode': 'HTML'
-    }
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def reserve(self) -> float:
+        '''Забирает токен в долг; возвращает, сколько секунд ждать, пока он появится'''
+        with self.lock:
+            self._refill()
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+    
+    def pause(self, seconds: float) -> None:
+        '''Telegram ответил 429: следующие токены появятся не раньше чем через seconds'''
+        with self.lock:
+            self._refill()
+            # Следующий reserve() заберёт токен и будет ждать ровно seconds
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+class OutboundLimiter:
+    '''Общий лимит бота плюс отдельный bucket на каждый чат (LRU, чтобы память не росла)'''
+    
+    def __init__(self, max_chats: int = 1000):
+        self.global_bucket = TokenBucket(TELEGRAM_MAX_MESSAGES_PER_SECOND, TELEGRAM_MAX_MESSAGES_PER_SECOND)
+        self.max_chats = max_chats
+        self.chats: 'OrderedDict[int, TokenBucket]' = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def chat_bucket(self, chat_id: int) -> TokenBucket:
+        with self.lock:
+            bucket = self.chats.get(chat_id)
+            if bucket is None:
+                # Отрицательный chat_id - группа, у групп свой, более строгий лимит
+                if chat_id < 0:
+                    bucket = TokenBucket(GROUP_CHAT_RATE, GROUP_CHAT_BURST)
+                else:
+                    bucket = TokenBucket(PRIVATE_CHAT_RATE, PRIVATE_CHAT_BURST)
+                self.chats[chat_id] = bucket
+                if len(self.chats) > self.max_chats:
+                    self.chats.popitem(last=False)
+            else:
+                self.chats.move_to_end(chat_id)
+            return bucket
+    
+    def wait(self, chat_id: int) -> float:
+        delay = max(self.global_bucket.reserve(), self.chat_bucket(chat_id).reserve())
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+# Живёт между тёплыми вызовами: потоки рассылки и соседние запуски делят одни лимиты
+_outbound_limiter = OutboundLimiter()
+
+class TelegramClient:
+    '''Keep-alive HTTPS к Bot API: соединения переиспользуются между сообщениями и тёплыми вызовами.
+
+    Простаивающие соединения лежат в небольшом пуле, поэтому клиентом пользуются и потоки рассылки.
+    '''
+    
+    HOST = 'api.telegram.org'
     
-    if reply_markup:
-        payload['reply_markup'] = reply_markup
+    def __init__(self, max_idle: int = 8, timeout: float = TELEGRAM_TIMEOUT):
+        self.max_idle = max_idle
+        self.timeout = timeout
+        # TELEGRAM_API_URL подменяет Bot API локальной заглушкой (scripts/telegram_stub.py)
+        self.api_url = os.environ.get('TELEGRAM_API_URL')
+        self._idle: List[Any] = []
+        self._lock = threading.Lock()
     
-    data = json.dumps(payload).encode('utf-8')
-    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    def _acquire(self) -> Tuple[Any, bool]:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        import http.client
+        if self.api_url:
+            from urllib.parse import urlsplit
+            url = urlsplit(self.api_url)
+            connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+            return connection_class(url.hostname, url.port, timeout=self.timeout), False
+        return http.client.HTTPSConnection(self.HOST, timeout=self.timeout), False
     
+    def _release(self, conn: Any) -> None:
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+    
+    def call(self, method: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        import http.client
+        
+        path = f'/bot{os.environ.get("TELEGRAM_BOT_TOKEN")}/{method}'
+        headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+        while True:
+            conn, reused = self._acquire()
+            try:
+                conn.request('POST', path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except TimeoutError:
+                # Запрос мог дойти до Telegram - повтор по таймауту рискует продублировать сообщение
+                conn.close()
+                raise
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                # Telegram закрыл простаивавшее соединение - один раз повторяем на свежем
+                if reused:
+                    continue
+                raise
+            
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return response.status, json.loads(data or b'{}')
+
+# Живёт между тёплыми вызовами вместе с открытыми соединениями
+_telegram = TelegramClient()
+
+# Неудачный вызов: метод, payload, ошибка, число попыток
+DeadLetter = Tuple[str, Dict[str, Any], str, int]
+
+def store_dead_letter(cur, method: str, payload: Dict[str, Any], error: str, attempts: int) -> None:
+    cur.execute('''
+        INSERT INTO telegram_dead_letters (chat_id, method, payload, error, attempts)
+        VALUES (%s, %s, %s, %s, %s)
+    ''', (payload.get('chat_id'), method, json.dumps(payload, ensure_ascii=False), error, attempts))
+
+def record_dead_letter(method: str, payload: Dict[str, Any], error: str, attempts: int) -> None:
+    '''Сообщение, которое не удалось доставить, сохраняем для разбора и повторной отправки'''
+    metrics = current_metrics()
+    metrics.errors.append(f'Dead letter {method} to {payload.get("chat_id")}: {error}')
     try:
-        with urllib.request.urlopen(req) as response:
-            return response.status == 200
+        conn = connect_db()
+        try:
+            with conn.cursor() as cur:
+                store_dead_letter(cur, method, payload, error, attempts)
+            conn.commit()
+        finally:
+            conn.close()
     except Exception as e:
-        print(f'Error sending message: {e}')
-        return False
+        # БД недоступна - запись остаётся хотя бы в логе вызова
+        print(json.dumps({'type': 'dead_letter', 'method': method, 'payload': payload,
+                          'error': error, 'attempts': attempts, 'storeError': str(e)}, ensure_ascii=False))
+
+def reject_call(method: str, payload: Dict[str, Any], error: str, attempts: int,
+                dead_letters: Optional[List[DeadLetter]]) -> None:
+    if dead_letters is None:
+        record_dead_letter(method, payload, error, attempts)
+        return
+    # Повторами владеет вызывающий (очередь напоминаний): он и сохранит dead letter после последней попытки
+    current_metrics().errors.append(f'{method} to {payload.get("chat_id")}: {error}')
+    dead_letters.append((method, payload, error, attempts))
+
+class WebhookOutbox:
+    '''Вызовы Bot API за время обработки одного webhook-update.
+
+    Последний вызов возвращается в теле ответа на webhook (Telegram выполнит его сам, без отдельного
+    HTTPS-запроса), предыдущие отправляются через клиент - порядок доставки сохраняется.
+    Цена: о неудаче вызова из ответа на webhook Telegram не сообщает, в dead letters он не попадёт.
+    '''
+    
+    def __init__(self):
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+    
+    def flush(self) -> None:
+        calls, self.calls = self.calls, []
+        for method, payload in calls:
+            telegram_request(method, payload)
+    
+    def attach(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.calls:
+            return response
+        method, payload = self.calls.pop()
+        self.flush()
+        if response.get('statusCode') != 200:
+            telegram_request(method, payload)
+            return response
+        response['headers'] = {**(response.get('headers') or {}), 'Content-Type': 'application/json'}
+        response['body'] = current_metrics().dumps({'method': method, **payload})
+        return response
+
+# Outbox текущего webhook-update; вне webhook (рассылка, уведомления) вызовы идут сразу
+_webhook_outbox: ContextVar[Optional[WebhookOutbox]] = ContextVar('webhook_outbox', default=None)
+
+def telegram_request(method: str, payload: Dict[str, Any],
+                     dead_letters: Optional[List[DeadLetter]] = None) -> Tuple[bool, Dict[str, Any]]:
+    '''Вызов Bot API с лимитами скорости и повторами; окончательно неудачные вызовы уходят в dead letters,
+    а при переданном dead_letters - в этот список, сохранять их решает вызывающий'''
+    import random
+    
+    outbox = _webhook_outbox.get()
+    if outbox is not None:
+        outbox.calls.append((method, payload))
+        return True, {}
+    
+    metrics = current_metrics()
+    data = metrics.dumps(payload).encode('utf-8')
+    chat_id = payload.get('chat_id')
+    
+    attempt = 0
+    while True:
+        attempt += 1
+        if chat_id is not None:
+            _outbound_limiter.wait(chat_id)
+        
+        started = time.perf_counter()
+        try:
+            status, result = _telegram.call(method, data)
+        except Exception as e:
+            # Сеть недоступна или таймаут - повтор может продублировать сообщение, сразу в dead letters
+            reject_call(method, payload, f'{type(e).__name__}: {e}', attempt, dead_letters)
+            return False, {}
+        finally:
+            with metrics.lock:
+                metrics.http_calls += 1
+                metrics.http_ms += (time.perf_counter() - started) * 1000
+        
+        if status == 200:
+            return True, result
+        
+        error = f'HTTP {status} {result.get("description")}'
+        if attempt < TELEGRAM_MAX_ATTEMPTS:
+            if status == 429:
+                retry_after = (result.get('parameters') or {}).get('retry_after', 1)
+                if retry_after <= TELEGRAM_MAX_RETRY_AFTER:
+                    metrics.errors.append(f'{method} to {chat_id}: {error}, retry after {retry_after}s')
+                    if chat_id is not None:
+                        _outbound_limiter.chat_bucket(chat_id).pause(retry_after)
+                    else:
+                        # Вызов без чата (answerCallbackQuery) не ждёт в корзине - паузу выдерживаем здесь
+                        time.sleep(retry_after)
+                    continue
+            elif status >= 500:
+                # Экспоненциальная пауза с полным джиттером, чтобы потоки не повторяли синхронно
+                delay = random.uniform(0, TELEGRAM_BACKOFF_BASE * 2 ** (attempt - 1))
+                metrics.errors.append(f'{method} to {chat_id}: {error}, retry in {delay:.2f}s')
+                time.sleep(delay)
+                continue
+        
+        # Повторное нажатие кнопки листания: Telegram отвечает 400, хотя сообщение уже в нужном виде
+        if status == 400 and 'message is not modified' in str(result.get('description')):
+            return True, result
+        
+        # Остальные 4xx (чат не найден, бот заблокирован) повтором не лечатся
+        reject_call(method, payload, error, attempt, dead_letters)
+        return False, result
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    '''Делит текст по абзацам (затем по строкам), чтобы HTML-теги не разрывались между сообщениями'''
+    chunks: List[str] = []
+    current = ''
+    for paragraph in text.split('\n\n'):
+        piece = paragraph + '\n\n'
+        if len(current) + len(piece) <= limit:
+            current += piece
+            continue
+        if current:
+            chunks.append(current)
+            current = ''
+        # Абзац сам длиннее лимита - режем по строкам, а строку - по лимиту
+        for line in piece.splitlines(keepends=True):
+            while len(line) > limit:
+                chunks.append(line[:limit])
+                line = line[limit:]
+            if len(current) + len(line) > limit:
+                chunks.append(current)
+                current = ''
+            current += line
+    if current.strip():
+        chunks.append(current)
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+def send_telegram_message(chat_id: int, text: str, reply_markup: Optional[Dict] = None,
+                          dead_letters: Optional[List[DeadLetter]] = None) -> bool:
+    chunks = split_message(text) if len(text) > TELEGRAM_MESSAGE_LIMIT else [text]
+    
+    delivered = True
+    for index, chunk in enumerate(chunks):
+        payload = {
+            'chat_id': chat_id,
+            'text': chunk,
+            'parse_mode': 'HTML'
+        }
+        
+        # Клавиатура - только у последней части
+        if reply_markup and index == len(chunks) - 1:
+            payload['reply_markup'] = reply_markup
+        
+        ok, _ = telegram_request('sendMessage', payload, dead_letters)
+        delivered = delivered and ok
+    return delivered
 
 def send_booking_notification(chat_id: int, booking_data: Dict) -> bool:
     text = f'''🔔 <b>Новая запись!</b>
@@ -90,157 +601,445 @@ def send_booking_notification(chat_id: int, booking_data: Dict) -> bool:
     
     return send_telegram_message(chat_id, text, reply_markup)
 
-def send_reminders() -> Dict[str, Any]:
-    db_url = os.environ.get('DATABASE_URL')
-    if not db_url:
-        return {'sent': 0, 'error': 'DATABASE_URL not set'}
-    
-    conn = psycopg2.connect(db_url)
+REMINDER_BATCH_SIZE = 100
+REMINDER_MAX_ATTEMPTS = 3
+# Параллельные отправки; суммарную скорость всё равно ограничивает _outbound_limiter
+REMINDER_WORKERS = 8
+# Запас до таймаута функции: оставшиеся напоминания заберёт следующий запуск
+REMINDER_TIME_BUDGET = 20.0
+# Записи хранятся во времени владельца (booking_date + start_time без зоны), функция работает в UTC
+DEFAULT_OWNER_TIMEZONE = 'Europe/Moscow'
+
+def owner_now() -> datetime:
+    '''Текущее время владельца без зоны - в той же шкале, что due_at и начало записи'''
+    from zoneinfo import ZoneInfo
+    return datetime.now(ZoneInfo(os.environ.get('OWNER_TIMEZONE') or DEFAULT_OWNER_TIMEZONE)).replace(tzinfo=None)
+
+# bookings секционирована по месяцам: send_reminders идёт по расписанию, он и досоздаёт будущие секции
+BOOKING_PARTITIONS_AHEAD = 6
+_partitions_checked_on: Optional[date] = None
+
+def ensure_booking_partitions(conn) -> int:
+    '''Недостающие месячные секции bookings на BOOKING_PARTITIONS_AHEAD месяцев; в инстансе - раз в сутки'''
+    global _partitions_checked_on
+    today = date.today()
+    if _partitions_checked_on == today:
+        return 0
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT value FROM settings WHERE owner_id = 1 AND key = 'reminder_hours'")
-            setting = cur.fetchone()
-            reminder_hours = float(setting['value']) if setting and setting['value'] else 0
-            
-            if reminder_hours == 0:
-                return {'sent': 0, 'message': 'Reminders disabled'}
-            
-            now = datetime.now()
-            reminder_time = now + timedelta(hours=reminder_hours)
-            
-            cur.execute('''
-                SELECT 
-                    b.id,
-                    b.booking_date,
-                    b.start_time,
-                    u.telegram_id,
-                    u.name as client_name,
-                    s.name as service_name,
-                    s.price
-                FROM bookings b
-                LEFT JOIN clients c ON b.client_id = c.id
-                LEFT JOIN users u ON c.user_id = u.id
-                LEFT JOIN services s ON b.service_id = s.id
-                WHERE b.status = 'confirmed'
-                AND u.telegram_id IS NOT NULL
-                AND b.booking_date = %s
-                AND b.start_time BETWEEN %s AND %s
-            ''', (
-                reminder_time.date(),
-                reminder_time.time(),
-                (reminder_time + timedelta(minutes=30)).time()
-            ))
-            
-            bookings = cur.fetchall()
-            sent_count = 0
-            
-            for booking in bookings:
-                date_str = booking['booking_date'].strftime('%d.%m.%Y')
-                time_str = booking['start_time'].strftime('%H:%M')
-                
-                hours_text = ''
-                if reminder_hours >= 1:
-                    hours_text = f"{int(reminder_hours)} ч"
-                if reminder_hours % 1 != 0:
-                    hours_text += f" 30 мин"
-                
-                reminder_text = f'''⏰ <b>Напоминание о записи</b>
+            cur.execute(
+                "SELECT create_bookings_partitions(CURRENT_DATE, (CURRENT_DATE + %s * INTERVAL '1 month')::DATE) AS created",
+                (BOOKING_PARTITIONS_AHEAD,)
+            )
+            created = cur.fetchone()['created']
+        conn.commit()
+    except Exception as e:
+        # Без секций записи попадают в bookings_default - напоминания из-за этого не откладываем
+        conn.rollback()
+        current_metrics().errors.append(f'Failed to create booking partitions: {e}')
+        return 0
+    _partitions_checked_on = today
+    return created
+
+def claim_due_reminders(cur, now: datetime, tried: List[int]) -> List[Dict[str, Any]]:
+    '''Пачка наступивших напоминаний; строки остаются заблокированы до commit, другие запуски их пропускают'''
+    cur.execute('''
+        SELECT 
+            r.id,
+            r.due_at,
+            r.attempts,
+            b.status as booking_status,
+            b.booking_date,
+            b.start_time,
+            u.telegram_id,
+            u.name as client_name,
+            s.name as service_name,
+            s.price
+        FROM reminders r
+        JOIN bookings b ON r.booking_id = b.id
+        LEFT JOIN clients c ON b.client_id = c.id
+        LEFT JOIN users u ON c.user_id = u.id
+        LEFT JOIN services s ON b.service_id = s.id
+        WHERE r.status = 'pending'
+        AND r.due_at <= %s
+        AND r.id <> ALL(%s)
+        ORDER BY r.due_at
+        LIMIT %s
+        FOR UPDATE OF r SKIP LOCKED
+    ''', (now, tried, REMINDER_BATCH_SIZE))
+    return cur.fetchall()
+
+def format_reminder(reminder: Dict[str, Any]) -> str:
+    date_str = reminder['booking_date'].strftime('%d.%m.%Y')
+    time_str = reminder['start_time'].strftime('%H:%M')
+    
+    # Интервал берём из самой очереди: у каждого владельца свой reminder_hours
+    starts_at = datetime.combine(reminder['booking_date'], reminder['start_time'])
+    reminder_hours = (starts_at - reminder['due_at']).total_seconds() / 3600
+    
+    hours_text = ''
+    if reminder_hours >= 1:
+        hours_text = f"{int(reminder_hours)} ч"
+    if reminder_hours % 1 != 0:
+        hours_text += f" 30 мин"
+    
+    return f'''⏰ <b>Напоминание о записи</b>
 
-Привет, {booking["client_name"]}! 👋
+Привет, {reminder["client_name"]}! 👋
 
 Через {hours_text} у вас запись:
 
-💇 <b>Услуга:</b> {booking["service_name"]}
+💇 <b>Услуга:</b> {reminder["service_name"]}
 📅 <b>Дата:</b> {date_str}
 🕐 <b>Время:</b> {time_str}
-💰 <b>Цена:</b> {booking["price"]}₽
+💰 <b>Цена:</b> {reminder["price"]}₽
 
 До встречи! ✨'''
+
+def deliver_reminder(reminder: Dict[str, Any]) -> Tuple[str, float, List[DeadLetter]]:
+    '''Отправка одного напоминания в потоке пула: исход, время с учётом ожидания лимитов и неудачные вызовы'''
+    started = time.perf_counter()
+    dead_letters: List[DeadLetter] = []
+    delivered = send_telegram_message(reminder['telegram_id'], format_reminder(reminder), dead_letters=dead_letters)
+    return ('sent' if delivered else 'failed'), (time.perf_counter() - started) * 1000, dead_letters
+
+def summarize_send_times(send_times: List[float]) -> Dict[str, float]:
+    if not send_times:
+        return {}
+    ordered = sorted(send_times)
+    return {
+        'p50': round(ordered[len(ordered) // 2], 1),
+        'p95': round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 1),
+        'max': round(ordered[-1], 1)
+    }
+
+def send_reminders() -> Dict[str, Any]:
+    db_url = os.environ.get('DATABASE_URL')
+    if not db_url:
+        return {'sent': 0, 'error': 'DATABASE_URL not set'}
+    
+    from concurrent.futures import ThreadPoolExecutor
+    
+    started = time.monotonic()
+    now = owner_now()
+    totals = {'sent': 0, 'skipped': 0, 'failed': 0}
+    send_times: List[float] = []
+    tried: List[int] = []
+    
+    conn = connect_db()
+    try:
+        partitions_created = ensure_booking_partitions(conn)
+        with conn.cursor(cursor_factory=RealDictCursor) as cur, ThreadPoolExecutor(max_workers=REMINDER_WORKERS) as pool:
+            while time.monotonic() - started < REMINDER_TIME_BUDGET:
+                reminders = claim_due_reminders(cur, now, tried)
+                if not reminders:
+                    break
                 
-                if send_telegram_message(booking['telegram_id'], reminder_text):
-                    sent_count += 1
+                outcomes: Dict[str, List[int]] = {'sent': [], 'skipped': [], 'failed': []}
+                futures = []
+                for reminder in reminders:
+                    tried.append(reminder['id'])
+                    starts_at = datetime.combine(reminder['booking_date'], reminder['start_time'])
+                    # Запись отменили, клиент без Telegram или визит уже начался - напоминать поздно
+                    if reminder['booking_status'] != 'confirmed' or not reminder['telegram_id'] or starts_at <= now:
+                        outcomes['skipped'].append(reminder['id'])
+                    else:
+                        # Копия контекста - чтобы HTTP-метрики потоков попадали в текущий вызов
+                        futures.append((reminder, pool.submit(copy_context().run, deliver_reminder, reminder)))
+                
+                # Строки пачки заблокированы, пока не отправлены все её сообщения
+                for reminder, future in futures:
+                    outcome, send_ms, dead_letters = future.result()
+                    outcomes[outcome].append(reminder['id'])
+                    send_times.append(send_ms)
+                    # Dead letter - только после последней попытки и в той же транзакции, что статус failed
+                    if dead_letters and reminder['attempts'] + 1 >= REMINDER_MAX_ATTEMPTS:
+                        for method, payload, error, attempts in dead_letters:
+                            store_dead_letter(cur, method, payload, error, attempts)
+                
+                for outcome, ids in outcomes.items():
+                    if not ids:
+                        continue
+                    if outcome == 'failed':
+                        # Неудачная отправка остаётся в очереди до REMINDER_MAX_ATTEMPTS попыток
+                        cur.execute('''
+                            UPDATE reminders
+                            SET attempts = attempts + 1,
+                                status = CASE WHEN attempts + 1 >= %s THEN 'failed' ELSE 'pending' END
+                            WHERE id = ANY(%s)
+                        ''', (REMINDER_MAX_ATTEMPTS, ids))
+                    else:
+                        cur.execute('''
+                            UPDATE reminders
+                            SET status = %s, attempts = attempts + 1, sent_at = CURRENT_TIMESTAMP
+                            WHERE id = ANY(%s)
+                        ''', (outcome, ids))
+                    totals[outcome] += len(ids)
+                conn.commit()
+                
+                if len(reminders) < REMINDER_BATCH_SIZE:
+                    break
             
-            return {'sent': sent_count, 'message': f'Sent {sent_count} reminders'}
+            return {
+                **totals,
+                'sendMs': summarize_send_times(send_times),
+                'elapsedMs': round((time.monotonic() - started) * 1000, 1),
+                'partitionsCreated': partitions_created,
+                'message': f'Sent {totals["sent"]} reminders'
+            }
     finally:
         conn.close()
 
-def get_calendar_for_date(conn, owner_id: int, date_str: str) -> str:
+DAY_NAMES_EN = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+def load_calendar_range(conn, owner_id: int, start_date: date, end_date: date) -> Dict[date, Dict[str, Any]]:
+    '''Календарь владельца за период: 4 запроса на весь диапазон, раскладка по дням в памяти'''
+    days = {}
+    current = start_date
+    while current <= end_date:
+        days[current] = {'blocked': False, 'study': None, 'events': [], 'bookings': []}
+        current += timedelta(days=1)
+    
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-        day_names_ru = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
-        day_name = day_names_ru[date_obj.weekday()]
-        
-        formatted_date = date_obj.strftime('%d.%m.%Y')
-        
-        text = f'📅 <b>{day_name} {formatted_date}</b>\n\n'
-        
-        # Проверка блокировки
-        cur.execute('SELECT id FROM blocked_dates WHERE owner_id = %s AND blocked_date = %s', 
-                   (owner_id, date_str))
-        if cur.fetchone():
-            text += '🚫 <b>День заблокирован</b>\n\n'
-        
-        # Учёба
-        day_names_en = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-        day_of_week = day_names_en[date_obj.weekday()]
-        
+        # Блокировки
         cur.execute('''
-            SELECT start_time, end_time FROM week_schedule
-            WHERE owner_id = %s AND day_of_week = %s
-        ''', (owner_id, day_of_week))
+            SELECT blocked_date FROM blocked_dates
+            WHERE owner_id = %s AND blocked_date BETWEEN %s AND %s
+        ''', (owner_id, start_date, end_date))
+        for row in cur.fetchall():
+            days[row['blocked_date']]['blocked'] = True
         
-        study = cur.fetchone()
-        if study:
-            text += f'📚 <b>Учёба:</b> {study["start_time"].strftime("%H:%M")} - {study["end_time"].strftime("%H:%M")}\n\n'
+        # Учёба: расписание всех циклов, начавшихся до конца периода
+        cur.execute('''
+            SELECT day_of_week, start_time, end_time, cycle_start_date, week_number
+            FROM week_schedule
+            WHERE owner_id = %s AND cycle_start_date <= %s
+            ORDER BY cycle_start_date DESC
+        ''', (owner_id, end_date))
+        schedule = cur.fetchall()
+        for day, data in days.items():
+            # Действует последний начавшийся цикл; неделя 1 или 2 - по числу недель от его начала
+            cycle_start = next((row['cycle_start_date'] for row in schedule if row['cycle_start_date'] <= day), None)
+            if cycle_start is None:
+                continue
+            week_number = ((day - cycle_start).days // 7) % 2 + 1
+            data['study'] = next((
+                row for row in schedule
+                if row['cycle_start_date'] == cycle_start
+                and row['week_number'] == week_number
+                and row['day_of_week'] == DAY_NAMES_EN[day.weekday()]
+            ), None)
         
         # Мероприятия
         cur.execute('''
-            SELECT title, start_time, end_time, event_type, description
+            SELECT event_date, title, start_time, end_time, event_type, description
             FROM calendar_events
-            WHERE owner_id = %s AND event_date = %s
-            ORDER BY start_time
-        ''', (owner_id, date_str))
-        
-        events = cur.fetchall()
-        if events:
-            text += '🎯 <b>Мероприятия:</b>\n'
-            for event in events:
-                text += f'  • {event["start_time"].strftime("%H:%M")}-{event["end_time"].strftime("%H:%M")} {event["title"]}\n'
-            text += '\n'
+            WHERE owner_id = %s AND event_date BETWEEN %s AND %s
+            ORDER BY event_date, start_time
+        ''', (owner_id, start_date, end_date))
+        for event in cur.fetchall():
+            days[event['event_date']]['events'].append(event)
         
         # Записи клиентов
         cur.execute('''
-            SELECT b.id, b.status, b.start_time, b.end_time,
+            SELECT b.id, b.booking_date, b.status, b.start_time, b.end_time,
                    u.name as client_name, u.phone as client_phone,
                    s.name as service_name, s.price
             FROM bookings b
             LEFT JOIN clients c ON b.client_id = c.id
             LEFT JOIN users u ON c.user_id = u.id
             LEFT JOIN services s ON b.service_id = s.id
-            WHERE b.owner_id = %s AND b.booking_date = %s
-            ORDER BY b.start_time
-        ''', (owner_id, date_str))
-        
+            WHERE b.owner_id = %s AND b.booking_date BETWEEN %s AND %s
+            ORDER BY b.booking_date, b.start_time
+        ''', (owner_id, start_date, end_date))
+        for booking in cur.fetchall():
+            days[booking['booking_date']]['bookings'].append(booking)
+    
+    return days
+
+def render_calendar_day(day: date, data: Dict[str, Any]) -> str:
+    day_names_ru = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+    day_name = day_names_ru[day.weekday()]
+    
+    formatted_date = day.strftime('%d.%m.%Y')
+    
+    text = f'📅 <b>{day_name} {formatted_date}</b>\n\n'
+    
+    if data['blocked']:
+        text += '🚫 <b>День заблокирован</b>\n\n'
+    
+    study = data['study']
+    if study:
+        text += f'📚 <b>Учёба:</b> {study["start_time"].strftime("%H:%M")} - {study["end_time"].strftime("%H:%M")}\n\n'
+    
+    events = data['events']
+    if events:
+        text += '🎯 <b>Мероприятия:</b>\n'
+        for event in events:
+            text += f'  • {event["start_time"].strftime("%H:%M")}-{event["end_time"].strftime("%H:%M")} {event["title"]}\n'
+        text += '\n'
+    
+    bookings = data['bookings']
+    if bookings:
+        text += '📌 <b>Записи клиентов:</b>\n\n'
+        for booking in bookings:
+            status_emoji = {
+                'pending': '⏳',
+                'confirmed': '✅',
+                'completed': '✔️',
+                'cancelled': '❌'
+            }
+            emoji = status_emoji.get(booking['status'], '❓')
+            
+            text += f'{emoji} <b>{booking["start_time"].strftime("%H:%M")}</b> - {booking["service_name"]}\n'
+            text += f'👤 {booking["client_name"]}\n'
+            text += f'📞 {booking["client_phone"]}\n'
+            text += f'💰 {booking["price"]}₽\n\n'
+    else:
+        text += '📭 Нет записей на этот день\n'
+    
+    return text
+
+# (версия владельца, версия дня): кэш сверяет пару на равенство. Значения последовательности берутся
+# при срабатывании триггера, а видны после commit - в разном порядке, поэтому max() из двух версий
+# мог остаться прежним после записи, закоммиченной позже
+DayVersion = Tuple[int, int]
+
+class DayAgendaCache:
+    '''(owner_id, день) -> (версия, готовый текст) с LRU-вытеснением; живёт между тёплыми вызовами.
+
+    Версии ведут триггеры в БД (calendar_versions), поэтому запись из любой функции - api, админки,
+    соседнего инстанса бота - делает закэшированный день устаревшим при следующей сверке.
+    '''
+    
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self.entries: 'OrderedDict[Tuple[int, date], Tuple[DayVersion, str]]' = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, owner_id: int, day: date, version: DayVersion) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get((owner_id, day))
+            if entry is None or entry[0] != version:
+                return None
+            self.entries.move_to_end((owner_id, day))
+            return entry[1]
+    
+    def put(self, owner_id: int, day: date, version: DayVersion, text: str) -> None:
+        with self.lock:
+            self.entries[(owner_id, day)] = (version, text)
+            self.entries.move_to_end((owner_id, day))
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+_day_agendas = DayAgendaCache()
+
+def load_calendar_versions(conn, owner_id: int, start_date: date, end_date: date) -> Dict[date, DayVersion]:
+    '''Версия каждого дня периода: версия владельца целиком и версия самого дня'''
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute('''
+            SELECT day::text as day, version FROM calendar_versions
+            WHERE owner_id = %s AND (day = '-infinity' OR day BETWEEN %s AND %s)
+        ''', (owner_id, start_date, end_date))
+        versions = {row['day']: row['version'] for row in cur.fetchall()}
+    
+    owner_version = versions.get('-infinity', 0)
+    result = {}
+    current = start_date
+    while current <= end_date:
+        result[current] = (owner_version, versions.get(current.isoformat(), 0))
+        current += timedelta(days=1)
+    return result
+
+def render_calendar_range(conn, owner_id: int, start_date: date, end_date: date) -> List[str]:
+    '''Тексты дней периода: неизменившиеся дни - из кэша, остальные - одной загрузкой диапазона'''
+    # Версию читаем до данных: запись между ними оставит в кэше более старую версию и день перерисуется
+    versions = load_calendar_versions(conn, owner_id, start_date, end_date)
+    texts = {}
+    for day, version in versions.items():
+        text = _day_agendas.get(owner_id, day, version)
+        if text is not None:
+            texts[day] = text
+    
+    missing = [day for day in versions if day not in texts]
+    if missing:
+        days = load_calendar_range(conn, owner_id, missing[0], missing[-1])
+        for day in missing:
+            texts[day] = render_calendar_day(day, days[day])
+            _day_agendas.put(owner_id, day, versions[day], texts[day])
+    
+    return [texts[day] for day in versions]
+
+def get_calendar_for_date(conn, owner_id: int, date_str: str) -> str:
+    day = datetime.strptime(date_str, '%Y-%m-%d').date()
+    return render_calendar_range(conn, owner_id, day, day)[0]
+
+PENDING_PAGE_SIZE = 5
+
+def render_pending_page(conn, owner_id: int, page: int) -> Tuple[str, Optional[Dict]]:
+    '''Страница ожидающих записей: текст и inline-кнопки подтверждения/отмены и листания'''
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        pending_query = '''
+            SELECT b.id, b.booking_date, b.start_time,
+                   u.name as client_name, u.phone as client_phone,
+                   s.name as service_name, s.price,
+                   COUNT(*) OVER () as total
+            FROM bookings b
+            LEFT JOIN clients c ON b.client_id = c.id
+            LEFT JOIN users u ON c.user_id = u.id
+            LEFT JOIN services s ON b.service_id = s.id
+            WHERE b.owner_id = %s AND b.status = 'pending'
+            ORDER BY b.booking_date, b.start_time, b.id
+            LIMIT %s OFFSET %s
+        '''
+        cur.execute(pending_query, (owner_id, PENDING_PAGE_SIZE, page * PENDING_PAGE_SIZE))
         bookings = cur.fetchall()
-        if bookings:
-            text += '📌 <b>Записи клиентов:</b>\n\n'
-            for booking in bookings:
-                status_emoji = {
-                    'pending': '⏳',
-                    'confirmed': '✅',
-                    'completed': '✔️',
-                    'cancelled': '❌'
-                }
-                emoji = status_emoji.get(booking['status'], '❓')
-                
-                text += f'{emoji} <b>{booking["start_time"].strftime("%H:%M")}</b> - {booking["service_name"]}\n'
-                text += f'👤 {booking["client_name"]}\n'
-                text += f'📞 {booking["client_phone"]}\n'
-                text += f'💰 {booking["price"]}₽\n\n'
-        else:
-            text += '📭 Нет записей на этот день\n'
         
-        return text
+        # Записи с последней страницы успели подтвердить - показываем новую последнюю
+        if not bookings and page > 0:
+            cur.execute("SELECT COUNT(*) as total FROM bookings WHERE owner_id = %s AND status = 'pending'", (owner_id,))
+            total = cur.fetchone()['total']
+            if total:
+                page = (total - 1) // PENDING_PAGE_SIZE
+                cur.execute(pending_query, (owner_id, PENDING_PAGE_SIZE, page * PENDING_PAGE_SIZE))
+                bookings = cur.fetchall()
+    
+    if not bookings:
+        return '✅ Нет записей, ожидающих подтверждения', None
+    
+    total = bookings[0]['total']
+    pages = (total + PENDING_PAGE_SIZE - 1) // PENDING_PAGE_SIZE
+    
+    text = f'⏳ <b>Ожидают подтверждения ({total}):</b>\n'
+    if pages > 1:
+        text += f'Страница {page + 1} из {pages}\n'
+    text += '\n'
+    
+    keyboard = []
+    for number, booking in enumerate(bookings, start=page * PENDING_PAGE_SIZE + 1):
+        formatted_date = booking['booking_date'].strftime('%d.%m.%Y')
+        
+        text += f'<b>{number}.</b> 📅 {formatted_date} в {booking["start_time"].strftime("%H:%M")}\n'
+        text += f'👤 {booking["client_name"]}\n'
+        text += f'📞 {booking["client_phone"]}\n'
+        text += f'💇 {booking["service_name"]}\n'
+        text += f'💰 {booking["price"]}₽\n\n'
+        
+        # Номер страницы в callback_data - чтобы после действия перерисовать ту же страницу
+        keyboard.append([
+            {'text': f'✅ {number}', 'callback_data': f'confirm_{booking["id"]}_{page}'},
+            {'text': f'❌ {number}', 'callback_data': f'cancel_{booking["id"]}_{page}'}
+        ])
+    
+    navigation = []
+    if page > 0:
+        navigation.append({'text': '◀️ Назад', 'callback_data': f'pending_page_{page - 1}'})
+    if page < pages - 1:
+        navigation.append({'text': 'Вперёд ▶️', 'callback_data': f'pending_page_{page + 1}'})
+    if navigation:
+        keyboard.append(navigation)
+    
+    return text.rstrip(), {'inline_keyboard': keyboard}
 
 def handle_command(conn, chat_id: int, command: str, owner_id: int) -> str:
     if command == '/start' or command == '🏠 Меню':
@@ -263,64 +1062,29 @@ def handle_command(conn, chat_id: int, command: str, owner_id: int) -> str:
 /blocked_list - Список заблокированных дат'''
     
     elif command == '/today' or command == '📅 Сегодня':
-        today = datetime.now().strftime('%Y-%m-%d')
+        today = owner_now().strftime('%Y-%m-%d')
         return get_calendar_for_date(conn, owner_id, today)
     
     elif command == '/tomorrow' or command == '📆 Завтра':
-        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        tomorrow = (owner_now() + timedelta(days=1)).strftime('%Y-%m-%d')
         return get_calendar_for_date(conn, owner_id, tomorrow)
     
     elif command == '/week' or command == '📊 Неделя':
+        today = owner_now().date()
         text = '📅 <b>Календарь на неделю:</b>\n\n'
-        for i in range(7):
-            date = (datetime.now() + timedelta(days=i)).strftime('%Y-%m-%d')
-            text += get_calendar_for_date(conn, owner_id, date)
+        for day_text in render_calendar_range(conn, owner_id, today, today + timedelta(days=6)):
+            text += day_text
             text += '━━━━━━━━━━━━━━━━\n\n'
         return text
     
     elif command == '/pending' or command == '⏳ Ожидающие записи':
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute('''
-                SELECT b.id, b.booking_date, b.start_time,
-                       u.name as client_name, u.phone as client_phone,
-                       s.name as service_name, s.price
-                FROM bookings b
-                LEFT JOIN clients c ON b.client_id = c.id
-                LEFT JOIN users u ON c.user_id = u.id
-                LEFT JOIN services s ON b.service_id = s.id
-                WHERE b.owner_id = %s AND b.status = 'pending'
-                ORDER BY b.booking_date, b.start_time
-                LIMIT 20
-            ''', (owner_id,))
-            
-            bookings = cur.fetchall()
-            
-            if not bookings:
-                return '✅ Нет записей, ожидающих подтверждения'
-            
-            text = f'⏳ <b>Ожидают подтверждения ({len(bookings)}):</b>\n\n'
-            
-            for booking in bookings:
-                date_obj = booking['booking_date']
-                formatted_date = date_obj.strftime('%d.%m.%Y')
-                
-                text += f'📅 {formatted_date} в {booking["start_time"].strftime("%H:%M")}\n'
-                text += f'👤 {booking["client_name"]}\n'
-                text += f'📞 {booking["client_phone"]}\n'
-                text += f'💇 {booking["service_name"]}\n'
-                text += f'💰 {booking["price"]}₽\n'
-                
-                # Добавляем кнопки для управления
-                reply_markup = {
-                    'inline_keyboard': [[
-                        {'text': '✅ Подтвердить', 'callback_data': f'confirm_{booking["id"]}'},
-                        {'text': '❌ Отменить', 'callback_data': f'cancel_{booking["id"]}'}
-                    ]]
-                }
-                send_telegram_message(chat_id, text, reply_markup)
-                text = ''
-            
-            return text if text else None
+        text, reply_markup = render_pending_page(conn, owner_id, 0)
+        if not reply_markup:
+            return text
+        
+        # Один список с кнопками; листание редактирует это же сообщение
+        send_telegram_message(chat_id, text, reply_markup)
+        return None
     
     elif command == '/event_list' or command == '🎯 Мероприятия':
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
@@ -368,10 +1132,9 @@ def handle_command(conn, chat_id: int, command: str, owner_id: int) -> str:
             
             text = f'🚫 <b>Заблокированные даты ({len(dates)}):</b>\n\n'
             
-            for date in dates:
-                date_obj = date['blocked_date']
-                formatted_date = date_obj.strftime('%d.%m.%Y')
-                text += f'• {formatted_date} (ID: {date["id"]})\n'
+            for blocked in dates:
+                formatted_date = blocked['blocked_date'].strftime('%d.%m.%Y')
+                text += f'• {formatted_date} (ID: {blocked["id"]})\n'
             
             return text
     
@@ -408,278 +1171,486 @@ def handle_command(conn, chat_id: int, command: str, owner_id: int) -> str:
     
     return '❓ Неизвестная команда. Используйте /start для списка команд.'
 
-def handle_callback(conn, callback_data: str, chat_id: int, message_id: int, owner_id: int) -> str:
+# Смена статуса записи одним запросом: UPDATE ... RETURNING, данные клиента для уведомления
+# через CTE и (при подтверждении) постановка напоминания в очередь с due_at по reminder_hours владельца.
+# Повторное нажатие ничего не меняет: строка со статусом уже равным целевому не обновляется
+SET_BOOKING_STATUS_QUERY = '''
+    WITH updated AS (
+        UPDATE bookings
+        SET status = %(status)s, updated_at = CURRENT_TIMESTAMP
+        WHERE id = %(booking_id)s AND owner_id = %(owner_id)s AND status <> %(status)s
+        RETURNING id, owner_id, client_id, service_id, booking_date, start_time
+    ), queued AS (
+        INSERT INTO reminders (booking_id, owner_id, due_at)
+        SELECT up.id, up.owner_id, up.booking_date + up.start_time - INTERVAL '1 hour' * st.value::numeric
+        FROM updated up
+        JOIN settings st ON st.owner_id = up.owner_id AND st.key = 'reminder_hours'
+        WHERE %(status)s = 'confirmed'
+        AND st.value::numeric > 0
+        ON CONFLICT (booking_id) DO NOTHING
+    )
+    SELECT up.id, up.booking_date, up.start_time, u.telegram_id, u.name as client_name,
+           s.name as service_name
+    FROM updated up
+    LEFT JOIN clients c ON up.client_id = c.id
+    LEFT JOIN users u ON c.user_id = u.id
+    LEFT JOIN services s ON up.service_id = s.id
+'''
+
+def handle_callback(conn, callback_data: str, chat_id: int, message_id: int, owner_id: int,
+                    callback_id: str) -> Optional[str]:
+    '''Кнопки владельца: сообщение с кнопками правится на месте, итог показывается ответом на нажатие'''
     parts = callback_data.split('_')
     action = parts[0]
     
-    if action == 'confirm':
-        booking_id = int(parts[1])
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Получаем данные записи и клиента
-            cur.execute('''
-                SELECT b.booking_date, b.start_time, u.telegram_id, u.name as client_name,
-                       s.name as service_name
-                FROM bookings b
-                LEFT JOIN clients c ON b.client_id = c.id
-                LEFT JOIN users u ON c.user_id = u.id
-                LEFT JOIN services s ON b.service_id = s.id
-                WHERE b.id = %s
-            ''', (booking_id,))
-            
-            booking = cur.fetchone()
-            
-            # Обновляем статус
-            cur.execute('UPDATE bookings SET status = %s WHERE id = %s AND owner_id = %s',
-                       ('confirmed', booking_id, owner_id))
-            conn.commit()
-            
-            # Отправляем уведомление клиенту, если у него есть telegram_id
-            if booking and booking['telegram_id']:
-                client_telegram_id = booking['telegram_id']
-                date_str = booking['booking_date'].strftime('%d.%m.%Y')
-                time_str = booking['start_time'].strftime('%H:%M')
-                
-                client_message = f'''✅ <b>Запись подтверждена!</b>
+    if callback_data.startswith('pending_page_'):
+        text, reply_markup = render_pending_page(conn, owner_id, int(parts[2]))
+        payload = {'chat_id': chat_id, 'message_id': message_id, 'text': text, 'parse_mode': 'HTML'}
+        if reply_markup:
+            payload['reply_markup'] = reply_markup
+        telegram_request('editMessageText', payload)
+        telegram_request('answerCallbackQuery', {'callback_query_id': callback_id})
+        return None
+    
+    if action not in ('confirm', 'cancel'):
+        return '❓ Неизвестное действие'
+    
+    booking_id = int(parts[1])
+    status = 'confirmed' if action == 'confirm' else 'cancelled'
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(SET_BOOKING_STATUS_QUERY, {'status': status, 'booking_id': booking_id, 'owner_id': owner_id})
+        booking = cur.fetchone()
+        conn.commit()
+    
+    if not booking:
+        answer = f'Запись #{booking_id} уже обработана или не найдена'
+    elif action == 'confirm':
+        answer = f'✅ Запись #{booking_id} подтверждена!'
+    else:
+        answer = f'❌ Запись #{booking_id} отменена'
+    
+    if len(parts) > 2:
+        # Нажатие из списка /pending - перерисовываем ту же страницу без обработанной записи
+        text, reply_markup = render_pending_page(conn, owner_id, int(parts[2]))
+        payload = {'chat_id': chat_id, 'message_id': message_id, 'text': text, 'parse_mode': 'HTML'}
+        if reply_markup:
+            payload['reply_markup'] = reply_markup
+        telegram_request('editMessageText', payload)
+    else:
+        # Уведомление о новой записи - убираем кнопки, чтобы их не нажали повторно
+        telegram_request('editMessageReplyMarkup', {
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'reply_markup': {'inline_keyboard': []}
+        })
+    telegram_request('answerCallbackQuery', {'callback_query_id': callback_id, 'text': answer})
+    
+    # Отправляем уведомление клиенту, если у него есть telegram_id
+    if booking and booking['telegram_id']:
+        date_str = booking['booking_date'].strftime('%d.%m.%Y')
+        time_str = booking['start_time'].strftime('%H:%M')
+        
+        if action == 'confirm':
+            client_message = f'''✅ <b>Запись подтверждена!</b>
 
 📆 Дата: {date_str}
 🕐 Время: {time_str}
 💇 Услуга: {booking["service_name"]}
 
 До встречи, {booking["client_name"]}! 👋'''
-                
-                send_telegram_message(client_telegram_id, client_message)
-        
-        return f'✅ Запись #{booking_id} подтверждена!'
-    
-    elif action == 'cancel':
-        booking_id = int(parts[1])
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Получаем данные записи и клиента
-            cur.execute('''
-                SELECT b.booking_date, b.start_time, u.telegram_id, u.name as client_name,
-                       s.name as service_name
-                FROM bookings b
-                LEFT JOIN clients c ON b.client_id = c.id
-                LEFT JOIN users u ON c.user_id = u.id
-                LEFT JOIN services s ON b.service_id = s.id
-                WHERE b.id = %s
-            ''', (booking_id,))
-            
-            booking = cur.fetchone()
-            
-            # Обновляем статус
-            cur.execute('UPDATE bookings SET status = %s WHERE id = %s AND owner_id = %s',
-                       ('cancelled', booking_id, owner_id))
-            conn.commit()
-            
-            # Отправляем уведомление клиенту, если у него есть telegram_id
-            if booking and booking['telegram_id']:
-                client_telegram_id = booking['telegram_id']
-                date_str = booking['booking_date'].strftime('%d.%m.%Y')
-                time_str = booking['start_time'].strftime('%H:%M')
-                
-                client_message = f'''❌ <b>Запись отменена</b>
+        else:
+            client_message = f'''❌ <b>Запись отменена</b>
 
 📆 Дата: {date_str}
 🕐 Время: {time_str}
 💇 Услуга: {booking["service_name"]}
 
 Если хотите записаться снова, перейдите на сайт.'''
-                
-                send_telegram_message(client_telegram_id, client_message)
         
-        return f'❌ Запись #{booking_id} отменена'
+        send_telegram_message(booking['telegram_id'], client_message)
     
-    return '❓ Неизвестное действие'
+    return None
 
-def is_access_allowed(chat_id: int, user_id: Optional[int] = None) -> bool:
-    owner_telegram_id = int(os.environ.get('TELEGRAM_OWNER_ID', '0'))
+# Журнал обработанных update_id: скользящее окно в сутки - столько Telegram хранит недоставленные обновления
+UPDATE_LEDGER_WINDOW_SECONDS = 24 * 3600
+# Чистка старых записей - попутно с каждым сотым обновлением, тем же запросом
+UPDATE_LEDGER_PRUNE_EVERY = 100
+
+# Аренда отметки: столько ждём завершения чужой обработки, прежде чем считать вызов упавшим.
+# С запасом больше таймаута функции - живой вызов за это время либо закончит, либо будет убит
+UPDATE_CLAIM_LEASE_SECONDS = 120
+
+UPDATE_CLAIMED = 'claimed'
+UPDATE_COMPLETED = 'completed'
+UPDATE_IN_PROGRESS = 'in_progress'
+
+def claim_update(conn, update_id: Optional[int]) -> str:
+    '''Захватывает update на UPDATE_CLAIM_LEASE_SECONDS: claimed, completed (уже обработан) или in_progress'''
+    if update_id is None:
+        return UPDATE_CLAIMED
+    with conn.cursor() as cur:
+        # Отметку незавершённого update с истёкшей арендой оставил убитый вызов - забираем её себе.
+        # Подзапрос видит processed_updates до вставки: для нового update он пуст
+        cur.execute('''
+            WITH pruned AS (
+                DELETE FROM processed_updates
+                WHERE %(prune)s AND processed_at < CURRENT_TIMESTAMP - %(window)s * INTERVAL '1 second'
+            ), claimed AS (
+                INSERT INTO processed_updates (update_id)
+                VALUES (%(update_id)s)
+                ON CONFLICT (update_id) DO UPDATE SET processed_at = CURRENT_TIMESTAMP
+                WHERE processed_updates.completed_at IS NULL
+                AND processed_updates.processed_at < CURRENT_TIMESTAMP - %(lease)s * INTERVAL '1 second'
+                RETURNING update_id
+            )
+            SELECT
+                EXISTS (SELECT 1 FROM claimed),
+                (SELECT completed_at IS NOT NULL FROM processed_updates WHERE update_id = %(update_id)s)
+        ''', {
+            'update_id': update_id,
+            'prune': update_id % UPDATE_LEDGER_PRUNE_EVERY == 0,
+            'window': UPDATE_LEDGER_WINDOW_SECONDS,
+            'lease': UPDATE_CLAIM_LEASE_SECONDS
+        })
+        claimed, completed = cur.fetchone()
+    # Коммитим сразу: параллельная доставка того же update должна увидеть отметку
+    conn.commit()
+    if claimed:
+        return UPDATE_CLAIMED
+    return UPDATE_COMPLETED if completed else UPDATE_IN_PROGRESS
+
+def complete_update(conn, update_id: Optional[int]) -> None:
+    '''Обработка завершилась - повторы этого update больше не обрабатываются'''
+    if update_id is None:
+        return
+    try:
+        # Незакоммиченное обработчиком и раньше терялось при закрытии соединения
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute('UPDATE processed_updates SET completed_at = CURRENT_TIMESTAMP WHERE update_id = %s', (update_id,))
+        conn.commit()
+    except Exception as e:
+        # Без отметки повтор обработается заново после истечения аренды
+        current_metrics().errors.append(f'Failed to complete update {update_id}: {e}')
+
+def skipped_update_response(claim: str) -> Dict[str, Any]:
+    '''Ответ на повтор: обработанный подтверждаем, а занятый другим вызовом Telegram пришлёт позже'''
+    current_metrics().action = 'duplicate' if claim == UPDATE_COMPLETED else 'in_progress'
+    return {
+        'statusCode': 200 if claim == UPDATE_COMPLETED else 503,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({'ok': claim == UPDATE_COMPLETED}),
+        'isBase64Encoded': False
+    }
+
+def release_update(conn, update_id: Optional[int]) -> None:
+    '''Обработка упала - снимаем отметку, чтобы повтор от Telegram обработался заново'''
+    if update_id is None:
+        return
+    try:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute('DELETE FROM processed_updates WHERE update_id = %s', (update_id,))
+        conn.commit()
+    except Exception as e:
+        current_metrics().errors.append(f'Failed to release update {update_id}: {e}')
+
+@lru_cache(maxsize=1)
+def access_config() -> Dict[str, Any]:
+    '''Настройки доступа из окружения: читаются один раз на инстанс'''
     group_id = os.environ.get('TELEGRAM_GROUP_ID', '')
+    return {
+        'owner_telegram_id': int(os.environ.get('TELEGRAM_OWNER_ID', '0')),
+        'group_id': int(group_id) if group_id else None
+    }
+
+def is_access_allowed(chat_id: int, user_id: Optional[int] = None) -> bool:
+    config = access_config()
     
     # ВРЕМЕННО ОТКЛЮЧЕНО: проверка администратора
     # Личные сообщения от владельца
-    # if chat_id == owner_telegram_id:
+    # if chat_id == config['owner_telegram_id']:
     #     return True
     
     # Сообщения из разрешенной группы (от любого участника)
-    if group_id and str(chat_id) == group_id:
+    if config['group_id'] is not None and chat_id == config['group_id']:
         return True
     
     return False
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    method: str = event.get('httpMethod', 'POST')
+class ChatIdentity(NamedTuple):
+    user_id: int
+    role: str
+    owner_id: Optional[int]
+
+class ChatIdentityCache:
+    '''chat_id -> ChatIdentity с TTL и LRU-вытеснением; живёт между тёплыми вызовами.
+
+    None кэшируется как «аккаунта нет» на меньший срок. Привязка /start <телефон> в этом инстансе
+    сбрасывает запись сразу, в соседних тёплых инстансах запись устаревает не дольше TTL.
+    '''
     
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+    def __init__(self, max_size: int = 2048, ttl: float = 300, negative_ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries: 'OrderedDict[int, Tuple[float, Optional[ChatIdentity]]]' = OrderedDict()
+        self.lock = threading.Lock()
     
-    if method != 'POST':
-        return {
-            'statusCode': 405,
+    def get(self, chat_id: int) -> Tuple[bool, Optional[ChatIdentity]]:
+        with self.lock:
+            entry = self.entries.get(chat_id)
+            if entry is None:
+                return False, None
+            expires_at, identity = entry
+            if expires_at < time.monotonic():
+                del self.entries[chat_id]
+                return False, None
+            self.entries.move_to_end(chat_id)
+            return True, identity
+    
+    def put(self, chat_id: int, identity: Optional[ChatIdentity]) -> None:
+        ttl = self.ttl if identity is not None else self.negative_ttl
+        with self.lock:
+            self.entries[chat_id] = (time.monotonic() + ttl, identity)
+            self.entries.move_to_end(chat_id)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+    
+    def invalidate(self, chat_id: int, user_id: Optional[int] = None) -> None:
+        with self.lock:
+            self.entries.pop(chat_id, None)
+            if user_id is not None:
+                # Аккаунт перепривязан к другому чату - старый чат больше не должен его видеть
+                stale = [key for key, (_, identity) in self.entries.items() if identity and identity.user_id == user_id]
+                for key in stale:
+                    del self.entries[key]
+
+_chat_identities = ChatIdentityCache()
+
+def lookup_chat_identity(conn, chat_id: int) -> Optional[ChatIdentity]:
+    '''Пользователь, привязанный к чату, с ролью и владельцем (через clients); None - аккаунта нет'''
+    hit, identity = _chat_identities.get(chat_id)
+    if hit:
+        return identity
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute('''
+            SELECT u.id, u.role, c.owner_id
+            FROM users u
+            LEFT JOIN clients c ON c.user_id = u.id
+            WHERE u.telegram_id = %s
+            ORDER BY c.id
+            LIMIT 1
+        ''', (chat_id,))
+        row = cur.fetchone()
+    
+    identity = ChatIdentity(row['id'], row['role'], row['owner_id']) if row else None
+    _chat_identities.put(chat_id, identity)
+    return identity
+
+FUNCTION_NAME = 'telegram-bot'
+
+# Первый вызов после загрузки модуля - холодный старт инстанса
+_cold_start = True
+
+def log_invocation(event: Dict[str, Any], context: Any, response: Dict[str, Any], metrics: RequestMetrics) -> None:
+    '''Одна JSON-строка на вызов; набор полей стабилен для офлайн-агрегации перцентилей'''
+    global _cold_start
+    body = response.get('body') or ''
+    record = {
+        'type': 'invocation',
+        'ts': round(time.time(), 3),
+        'function': FUNCTION_NAME,
+        'requestId': getattr(context, 'request_id', None),
+        'resource': metrics.resource,
+        'action': metrics.action,
+        'method': event.get('httpMethod'),
+        'coldStart': _cold_start,
+        'status': response.get('statusCode'),
+        'responseBytes': len(body.encode('utf-8')) if isinstance(body, str) else len(body),
+        **metrics.as_dict(),
+        'errors': metrics.errors
+    }
+    _cold_start = False
+    print(json.dumps(record, ensure_ascii=False))
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    metrics = RequestMetrics()
+    token = _request_metrics.set(metrics)
+    try:
+        response = process_event(event)
+    except Exception as e:
+        # Исключение мимо обработчиков process_event (например, БД недоступна) - строка трейса всё равно нужна
+        metrics.errors.append(f'{type(e).__name__}: {e}')
+        response = {
+            'statusCode': 500,
             'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({'error': 'Method not allowed'}),
+            'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
-    
-    try:
-        body = json.loads(event.get('body', '{}'))
+    finally:
+        _request_metrics.reset(token)
+    debug = (event.get('queryStringParameters') or {}).get('debug') == 'timing'
+    response = finalize_response(response, metrics, debug)
+    log_invocation(event, context, response, metrics)
+    return response
+
+def process_update(body: Dict[str, Any]) -> Dict[str, Any]:
+    '''Webhook-обновление Telegram: сообщение или нажатие inline-кнопки'''
+    if 'message' in body:
+        message = body['message']
+        chat_id = message['chat']['id']
+        text = message.get('text', '')
+        metrics = current_metrics()
+        metrics.resource = 'message'
+        metrics.action = command_label(text)
         
-        # Отправка напоминаний (вызывается по крону или вручную)
-        if body.get('action') == 'send_reminders':
-            result = send_reminders()
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(result),
-                'isBase64Encoded': False
-            }
+        conn = connect_db()
         
-        # Обработка уведомления о новой записи (от frontend)
-        if 'booking_id' in body and 'client_name' in body:
-            owner_telegram_id = int(os.environ.get('TELEGRAM_OWNER_ID', '0'))
-            group_id = os.environ.get('TELEGRAM_GROUP_ID', '')
-            
-            # Приоритет: сначала группа, если настроена, иначе личка владельца
-            target_chat_id = int(group_id) if group_id else owner_telegram_id
-            
-            if target_chat_id == 0:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'TELEGRAM_OWNER_ID or TELEGRAM_GROUP_ID not configured'}),
-                    'isBase64Encoded': False
-                }
-            
-            success = send_booking_notification(target_chat_id, body)
-            
-            return {
-                'statusCode': 200 if success else 500,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': success,
-                    'message': 'Notification sent' if success else 'Failed to send notification'
-                }),
-                'isBase64Encoded': False
-            }
+        # Telegram повторяет доставку, если не дождался ответа: повтор отсекаем до любой другой работы
+        update_id = body.get('update_id')
+        claim = claim_update(conn, update_id)
+        if claim != UPDATE_CLAIMED:
+            conn.close()
+            return skipped_update_response(claim)
         
-        # Telegram webhook update
-        if 'message' in body:
-            message = body['message']
-            chat_id = message['chat']['id']
-            text = message.get('text', '')
+        failed = False
+        try:
+            # Определяем роль пользователя
+            is_owner = is_access_allowed(chat_id)
             
-            db_url = os.environ.get('DATABASE_URL')
-            conn = psycopg2.connect(db_url)
+            # Проверяем, зарегистрирован ли как клиент
+            identity = lookup_chat_identity(conn, chat_id)
+            is_client = identity is not None
+            user_id = identity.user_id if identity else None
             
-            try:
-                # Определяем роль пользователя
-                owner_telegram_id = int(os.environ.get('TELEGRAM_OWNER_ID', '0'))
-                group_id = os.environ.get('TELEGRAM_GROUP_ID', '')
+            # Команда привязки по номеру телефона (доступна всем)
+            if text.startswith('/start '):
+                phone = text[7:].strip()
                 
-                is_owner = is_access_allowed(chat_id)
-                is_client = False
-                user_id = None
+                # Очищаем номер от пробелов и лишних символов
+                phone = phone.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
                 
-                # Проверяем, зарегистрирован ли как клиент
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute('SELECT id, role FROM users WHERE telegram_id = %s', (chat_id,))
-                    user = cur.fetchone()
-                    if user:
-                        is_client = True
-                        user_id = user['id']
+                # Добавляем + в начало, если его нет
+                if not phone.startswith('+'):
+                    phone = '+' + phone
                 
-                # Команда привязки по номеру телефона (доступна всем)
-                if text.startswith('/start '):
-                    phone = text[7:].strip()
-                    
-                    # Очищаем номер от пробелов и лишних символов
-                    phone = phone.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-                    
-                    # Добавляем + в начало, если его нет
-                    if not phone.startswith('+'):
-                        phone = '+' + phone
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute('SELECT id, name FROM users WHERE phone = %s', (phone,))
+                    user_data = cur.fetchone()
                     
+                    if user_data:
+                        # Обновляем telegram_id
+                        cur.execute('UPDATE users SET telegram_id = %s WHERE id = %s', (chat_id, user_data['id']))
+                        conn.commit()
+                        _chat_identities.invalidate(chat_id, user_data['id'])
+                        
+                        # Получаем записи клиента
+                        cur.execute('''
+                            SELECT b.id, b.booking_date, b.start_time, b.status,
+                                   s.name as service_name
+                            FROM bookings b
+                            LEFT JOIN clients c ON b.client_id = c.id
+                            LEFT JOIN services s ON b.service_id = s.id
+                            WHERE c.user_id = %s AND b.booking_date >= CURRENT_DATE
+                            ORDER BY b.booking_date, b.start_time
+                        ''', (user_data['id'],))
+                        
+                        bookings = cur.fetchall()
+                        
+                        response_text = f'✅ <b>Привязка успешна!</b>\n\nПривет, {user_data["name"]}! 👋\n\n'
+                        
+                        if bookings:
+                            response_text += f'📅 <b>Ваши предстоящие записи:</b>\n\n'
+                            for booking in bookings:
+                                status_emoji = {'pending': '⏳', 'confirmed': '✅', 'completed': '✔️', 'cancelled': '❌'}
+                                emoji = status_emoji.get(booking['status'], '❓')
+                                date_str = booking['booking_date'].strftime('%d.%m.%Y')
+                                time_str = booking['start_time'].strftime('%H:%M')
+                                
+                                response_text += f'{emoji} {date_str} в {time_str}\n'
+                                response_text += f'   {booking["service_name"]}\n\n'
+                        else:
+                            response_text += '📭 У вас пока нет записей.\n\n'
+                        
+                        response_text += '💬 <b>Команды:</b>\n'
+                        response_text += '/mybookings - Мои записи\n'
+                        response_text += '/cancel ID - Отменить запись'
+                        
+                        send_telegram_message(chat_id, response_text)
+                        return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+                    else:
+                        response_text = f'❌ Номер {phone} не найден в системе.\n\nСначала создайте запись на сайте, затем привяжите Telegram.'
+                        send_telegram_message(chat_id, response_text)
+                        return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+            
+            # Команды для клиентов
+            if is_client and not is_owner:
+                if text == '/start':
                     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                        cur.execute('SELECT id, name FROM users WHERE phone = %s', (phone,))
-                        user_data = cur.fetchone()
+                        cur.execute('''
+                            SELECT b.id, b.booking_date, b.start_time, b.status,
+                                   s.name as service_name, s.price
+                            FROM bookings b
+                            LEFT JOIN clients c ON b.client_id = c.id
+                            LEFT JOIN services s ON b.service_id = s.id
+                            WHERE c.user_id = %s AND b.booking_date >= CURRENT_DATE
+                            ORDER BY b.booking_date, b.start_time
+                            LIMIT 1
+                        ''', (user_id,))
                         
-                        if user_data:
-                            # Обновляем telegram_id
-                            cur.execute('UPDATE users SET telegram_id = %s WHERE id = %s', (chat_id, user_data['id']))
-                            conn.commit()
-                            
-                            # Получаем записи клиента
-                            cur.execute('''
-                                SELECT b.id, b.booking_date, b.start_time, b.status,
-                                       s.name as service_name
-                                FROM bookings b
-                                LEFT JOIN clients c ON b.client_id = c.id
-                                LEFT JOIN services s ON b.service_id = s.id
-                                WHERE c.user_id = %s AND b.booking_date >= CURRENT_DATE
-                                ORDER BY b.booking_date, b.start_time
-                            ''', (user_data['id'],))
-                            
-                            bookings = cur.fetchall()
-                            
-                            response_text = f'✅ <b>Привязка успешна!</b>\n\nПривет, {user_data["name"]}! 👋\n\n'
-                            
-                            if bookings:
-                                response_text += f'📅 <b>Ваши предстоящие записи:</b>\n\n'
-                                for booking in bookings:
-                                    status_emoji = {'pending': '⏳', 'confirmed': '✅', 'completed': '✔️', 'cancelled': '❌'}
-                                    emoji = status_emoji.get(booking['status'], '❓')
-                                    date_str = booking['booking_date'].strftime('%d.%m.%Y')
-                                    time_str = booking['start_time'].strftime('%H:%M')
-                                    
-                                    response_text += f'{emoji} {date_str} в {time_str}\n'
-                                    response_text += f'   {booking["service_name"]}\n\n'
-                            else:
-                                response_text += '📭 У вас пока нет записей.\n\n'
+                        booking = cur.fetchone()
+                        
+                        cur.execute('SELECT name FROM users WHERE id = %s', (user_id,))
+                        user_name = cur.fetchone()['name']
+                        
+                        response_text = f'👋 Привет, {user_name}!\n\n'
+                        
+                        if booking:
+                            status_emoji = {'pending': '⏳', 'confirmed': '✅', 'completed': '✔️', 'cancelled': '❌'}
+                            emoji = status_emoji.get(booking['status'], '❓')
+                            date_str = booking['booking_date'].strftime('%d.%m.%Y')
+                            time_str = booking['start_time'].strftime('%H:%M')
                             
-                            response_text += '💬 <b>Команды:</b>\n'
-                            response_text += '/mybookings - Мои записи\n'
-                            response_text += '/cancel ID - Отменить запись'
+                            status_text = {
+                                'pending': 'Ожидает подтверждения',
+                                'confirmed': 'Подтверждена',
+                                'completed': 'Завершена',
+                                'cancelled': 'Отменена'
+                            }.get(booking['status'], booking['status'])
                             
-                            send_telegram_message(chat_id, response_text)
-                            return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+                            response_text += f'📌 <b>Ваша ближайшая запись:</b>\n\n'
+                            response_text += f'{emoji} <b>Запись #{booking["id"]}</b>\n'
+                            response_text += f'📆 {date_str} в {time_str}\n'
+                            response_text += f'💇 {booking["service_name"]}\n'
+                            response_text += f'💰 {booking["price"]}₽\n'
+                            response_text += f'📊 {status_text}'
                         else:
-                            response_text = f'❌ Номер {phone} не найден в системе.\n\nСначала создайте запись на сайте, затем привяжите Telegram.'
-                            send_telegram_message(chat_id, response_text)
-                            return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+                            response_text += '📭 У вас пока нет предстоящих записей.'
+                        
+                        keyboard = get_client_keyboard()
+                        send_telegram_message(chat_id, response_text, keyboard)
+                        return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
                 
-                # Команды для клиентов
-                if is_client and not is_owner:
-                    if text == '/start':
-                        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                            cur.execute('''
-                                SELECT b.id, b.booking_date, b.start_time, b.status,
-                                       s.name as service_name, s.price
-                                FROM bookings b
-                                LEFT JOIN clients c ON b.client_id = c.id
-                                LEFT JOIN services s ON b.service_id = s.id
-                                WHERE c.user_id = %s AND b.booking_date >= CURRENT_DATE
-                                ORDER BY b.booking_date, b.start_time
-                                LIMIT 1
-                            ''', (user_id,))
-                            
-                            booking = cur.fetchone()
-                            
-                            cur.execute('SELECT name FROM users WHERE id = %s', (user_id,))
-                            user_name = cur.fetchone()['name']
-                            
-                            response_text = f'👋 Привет, {user_name}!\n\n'
+                elif text == '📅 Мои записи' or text == '/mybookings':
+                    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                        cur.execute('''
+                            SELECT b.id, b.booking_date, b.start_time, b.status,
+                                   s.name as service_name, s.price
+                            FROM bookings b
+                            LEFT JOIN clients c ON b.client_id = c.id
+                            LEFT JOIN services s ON b.service_id = s.id
+                            WHERE c.user_id = %s AND b.booking_date >= CURRENT_DATE
+                            ORDER BY b.booking_date, b.start_time
+                        ''', (user_id,))
+                        
+                        bookings = cur.fetchall()
+                        
+                        if bookings:
+                            send_telegram_message(chat_id, '📅 <b>Все ваши записи:</b>\n')
                             
-                            if booking:
+                            for booking in bookings:
                                 status_emoji = {'pending': '⏳', 'confirmed': '✅', 'completed': '✔️', 'cancelled': '❌'}
                                 emoji = status_emoji.get(booking['status'], '❓')
                                 date_str = booking['booking_date'].strftime('%d.%m.%Y')
@@ -692,318 +1663,388 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                                     'cancelled': 'Отменена'
                                 }.get(booking['status'], booking['status'])
                                 
-                                response_text += f'📌 <b>Ваша ближайшая запись:</b>\n\n'
-                                response_text += f'{emoji} <b>Запись #{booking["id"]}</b>\n'
-                                response_text += f'📆 {date_str} в {time_str}\n'
-                                response_text += f'💇 {booking["service_name"]}\n'
-                                response_text += f'💰 {booking["price"]}₽\n'
-                                response_text += f'📊 {status_text}'
-                            else:
-                                response_text += '📭 У вас пока нет предстоящих записей.'
-                            
-                            keyboard = get_client_keyboard()
-                            send_telegram_message(chat_id, response_text, keyboard)
-                            return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
-                    
-                    elif text == '📅 Мои записи' or text == '/mybookings':
-                        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                            cur.execute('''
-                                SELECT b.id, b.booking_date, b.start_time, b.status,
-                                       s.name as service_name, s.price
-                                FROM bookings b
-                                LEFT JOIN clients c ON b.client_id = c.id
-                                LEFT JOIN services s ON b.service_id = s.id
-                                WHERE c.user_id = %s AND b.booking_date >= CURRENT_DATE
-                                ORDER BY b.booking_date, b.start_time
-                            ''', (user_id,))
-                            
-                            bookings = cur.fetchall()
+                                booking_text = f'{emoji} <b>Запись #{booking["id"]}</b>\n'
+                                booking_text += f'📆 {date_str} в {time_str}\n'
+                                booking_text += f'💇 {booking["service_name"]}\n'
+                                booking_text += f'💰 {booking["price"]}₽\n'
+                                booking_text += f'📊 {status_text}'
+                                
+                                if booking['status'] in ['pending', 'confirmed']:
+                                    reply_markup = {
+                                        'inline_keyboard': [[{
+                                            'text': '❌ Отменить эту запись',
+                                            'callback_data': f'client_cancel_{booking["id"]}'
+                                        }]]
+                                    }
+                                    send_telegram_message(chat_id, booking_text, reply_markup)
+                                else:
+                                    send_telegram_message(chat_id, booking_text)
+                        else:
+                            response_text = '📭 У вас нет предстоящих записей.'
+                            send_telegram_message(chat_id, response_text)
+                        
+                        return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+                
+                elif text == '📝 Записаться на сеанс':
+                    response_text = '🌐 <b>Онлайн-запись</b>\n\nДля записи на сеанс перейдите на наш сайт:\n👉 https://your-booking-site.com'
+                    send_telegram_message(chat_id, response_text)
+                    return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+                
+                elif text == '✍️ Зарегистрироваться':
+                    response_text = '✍️ <b>Регистрация</b>\n\nВы уже зарегистрированы в системе!\n\nИспользуйте кнопку "📝 Записаться на сеанс" для создания новой записи.'
+                    send_telegram_message(chat_id, response_text)
+                    return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+                
+                elif text == '/cancel':
+                    # Показываем список записей с кнопками отмены
+                    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                        cur.execute('''
+                            SELECT b.id, b.booking_date, b.start_time, b.status,
+                                   s.name as service_name
+                            FROM bookings b
+                            LEFT JOIN clients c ON b.client_id = c.id
+                            LEFT JOIN services s ON b.service_id = s.id
+                            WHERE c.user_id = %s 
+                              AND b.booking_date >= CURRENT_DATE
+                              AND b.status IN ('pending', 'confirmed')
+                            ORDER BY b.booking_date, b.start_time
+                        ''', (user_id,))
+                        
+                        bookings = cur.fetchall()
+                        
+                        if bookings:
+                            response_text = '❌ <b>Выберите запись для отмены:</b>\n\n'
+                            buttons = []
                             
-                            if bookings:
-                                send_telegram_message(chat_id, '📅 <b>Все ваши записи:</b>\n')
+                            for booking in bookings:
+                                date_str = booking['booking_date'].strftime('%d.%m.%Y')
+                                time_str = booking['start_time'].strftime('%H:%M')
                                 
-                                for booking in bookings:
-                                    status_emoji = {'pending': '⏳', 'confirmed': '✅', 'completed': '✔️', 'cancelled': '❌'}
-                                    emoji = status_emoji.get(booking['status'], '❓')
-                                    date_str = booking['booking_date'].strftime('%d.%m.%Y')
-                                    time_str = booking['start_time'].strftime('%H:%M')
-                                    
-                                    status_text = {
-                                        'pending': 'Ожидает подтверждения',
-                                        'confirmed': 'Подтверждена',
-                                        'completed': 'Завершена',
-                                        'cancelled': 'Отменена'
-                                    }.get(booking['status'], booking['status'])
-                                    
-                                    booking_text = f'{emoji} <b>Запись #{booking["id"]}</b>\n'
-                                    booking_text += f'📆 {date_str} в {time_str}\n'
-                                    booking_text += f'💇 {booking["service_name"]}\n'
-                                    booking_text += f'💰 {booking["price"]}₽\n'
-                                    booking_text += f'📊 {status_text}'
-                                    
-                                    if booking['status'] in ['pending', 'confirmed']:
-                                        reply_markup = {
-                                            'inline_keyboard': [[{
-                                                'text': '❌ Отменить эту запись',
-                                                'callback_data': f'client_cancel_{booking["id"]}'
-                                            }]]
-                                        }
-                                        send_telegram_message(chat_id, booking_text, reply_markup)
-                                    else:
-                                        send_telegram_message(chat_id, booking_text)
-                            else:
-                                response_text = '📭 У вас нет предстоящих записей.'
-                                send_telegram_message(chat_id, response_text)
+                                response_text += f'📅 {date_str} в {time_str}\n'
+                                response_text += f'💇 {booking["service_name"]}\n\n'
+                                
+                                buttons.append([{
+                                    'text': f'❌ Отменить #{booking["id"]} ({date_str} {time_str})',
+                                    'callback_data': f'client_cancel_{booking["id"]}'
+                                }])
                             
-                            return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
-                    
-                    elif text == '📝 Записаться на сеанс':
-                        response_text = '🌐 <b>Онлайн-запись</b>\n\nДля записи на сеанс перейдите на наш сайт:\n👉 https://your-booking-site.com'
-                        send_telegram_message(chat_id, response_text)
-                        return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
-                    
-                    elif text == '✍️ Зарегистрироваться':
-                        response_text = '✍️ <b>Регистрация</b>\n\nВы уже зарегистрированы в системе!\n\nИспользуйте кнопку "📝 Записаться на сеанс" для создания новой записи.'
-                        send_telegram_message(chat_id, response_text)
-                        return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+                            reply_markup = {'inline_keyboard': buttons}
+                            send_telegram_message(chat_id, response_text, reply_markup)
+                        else:
+                            response_text = '✅ У вас нет активных записей для отмены.'
+                            send_telegram_message(chat_id, response_text)
                     
-                    elif text == '/cancel':
-                        # Показываем список записей с кнопками отмены
+                    return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+                
+                elif text.startswith('/cancel '):
+                    try:
+                        booking_id = int(text[8:])
+                        
                         with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                            # Проверяем, что запись принадлежит клиенту
                             cur.execute('''
-                                SELECT b.id, b.booking_date, b.start_time, b.status,
-                                       s.name as service_name
+                                SELECT b.id, b.status
                                 FROM bookings b
                                 LEFT JOIN clients c ON b.client_id = c.id
-                                LEFT JOIN services s ON b.service_id = s.id
-                                WHERE c.user_id = %s 
-                                  AND b.booking_date >= CURRENT_DATE
-                                  AND b.status IN ('pending', 'confirmed')
-                                ORDER BY b.booking_date, b.start_time
-                            ''', (user_id,))
+                                WHERE b.id = %s AND c.user_id = %s
+                            ''', (booking_id, user_id))
                             
-                            bookings = cur.fetchall()
+                            booking = cur.fetchone()
                             
-                            if bookings:
-                                response_text = '❌ <b>Выберите запись для отмены:</b>\n\n'
-                                buttons = []
-                                
-                                for booking in bookings:
-                                    date_str = booking['booking_date'].strftime('%d.%m.%Y')
-                                    time_str = booking['start_time'].strftime('%H:%M')
-                                    
-                                    response_text += f'📅 {date_str} в {time_str}\n'
-                                    response_text += f'💇 {booking["service_name"]}\n\n'
-                                    
-                                    buttons.append([{
-                                        'text': f'❌ Отменить #{booking["id"]} ({date_str} {time_str})',
-                                        'callback_data': f'client_cancel_{booking["id"]}'
-                                    }])
-                                
-                                reply_markup = {'inline_keyboard': buttons}
-                                send_telegram_message(chat_id, response_text, reply_markup)
+                            if not booking:
+                                response_text = '❌ Запись не найдена или не принадлежит вам.'
+                            elif booking['status'] == 'cancelled':
+                                response_text = '❌ Запись уже отменена.'
+                            elif booking['status'] == 'completed':
+                                response_text = '❌ Нельзя отменить завершённую запись.'
                             else:
-                                response_text = '✅ У вас нет активных записей для отмены.'
-                                send_telegram_message(chat_id, response_text)
-                        
-                        return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
-                    
-                    elif text.startswith('/cancel '):
-                        try:
-                            booking_id = int(text[8:])
-                            
-                            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                                # Проверяем, что запись принадлежит клиенту
-                                cur.execute('''
-                                    SELECT b.id, b.status
-                                    FROM bookings b
-                                    LEFT JOIN clients c ON b.client_id = c.id
-                                    WHERE b.id = %s AND c.user_id = %s
-                                ''', (booking_id, user_id))
-                                
-                                booking = cur.fetchone()
-                                
-                                if not booking:
-                                    response_text = '❌ Запись не найдена или не принадлежит вам.'
-                                elif booking['status'] == 'cancelled':
-                                    response_text = '❌ Запись уже отменена.'
-                                elif booking['status'] == 'completed':
-                                    response_text = '❌ Нельзя отменить завершённую запись.'
-                                else:
-                                    cur.execute(
-                                        'UPDATE bookings SET status = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s',
-                                        ('cancelled', booking_id)
-                                    )
-                                    conn.commit()
-                                    response_text = f'✅ Запись #{booking_id} отменена.'
-                            
-                            send_telegram_message(chat_id, response_text)
-                            return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
-                        except ValueError:
-                            response_text = '❌ Неверный формат. Используйте: /cancel'
-                            send_telegram_message(chat_id, response_text)
-                            return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
-                    
-                    else:
-                        response_text = '❓ Используйте кнопки меню для навигации.'
-                        keyboard = get_client_keyboard()
-                        send_telegram_message(chat_id, response_text, keyboard)
-                        return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
-                
-                # Новые пользователи (не зарегистрированы)
-                if not is_client and not is_owner:
-                    if text == '/start':
-                        response_text = '👋 <b>Добро пожаловать!</b>\n\n'
-                        response_text += 'Для работы с ботом выберите действие:\n\n'
-                        response_text += '📝 <b>Записаться на сеанс</b> - перейти на сайт для записи\n'
-                        response_text += '✍️ <b>Зарегистрироваться</b> - создать профиль в боте\n\n'
-                        response_text += 'Или используйте команду:\n'
-                        response_text += '<code>/start +79001234567</code> - если вы уже записывались'
+                                cur.execute(
+                                    'UPDATE bookings SET status = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s',
+                                    ('cancelled', booking_id)
+                                )
+                                conn.commit()
+                                response_text = f'✅ Запись #{booking_id} отменена.'
                         
-                        keyboard = get_client_keyboard()
-                        send_telegram_message(chat_id, response_text, keyboard)
-                        return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
-                    
-                    elif text == '📝 Записаться на сеанс':
-                        response_text = '🌐 <b>Онлайн-запись</b>\n\nДля записи на сеанс перейдите на наш сайт:\n👉 https://your-booking-site.com'
                         send_telegram_message(chat_id, response_text)
                         return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
-                    
-                    elif text == '✍️ Зарегистрироваться':
-                        response_text = '✍️ <b>Регистрация</b>\n\n📝 Отправьте ваше <b>имя</b>:'
+                    except ValueError:
+                        response_text = '❌ Неверный формат. Используйте: /cancel'
                         send_telegram_message(chat_id, response_text)
                         return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+                
+                else:
+                    response_text = '❓ Используйте кнопки меню для навигации.'
+                    keyboard = get_client_keyboard()
+                    send_telegram_message(chat_id, response_text, keyboard)
+                    return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+            
+            # Новые пользователи (не зарегистрированы)
+            if not is_client and not is_owner:
+                if text == '/start':
+                    response_text = '👋 <b>Добро пожаловать!</b>\n\n'
+                    response_text += 'Для работы с ботом выберите действие:\n\n'
+                    response_text += '📝 <b>Записаться на сеанс</b> - перейти на сайт для записи\n'
+                    response_text += '✍️ <b>Зарегистрироваться</b> - создать профиль в боте\n\n'
+                    response_text += 'Или используйте команду:\n'
+                    response_text += '<code>/start +79001234567</code> - если вы уже записывались'
                     
-                    else:
-                        response_text = '❓ Используйте кнопки меню или команду:\n<code>/start +79001234567</code>'
-                        keyboard = get_client_keyboard()
-                        send_telegram_message(chat_id, response_text, keyboard)
-                        return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+                    keyboard = get_client_keyboard()
+                    send_telegram_message(chat_id, response_text, keyboard)
+                    return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
                 
-                # Команды только для владельца
-                if not is_owner:
-                    response_text = '❌ У вас нет доступа к командам администратора.'
+                elif text == '📝 Записаться на сеанс':
+                    response_text = '🌐 <b>Онлайн-запись</b>\n\nДля записи на сеанс перейдите на наш сайт:\n👉 https://your-booking-site.com'
                     send_telegram_message(chat_id, response_text)
                     return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
                 
-                # Обработка команд владельца с параметрами
-                if text.startswith('/event_add '):
-                    parts = text[11:].split(' ', 3)
-                    if len(parts) >= 4:
-                        date, time_start, time_end, title = parts
-                        
-                        with conn.cursor() as cur:
-                            cur.execute('''
-                                INSERT INTO calendar_events (owner_id, event_date, start_time, end_time, title, event_type)
-                                VALUES (%s, %s, %s, %s, %s, %s)
-                            ''', (1, date, time_start, time_end, title, 'custom'))
-                            conn.commit()
-                        
-                        response_text = f'✅ Мероприятие "{title}" добавлено на {date}'
-                    else:
-                        response_text = '❌ Неверный формат. Используйте: /event_add ДАТА ВРЕМЯ_С ВРЕМЯ_ДО НАЗВАНИЕ'
+                elif text == '✍️ Зарегистрироваться':
+                    response_text = '✍️ <b>Регистрация</b>\n\n📝 Отправьте ваше <b>имя</b>:'
+                    send_telegram_message(chat_id, response_text)
+                    return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
                 
-                elif text.startswith('/event_delete '):
-                    event_id = int(text[14:])
+                else:
+                    response_text = '❓ Используйте кнопки меню или команду:\n<code>/start +79001234567</code>'
+                    keyboard = get_client_keyboard()
+                    send_telegram_message(chat_id, response_text, keyboard)
+                    return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+            
+            # Команды только для владельца
+            if not is_owner:
+                response_text = '❌ У вас нет доступа к командам администратора.'
+                send_telegram_message(chat_id, response_text)
+                return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+            
+            # Обработка команд владельца с параметрами
+            if text.startswith('/event_add '):
+                parts = text[11:].split(' ', 3)
+                if len(parts) >= 4:
+                    event_date, time_start, time_end, title = parts
+                    
                     with conn.cursor() as cur:
-                        cur.execute('DELETE FROM calendar_events WHERE id = %s AND owner_id = %s', (event_id, 1))
+                        cur.execute('''
+                            INSERT INTO calendar_events (owner_id, event_date, start_time, end_time, title, event_type)
+                            VALUES (%s, %s, %s, %s, %s, %s)
+                        ''', (1, event_date, time_start, time_end, title, 'custom'))
                         conn.commit()
-                    response_text = f'✅ Мероприятие #{event_id} удалено'
+                    
+                    response_text = f'✅ Мероприятие "{title}" добавлено на {event_date}'
+                else:
+                    response_text = '❌ Неверный формат. Используйте: /event_add ДАТА ВРЕМЯ_С ВРЕМЯ_ДО НАЗВАНИЕ'
+            
+            elif text.startswith('/event_delete '):
+                event_id = int(text[14:])
+                with conn.cursor() as cur:
+                    cur.execute('DELETE FROM calendar_events WHERE id = %s AND owner_id = %s', (event_id, 1))
+                    conn.commit()
+                response_text = f'✅ Мероприятие #{event_id} удалено'
+            
+            elif text.startswith('/block_date '):
+                blocked_date = text[12:].strip()
+                with conn.cursor() as cur:
+                    cur.execute('INSERT INTO blocked_dates (owner_id, blocked_date) VALUES (%s, %s)', (1, blocked_date))
+                    conn.commit()
+                response_text = f'🚫 Дата {blocked_date} заблокирована'
+            
+            elif text.startswith('/unblock_date '):
+                block_id = int(text[14:])
+                with conn.cursor() as cur:
+                    cur.execute('DELETE FROM blocked_dates WHERE id = %s AND owner_id = %s', (block_id, 1))
+                    conn.commit()
+                response_text = f'✅ Блокировка #{block_id} снята'
+            
+            elif text == '⚙️ Админ-панель':
+                # Отправляем inline-кнопку для прямого перехода
+                admin_url = f'https://telegram-diary-bot--preview.poehali.dev/WorldSettings?groupId={chat_id}'
+                response_text = '⚙️ <b>Админ-панель владельца</b>\n\nНажмите кнопку ниже для входа:'
                 
-                elif text.startswith('/block_date '):
-                    date = text[12:].strip()
-                    with conn.cursor() as cur:
-                        cur.execute('INSERT INTO blocked_dates (owner_id, blocked_date) VALUES (%s, %s)', (1, date))
-                        conn.commit()
-                    response_text = f'🚫 Дата {date} заблокирована'
+                reply_markup = {
+                    'inline_keyboard': [[{
+                        'text': '🔐 Войти в админ-панель',
+                        'url': admin_url
+                    }]]
+                }
                 
-                elif text.startswith('/unblock_date '):
-                    block_id = int(text[14:])
-                    with conn.cursor() as cur:
-                        cur.execute('DELETE FROM blocked_dates WHERE id = %s AND owner_id = %s', (block_id, 1))
-                        conn.commit()
-                    response_text = f'✅ Блокировка #{block_id} снята'
+                send_telegram_message(chat_id, response_text, reply_markup)
+                return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
+            
+            else:
+                # Обычные команды
+                response_text = handle_command(conn, chat_id, text, 1)
+            
+            if response_text:
+                # Всегда добавляем клавиатуру для владельца
+                keyboard = get_main_keyboard(chat_id if is_owner else None)
+                send_telegram_message(chat_id, response_text, keyboard)
+        
+        except Exception:
+            failed = True
+            release_update(conn, update_id)
+            raise
+        finally:
+            if not failed:
+                complete_update(conn, update_id)
+            conn.close()
+    
+    elif 'callback_query' in body:
+        callback = body['callback_query']
+        chat_id = callback['message']['chat']['id']
+        message_id = callback['message']['message_id']
+        callback_data = callback['data']
+        metrics = current_metrics()
+        metrics.resource = 'callback_query'
+        # Без числовых частей (id записи, страница): confirm, client_cancel, pending_page
+        metrics.action = '_'.join(part for part in callback_data.split('_') if not part.isdigit())
+        
+        conn = connect_db()
+        
+        # Telegram повторяет доставку, если не дождался ответа: повтор отсекаем до любой другой работы
+        update_id = body.get('update_id')
+        claim = claim_update(conn, update_id)
+        if claim != UPDATE_CLAIMED:
+            conn.close()
+            return skipped_update_response(claim)
+        
+        failed = False
+        try:
+            # Обработка callback от клиента
+            if callback_data.startswith('client_cancel_'):
+                booking_id = int(callback_data.split('_')[2])
                 
-                elif text == '⚙️ Админ-панель':
-                    # Отправляем inline-кнопку для прямого перехода
-                    admin_url = f'https://telegram-diary-bot--preview.poehali.dev/WorldSettings?groupId={chat_id}'
-                    response_text = '⚙️ <b>Админ-панель владельца</b>\n\nНажмите кнопку ниже для входа:'
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    # Проверяем принадлежность записи
+                    cur.execute('''
+                        SELECT b.id, b.status, c.user_id
+                        FROM bookings b
+                        LEFT JOIN clients c ON b.client_id = c.id
+                        WHERE b.id = %s
+                    ''', (booking_id,))
                     
-                    reply_markup = {
-                        'inline_keyboard': [[{
-                            'text': '🔐 Войти в админ-панель',
-                            'url': admin_url
-                        }]]
-                    }
+                    booking = cur.fetchone()
                     
-                    send_telegram_message(chat_id, response_text, reply_markup)
-                    return {'statusCode': 200, 'body': 'OK', 'isBase64Encoded': False}
-                
-                else:
-                    # Обычные команды
-                    response_text = handle_command(conn, chat_id, text, 1)
+                    # Проверяем telegram_id клиента
+                    identity = lookup_chat_identity(conn, chat_id)
+                    
+                    if not booking or not identity or booking['user_id'] != identity.user_id:
+                        response_text = '❌ Запись не найдена или не принадлежит вам.'
+                    elif booking['status'] == 'cancelled':
+                        response_text = '❌ Запись уже отменена.'
+                    elif booking['status'] == 'completed':
+                        response_text = '❌ Нельзя отменить завершённую запись.'
+                    else:
+                        cur.execute(
+                            'UPDATE bookings SET status = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s',
+                            ('cancelled', booking_id)
+                        )
+                        conn.commit()
+                        response_text = f'✅ Запись #{booking_id} отменена.'
                 
+                send_telegram_message(chat_id, response_text)
+            
+            # Обработка callback от владельца
+            elif is_access_allowed(chat_id):
+                response_text = handle_callback(conn, callback_data, chat_id, message_id, 1, callback['id'])
                 if response_text:
-                    # Всегда добавляем клавиатуру для владельца
-                    keyboard = get_main_keyboard(chat_id if is_owner else None)
+                    keyboard = get_main_keyboard()
                     send_telegram_message(chat_id, response_text, keyboard)
             
-            finally:
-                conn.close()
+        except Exception:
+            failed = True
+            release_update(conn, update_id)
+            raise
+        finally:
+            if not failed:
+                complete_update(conn, update_id)
+            conn.close()
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({'ok': True}),
+        'isBase64Encoded': False
+    }
+
+
+def process_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'POST')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+    
+    try:
+        body = json.loads(event.get('body', '{}'))
+        
+        # Отправка напоминаний (вызывается по крону или вручную)
+        if body.get('action') == 'send_reminders':
+            current_metrics().resource = 'reminders'
+            result = send_reminders()
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(result),
+                'isBase64Encoded': False
+            }
         
-        elif 'callback_query' in body:
-            callback = body['callback_query']
-            chat_id = callback['message']['chat']['id']
-            message_id = callback['message']['message_id']
-            callback_data = callback['data']
+        # Обработка уведомления о новой записи (от frontend)
+        if 'booking_id' in body and 'client_name' in body:
+            current_metrics().resource = 'notification'
+            config = access_config()
+            
+            # Приоритет: сначала группа, если настроена, иначе личка владельца
+            target_chat_id = config['group_id'] or config['owner_telegram_id']
             
-            db_url = os.environ.get('DATABASE_URL')
-            conn = psycopg2.connect(db_url)
+            if target_chat_id == 0:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'TELEGRAM_OWNER_ID or TELEGRAM_GROUP_ID not configured'}),
+                    'isBase64Encoded': False
+                }
             
+            success = send_booking_notification(target_chat_id, body)
+            
+            return {
+                'statusCode': 200 if success else 500,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({
+                    'success': success,
+                    'message': 'Notification sent' if success else 'Failed to send notification'
+                }),
+                'isBase64Encoded': False
+            }
+        
+        # Telegram webhook update
+        if 'message' in body or 'callback_query' in body:
+            # Исходящие вызовы копятся в outbox: последний вернётся прямо в ответе на webhook
+            outbox = WebhookOutbox()
+            token = _webhook_outbox.set(outbox)
             try:
-                # Обработка callback от клиента
-                if callback_data.startswith('client_cancel_'):
-                    booking_id = int(callback_data.split('_')[2])
-                    
-                    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                        # Проверяем принадлежность записи
-                        cur.execute('''
-                            SELECT b.id, b.status, c.user_id
-                            FROM bookings b
-                            LEFT JOIN clients c ON b.client_id = c.id
-                            WHERE b.id = %s
-                        ''', (booking_id,))
-                        
-                        booking = cur.fetchone()
-                        
-                        # Проверяем telegram_id клиента
-                        cur.execute('SELECT id FROM users WHERE telegram_id = %s', (chat_id,))
-                        user = cur.fetchone()
-                        
-                        if not booking or not user or booking['user_id'] != user['id']:
-                            response_text = '❌ Запись не найдена или не принадлежит вам.'
-                        elif booking['status'] == 'cancelled':
-                            response_text = '❌ Запись уже отменена.'
-                        elif booking['status'] == 'completed':
-                            response_text = '❌ Нельзя отменить завершённую запись.'
-                        else:
-                            cur.execute(
-                                'UPDATE bookings SET status = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s',
-                                ('cancelled', booking_id)
-                            )
-                            conn.commit()
-                            response_text = f'✅ Запись #{booking_id} отменена.'
-                    
-                    send_telegram_message(chat_id, response_text)
-                
-                # Обработка callback от владельца
-                elif is_access_allowed(chat_id):
-                    response_text = handle_callback(conn, callback_data, chat_id, message_id, 1)
-                    keyboard = get_main_keyboard()
-                    send_telegram_message(chat_id, response_text, keyboard)
-                
-            finally:
-                conn.close()
+                response = process_update(body)
+            except Exception:
+                # process_update уже снял отметку update: Telegram пришлёт его снова, и повтор создаст эти
+                # же сообщения. Накопленное не отправляем - иначе пользователь получит их дважды
+                _webhook_outbox.reset(token)
+                outbox.calls.clear()
+                raise
+            _webhook_outbox.reset(token)
+            return outbox.attach(response)
         
         return {
             'statusCode': 200,
@@ -1013,6 +2054,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     except Exception as e:
+        current_metrics().errors.append(f'{type(e).__name__}: {e}')
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json'},
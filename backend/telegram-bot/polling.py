@@ -0,0 +1,176 @@
+'''
+Business: Long-polling режим бота - getUpdates вместо webhook, для запуска отдельным процессом
+Args: --concurrency для числа параллельных обработчиков, --poll-timeout, --delete-webhook;
+      окружение то же, что у функции (TELEGRAM_BOT_TOKEN, DATABASE_URL, TELEGRAM_GROUP_ID, ...)
+Returns: Работает до SIGINT/SIGTERM, затем дообрабатывает принятые обновления
+
+Обновления разных чатов обрабатываются параллельно, обновления одного чата - строго по порядку.
+Обработка идёт через тот же handler, что и webhook, с общим пулом соединений и HTTP-клиентом Telegram.
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import index as bot
+
+ALLOWED_UPDATES = ['message', 'callback_query']
+
+# Обновление, обработка которого упала, Telegram повторно не пришлёт: offset уже подтвердил получение.
+# Повторяем его сами с паузой 1, 2, 4, 8 с; следующие обновления того же чата ждут
+UPDATE_MAX_ATTEMPTS = 5
+UPDATE_RETRY_DELAY = 1.0
+
+def update_chat_id(update: Dict[str, Any]) -> Optional[int]:
+    if 'message' in update:
+        return update['message']['chat']['id']
+    if 'callback_query' in update:
+        return update['callback_query']['message']['chat']['id']
+    return None
+
+class PollingWorker:
+    def __init__(self, concurrency: int, poll_timeout: int):
+        self.poll_timeout = poll_timeout
+        self.executor = ThreadPoolExecutor(max_workers=concurrency + 1, thread_name_prefix='bot')
+        self.slots = asyncio.Semaphore(concurrency)
+        # Отдельное соединение под long poll: оно висит до poll_timeout и не должно занимать общий пул
+        self.poll_client = bot.TelegramClient(max_idle=1, timeout=poll_timeout + 10)
+        self.chat_queues: Dict[Any, asyncio.Queue] = {}
+        self.chat_tasks: Dict[Any, asyncio.Task] = {}
+        self.stopping = asyncio.Event()
+        self.offset = 0
+
+    def get_updates(self) -> List[Dict[str, Any]]:
+        body = json.dumps({
+            'offset': self.offset,
+            'timeout': self.poll_timeout,
+            'allowed_updates': ALLOWED_UPDATES
+        }).encode('utf-8')
+        status, result = self.poll_client.call('getUpdates', body)
+        if status != 200:
+            raise RuntimeError(f'getUpdates failed: HTTP {status} {result.get("description")}')
+        return result.get('result', [])
+
+    def process(self, update: Dict[str, Any]) -> bool:
+        '''False - handler вернул 5xx (обработка упала и сняла отметку в processed_updates или update ещё держит другой вызов), нужен повтор'''
+        event = {
+            'httpMethod': 'POST',
+            'headers': {},
+            'queryStringParameters': {},
+            'body': json.dumps(update),
+            'isBase64Encoded': False
+        }
+        context = SimpleNamespace(request_id=f'poll-{update["update_id"]}', function_name='telegram-bot')
+        response = bot.handler(event, context)
+        if response.get('statusCode', 500) >= 500:
+            return False
+
+        # В webhook-режиме последний вызов уходит в теле ответа; здесь отвечать некуда - выполняем сами
+        try:
+            reply = json.loads(response.get('body') or '{}')
+        except ValueError:
+            return True
+        if isinstance(reply, dict) and 'method' in reply:
+            method = reply.pop('method')
+            bot.telegram_request(method, reply)
+        return True
+
+    async def run_chat(self, chat_id: Any, queue: asyncio.Queue) -> None:
+        '''Очередь одного чата: следующее обновление - только после завершения предыдущего'''
+        loop = asyncio.get_running_loop()
+        while not queue.empty():
+            update = queue.get_nowait()
+            for attempt in range(1, UPDATE_MAX_ATTEMPTS + 1):
+                async with self.slots:
+                    try:
+                        processed = await loop.run_in_executor(self.executor, self.process, update)
+                        error = None if processed else 'handler failed'
+                    except Exception as e:
+                        processed, error = False, f'{type(e).__name__}: {e}'
+                if processed:
+                    break
+                dropped = attempt == UPDATE_MAX_ATTEMPTS
+                print(json.dumps({'type': 'polling_error', 'updateId': update.get('update_id'), 'attempt': attempt,
+                                  'dropped': dropped, 'error': error}), flush=True)
+                if not dropped:
+                    await asyncio.sleep(UPDATE_RETRY_DELAY * 2 ** (attempt - 1))
+        del self.chat_queues[chat_id]
+        del self.chat_tasks[chat_id]
+
+    def dispatch(self, update: Dict[str, Any]) -> None:
+        chat_id = update_chat_id(update)
+        queue = self.chat_queues.get(chat_id)
+        if queue is None:
+            queue = self.chat_queues[chat_id] = asyncio.Queue()
+            queue.put_nowait(update)
+            self.chat_tasks[chat_id] = asyncio.create_task(self.run_chat(chat_id, queue))
+        else:
+            queue.put_nowait(update)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        backoff = 1
+        while not self.stopping.is_set():
+            poll = loop.run_in_executor(self.executor, self.get_updates)
+            stop = asyncio.ensure_future(self.stopping.wait())
+            done, _ = await asyncio.wait({poll, stop}, return_when=asyncio.FIRST_COMPLETED)
+            if stop in done:
+                poll.cancel()
+                break
+            stop.cancel()
+
+            try:
+                updates = poll.result()
+            except Exception as e:
+                print(json.dumps({'type': 'polling_error', 'error': f'{type(e).__name__}: {e}'}), flush=True)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            backoff = 1
+
+            # offset подтверждает Telegram получение: упавшие обновления повторяет run_chat, а дубли
+            # после перезапуска процесса отсечёт журнал processed_updates
+            for update in updates:
+                self.offset = max(self.offset, update['update_id'] + 1)
+                self.dispatch(update)
+
+        if self.chat_tasks:
+            await asyncio.gather(*self.chat_tasks.values())
+        self.executor.shutdown(wait=True)
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Run the Telegram bot with getUpdates long polling')
+    parser.add_argument('--concurrency', type=int, default=8, help='Updates processed in parallel (different chats)')
+    parser.add_argument('--poll-timeout', type=int, default=30, help='getUpdates long-poll timeout, seconds')
+    parser.add_argument('--delete-webhook', action='store_true',
+                        help='Remove the webhook first (getUpdates does not work while one is set)')
+    return parser.parse_args(argv)
+
+async def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    # Каждый обработчик держит одно соединение и иногда второе (dead letter) - пул с запасом
+    os.environ.setdefault('DATABASE_POOL_SIZE', str(args.concurrency * 2))
+
+    if args.delete_webhook:
+        ok, result = bot.telegram_request('deleteWebhook', {'drop_pending_updates': False})
+        if not ok:
+            print(f'deleteWebhook failed: {result.get("description")}', file=sys.stderr)
+            return 1
+
+    worker = PollingWorker(args.concurrency, args.poll_timeout)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stopping.set)
+    await worker.run()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,27 @@
+-- Очередь напоминаний: одна строка на подтверждённую запись
+-- due_at = начало записи минус reminder_hours владельца; строка ставится при подтверждении записи
+-- Обработчики забирают пачки через FOR UPDATE SKIP LOCKED, поэтому параллельные запуски не шлют дублей
+CREATE TABLE IF NOT EXISTS reminders (
+    id SERIAL PRIMARY KEY,
+    booking_id INTEGER NOT NULL UNIQUE REFERENCES bookings(id) ON DELETE CASCADE,
+    owner_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    due_at TIMESTAMP NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sent', 'skipped', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    sent_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Выборка к отправке идёт только по ожидающим напоминаниям в порядке due_at
+CREATE INDEX IF NOT EXISTS idx_reminders_due ON reminders(due_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_reminders_owner ON reminders(owner_id);
+
+-- Ставим в очередь уже подтверждённые будущие записи всех владельцев с включёнными напоминаниями
+INSERT INTO reminders (booking_id, owner_id, due_at)
+SELECT b.id, b.owner_id, b.booking_date + b.start_time - INTERVAL '1 hour' * s.value::numeric
+FROM bookings b
+JOIN settings s ON s.owner_id = b.owner_id AND s.key = 'reminder_hours'
+WHERE b.status = 'confirmed'
+AND b.booking_date >= CURRENT_DATE
+AND s.value::numeric > 0
+ON CONFLICT (booking_id) DO NOTHING;
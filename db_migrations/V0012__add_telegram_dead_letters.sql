@@ -0,0 +1,15 @@
+-- Сообщения Telegram, которые не удалось доставить после всех повторов
+-- (чат не найден, бот заблокирован, исчерпаны попытки при 429/5xx, сеть недоступна)
+-- payload хранится целиком, чтобы сообщение можно было разобрать и отправить повторно
+CREATE TABLE IF NOT EXISTS telegram_dead_letters (
+    id SERIAL PRIMARY KEY,
+    chat_id BIGINT,
+    method VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_telegram_dead_letters_created ON telegram_dead_letters(created_at);
+CREATE INDEX IF NOT EXISTS idx_telegram_dead_letters_chat ON telegram_dead_letters(chat_id);
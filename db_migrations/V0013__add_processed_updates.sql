@@ -0,0 +1,9 @@
+-- Журнал обработанных обновлений Telegram (update_id из webhook)
+-- Повторная доставка того же update отсекается до любой другой работы с БД
+-- Записи старше суток удаляет сам бот (скользящее окно)
+CREATE TABLE IF NOT EXISTS processed_updates (
+    update_id BIGINT PRIMARY KEY,
+    processed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_processed_updates_processed_at ON processed_updates(processed_at);
@@ -0,0 +1,72 @@
+-- Версии дней календаря для кэша повестки в боте
+-- Любая запись в bookings, calendar_events, blocked_dates за день поднимает версию этого дня;
+-- изменения расписания учёбы, услуг и имени/телефона клиента поднимают версию владельца целиком.
+-- Бот сверяет версию одним маленьким запросом и перерисовывает день только если она изменилась.
+-- Версии берутся из одной последовательности, поэтому всегда растут
+CREATE SEQUENCE IF NOT EXISTS calendar_version_seq;
+
+CREATE TABLE IF NOT EXISTS calendar_versions (
+    owner_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    version BIGINT NOT NULL,
+    PRIMARY KEY (owner_id, day)
+);
+
+-- Запись, мероприятие или блокировка меняют свой день (при переносе - оба дня).
+-- Без аргумента триггера (расписание учёбы, услуги) меняется версия владельца целиком - день '-infinity'
+CREATE OR REPLACE FUNCTION touch_calendar_version() RETURNS TRIGGER AS $$
+DECLARE
+    row_data JSONB;
+BEGIN
+    FOREACH row_data IN ARRAY ARRAY[
+        CASE WHEN TG_OP <> 'INSERT' THEN to_jsonb(OLD) END,
+        CASE WHEN TG_OP <> 'DELETE' THEN to_jsonb(NEW) END
+    ] LOOP
+        CONTINUE WHEN row_data IS NULL;
+        INSERT INTO calendar_versions (owner_id, day, version)
+        VALUES (
+            (row_data->>'owner_id')::INTEGER,
+            CASE WHEN TG_NARGS > 0 THEN (row_data->>TG_ARGV[0])::DATE ELSE '-infinity'::DATE END,
+            nextval('calendar_version_seq')
+        )
+        ON CONFLICT (owner_id, day) DO UPDATE SET version = EXCLUDED.version;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Имя и телефон клиента выводятся в повестке всех владельцев, у которых он клиент
+CREATE OR REPLACE FUNCTION touch_calendar_version_for_user() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO calendar_versions (owner_id, day, version)
+    SELECT owners.owner_id, '-infinity'::DATE, nextval('calendar_version_seq')
+    FROM (SELECT DISTINCT owner_id FROM clients WHERE user_id = NEW.id) owners
+    ON CONFLICT (owner_id, day) DO UPDATE SET version = EXCLUDED.version;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bookings_calendar_version ON bookings;
+CREATE TRIGGER bookings_calendar_version AFTER INSERT OR UPDATE OR DELETE ON bookings
+    FOR EACH ROW EXECUTE FUNCTION touch_calendar_version('booking_date');
+
+DROP TRIGGER IF EXISTS calendar_events_calendar_version ON calendar_events;
+CREATE TRIGGER calendar_events_calendar_version AFTER INSERT OR UPDATE OR DELETE ON calendar_events
+    FOR EACH ROW EXECUTE FUNCTION touch_calendar_version('event_date');
+
+DROP TRIGGER IF EXISTS blocked_dates_calendar_version ON blocked_dates;
+CREATE TRIGGER blocked_dates_calendar_version AFTER INSERT OR UPDATE OR DELETE ON blocked_dates
+    FOR EACH ROW EXECUTE FUNCTION touch_calendar_version('blocked_date');
+
+DROP TRIGGER IF EXISTS week_schedule_calendar_version ON week_schedule;
+CREATE TRIGGER week_schedule_calendar_version AFTER INSERT OR UPDATE OR DELETE ON week_schedule
+    FOR EACH ROW EXECUTE FUNCTION touch_calendar_version();
+
+DROP TRIGGER IF EXISTS services_calendar_version ON services;
+CREATE TRIGGER services_calendar_version AFTER UPDATE OR DELETE ON services
+    FOR EACH ROW EXECUTE FUNCTION touch_calendar_version();
+
+DROP TRIGGER IF EXISTS users_calendar_version ON users;
+CREATE TRIGGER users_calendar_version AFTER UPDATE OF name, phone ON users
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name OR OLD.phone IS DISTINCT FROM NEW.phone)
+    EXECUTE FUNCTION touch_calendar_version_for_user();
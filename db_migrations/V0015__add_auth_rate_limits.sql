@@ -0,0 +1,13 @@
+-- Общий для всех инстансов auth счётчик попыток входа (RATE_LIMIT_BACKEND=postgres)
+-- Скользящее окно по двум счётчикам: текущее и предыдущее окно по TIME_WINDOW секунд
+-- UNLOGGED: без WAL, после сбоя сервера таблица очищается - для лимитов это допустимо
+-- Ключи, не встречавшиеся два окна, периодически удаляет сама функция auth
+CREATE UNLOGGED TABLE IF NOT EXISTS auth_rate_limits (
+    key VARCHAR(64) PRIMARY KEY,
+    window_start BIGINT NOT NULL,
+    current_count INTEGER NOT NULL,
+    previous_count INTEGER NOT NULL,
+    allowed BOOLEAN NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_auth_rate_limits_window ON auth_rate_limits(window_start);
@@ -0,0 +1,25 @@
+-- Индексы под горячие запросы api и бота; проверяются прогоном scripts/explain_queries.py
+-- Частичные индексы по статусу: запрос с тем же условием на status читает только свои записи,
+-- а не все записи владельца через idx_bookings_owner_date с отбрасыванием остальных фильтром
+
+-- /pending: ожидающие подтверждения записи владельца в порядке даты и времени
+CREATE INDEX IF NOT EXISTS idx_bookings_pending ON bookings(owner_id, booking_date, start_time)
+    WHERE status = 'pending';
+
+-- Постановка напоминаний, проверка конфликтов с мероприятиями и блокировками дат
+CREATE INDEX IF NOT EXISTS idx_bookings_confirmed ON bookings(owner_id, booking_date, start_time)
+    WHERE status = 'confirmed';
+
+-- Свободные слоты: все неотменённые записи дня
+CREATE INDEX IF NOT EXISTS idx_bookings_active ON bookings(owner_id, booking_date, start_time)
+    WHERE status <> 'cancelled';
+
+-- Внешние ключи без индекса: удаление услуги или мероприятия перебирало все записи
+CREATE INDEX IF NOT EXISTS idx_bookings_service ON bookings(service_id);
+CREATE INDEX IF NOT EXISTS idx_bookings_event ON bookings(event_id) WHERE event_id IS NOT NULL;
+
+-- Поиск клиента по телефону (/start с номером, создание клиента из админки)
+CREATE INDEX IF NOT EXISTS idx_users_phone ON users(phone);
+
+ANALYZE bookings;
+ANALYZE users;
@@ -0,0 +1,151 @@
+-- Секционирование bookings по месяцам booking_date: bookings_YYYY_MM и bookings_default для дат вне секций
+-- Запросы с условием на дату читают одну-две секции, старые месяцы удаляются отсоединением секции
+--
+-- Первичный ключ секционированной таблицы обязан содержать ключ секционирования: (id, booking_date).
+-- Уникальность id обеспечивает последовательность bookings_id_seq, но внешний ключ на bookings(id)
+-- теперь невозможен - reminders.booking_id вместо ON DELETE CASCADE очищается триггером
+-- Индексы объявлены на bookings и создаются в каждой секции, в том числе в новых.
+-- idx_bookings_owner (префикс idx_bookings_owner_date) и idx_bookings_date (отсечение секций по дате)
+-- не пересоздаются: запрос по одному id открывает все секции с их индексами, лишние индексы это удорожают
+
+-- Секции по месяцам на период [from_date, to_date]; строки этих месяцев из bookings_default переносятся.
+-- Возвращает число созданных секций. Вызывается из send_reminders бота на BOOKING_PARTITIONS_AHEAD месяцев вперёд
+CREATE OR REPLACE FUNCTION create_bookings_partitions(from_date DATE, to_date DATE) RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_date)::DATE;
+    month_end DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    -- Параллельные вызовы создают секции по очереди, а не падают на "relation already exists"
+    PERFORM pg_advisory_xact_lock(hashtext('create_bookings_partitions'));
+    WHILE month_start <= to_date LOOP
+        month_end := (month_start + INTERVAL '1 month')::DATE;
+        partition_name := 'bookings_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            IF EXISTS (SELECT 1 FROM bookings_default WHERE booking_date >= month_start AND booking_date < month_end) THEN
+                -- Пока в bookings_default есть строки месяца, секцию под него не создать: переносим их
+                ALTER TABLE bookings DETACH PARTITION bookings_default;
+                EXECUTE format('CREATE TABLE %I PARTITION OF bookings FOR VALUES FROM (%L) TO (%L)',
+                               partition_name, month_start, month_end);
+                EXECUTE format('WITH moved AS (DELETE FROM bookings_default WHERE booking_date >= %L AND booking_date < %L RETURNING *) '
+                               'INSERT INTO %I SELECT * FROM moved', month_start, month_end, partition_name);
+                ALTER TABLE bookings ATTACH PARTITION bookings_default DEFAULT;
+            ELSE
+                EXECUTE format('CREATE TABLE %I PARTITION OF bookings FOR VALUES FROM (%L) TO (%L)',
+                               partition_name, month_start, month_end);
+            END IF;
+            created := created + 1;
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Отсоединение секций целиком старше before_date: вместо DELETE миллионов строк - изменение каталога.
+-- Напоминания отсоединённых записей удаляются, версии их дней сбрасываются для кэша повестки.
+-- Отсоединённые таблицы остаются под своими именами - архивировать или DROP TABLE по их списку
+CREATE OR REPLACE FUNCTION detach_bookings_partitions(before_date DATE) RETURNS SETOF TEXT AS $$
+DECLARE
+    partition_name TEXT;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'bookings'::regclass
+        AND c.relname ~ '^bookings_\d{4}_\d{2}$'
+        AND (to_date(substring(c.relname FROM 10), 'YYYY_MM') + INTERVAL '1 month')::DATE <= before_date
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('DELETE FROM reminders WHERE booking_id IN (SELECT id FROM %I)', partition_name);
+        EXECUTE format('INSERT INTO calendar_versions (owner_id, day, version) '
+                       'SELECT owner_id, booking_date, nextval(''calendar_version_seq'') '
+                       'FROM (SELECT DISTINCT owner_id, booking_date FROM %I) days '
+                       'ON CONFLICT (owner_id, day) DO UPDATE SET version = EXCLUDED.version', partition_name);
+        EXECUTE format('ALTER TABLE bookings DETACH PARTITION %I', partition_name);
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Замена ON DELETE CASCADE для reminders.booking_id. Перенос записи в другой месяц - это DELETE из старой
+-- секции и INSERT в новую, поэтому напоминание удаляется, только если записи с этим id больше нет
+CREATE OR REPLACE FUNCTION delete_booking_reminders() RETURNS TRIGGER AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM reminders WHERE booking_id = OLD.id)
+       AND NOT EXISTS (SELECT 1 FROM bookings WHERE id = OLD.id) THEN
+        DELETE FROM reminders WHERE booking_id = OLD.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Перестройка существующей таблицы; повторный запуск на уже секционированной ничего не делает
+DO $$
+DECLARE
+    first_date DATE;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'bookings'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE reminders DROP CONSTRAINT IF EXISTS reminders_booking_id_fkey;
+    -- Последовательность переживёт удаление старой таблицы и продолжит нумерацию
+    ALTER SEQUENCE bookings_id_seq OWNED BY NONE;
+    ALTER TABLE bookings RENAME TO bookings_unpartitioned;
+    -- Имена индексов уникальны в схеме: освобождаем их для индексов новой таблицы
+    ALTER TABLE bookings_unpartitioned DROP CONSTRAINT bookings_pkey;
+    DROP INDEX IF EXISTS idx_bookings_client, idx_bookings_owner, idx_bookings_date, idx_bookings_owner_date,
+        idx_bookings_service, idx_bookings_event, idx_bookings_pending, idx_bookings_confirmed, idx_bookings_active;
+
+    CREATE TABLE bookings (
+        id INTEGER NOT NULL DEFAULT nextval('bookings_id_seq'),
+        client_id INTEGER NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
+        service_id INTEGER NOT NULL REFERENCES services(id) ON DELETE CASCADE,
+        owner_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        event_id INTEGER REFERENCES calendar_events(id) ON DELETE SET NULL,
+        booking_date DATE NOT NULL,
+        start_time TIME NOT NULL,
+        end_time TIME NOT NULL,
+        status VARCHAR(50) NOT NULL DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, booking_date)
+    ) PARTITION BY RANGE (booking_date);
+    ALTER SEQUENCE bookings_id_seq OWNED BY bookings.id;
+    CREATE TABLE bookings_default PARTITION OF bookings DEFAULT;
+
+    SELECT LEAST(MIN(booking_date), CURRENT_DATE) INTO first_date FROM bookings_unpartitioned;
+    PERFORM create_bookings_partitions(COALESCE(first_date, CURRENT_DATE), (CURRENT_DATE + INTERVAL '6 months')::DATE);
+
+    -- Триггеры и индексы - после переноса: версии дней не нужны, индексы строятся один раз
+    INSERT INTO bookings (id, client_id, service_id, owner_id, event_id, booking_date, start_time, end_time,
+                          status, created_at, updated_at)
+    SELECT id, client_id, service_id, owner_id, event_id, booking_date, start_time, end_time,
+           status, created_at, updated_at
+    FROM bookings_unpartitioned;
+    DROP TABLE bookings_unpartitioned;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_bookings_client ON bookings(client_id);
+CREATE INDEX IF NOT EXISTS idx_bookings_owner_date ON bookings(owner_id, booking_date);
+CREATE INDEX IF NOT EXISTS idx_bookings_service ON bookings(service_id);
+CREATE INDEX IF NOT EXISTS idx_bookings_event ON bookings(event_id) WHERE event_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_bookings_pending ON bookings(owner_id, booking_date, start_time)
+    WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_bookings_confirmed ON bookings(owner_id, booking_date, start_time)
+    WHERE status = 'confirmed';
+CREATE INDEX IF NOT EXISTS idx_bookings_active ON bookings(owner_id, booking_date, start_time)
+    WHERE status <> 'cancelled';
+
+-- Триггер версий календаря (V0014) пересоздаётся на новой таблице и действует во всех секциях
+DROP TRIGGER IF EXISTS bookings_calendar_version ON bookings;
+CREATE TRIGGER bookings_calendar_version AFTER INSERT OR UPDATE OR DELETE ON bookings
+    FOR EACH ROW EXECUTE FUNCTION touch_calendar_version('booking_date');
+
+DROP TRIGGER IF EXISTS bookings_delete_reminders ON bookings;
+CREATE TRIGGER bookings_delete_reminders AFTER DELETE ON bookings
+    FOR EACH ROW EXECUTE FUNCTION delete_booking_reminders();
+
+ANALYZE bookings;
@@ -0,0 +1,7 @@
+-- Отметка в processed_updates ставится до обработки update и становится арендой:
+-- processed_at - время захвата, completed_at - успешное завершение.
+-- Повтор незавершённого update, чья аренда истекла (вызов упал, не сняв отметку), обрабатывается заново
+ALTER TABLE processed_updates ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP;
+
+-- Отметки до миграции ставились только для обработанных update
+UPDATE processed_updates SET completed_at = processed_at WHERE completed_at IS NULL;
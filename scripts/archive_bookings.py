@@ -0,0 +1,215 @@
+'''
+Business: Архивация старых записей: выгрузка в сжатые NDJSON-файлы и удаление из bookings пачками
+Args: --before ДАТА или --older-than-days N (записи с booking_date раньше границы), --output-dir,
+      --chunk-rows (строк в файле), --itersize (строк за один FETCH), --delete-batch, --no-delete; DATABASE_URL
+Returns: Файлы bookings_<граница>_<запуск>_NNNNN.ndjson.gz с записями вместе с именами клиента и услуги,
+         manifest.ndjson со строкой на файл и отчёт в stderr
+
+Память не растёт с объёмом истории: строки идут через именованный (серверный) курсор по --itersize,
+пишутся в gzip построчно, а в памяти держатся только ключи строк текущего файла - до их удаления.
+Строки удаляются только после того, как их файл записан на диск (fsync) и переименован из .part.
+Удаление идёт отдельным соединением, пачками по --delete-batch с commit после каждой; запись,
+изменённая после выгрузки (другой updated_at), не удаляется - её заберёт следующий запуск.
+'''
+
+import argparse
+import gzip
+import json
+import os
+import resource
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+ARCHIVE_QUERY = '''
+    SELECT
+        b.id, b.owner_id, b.booking_date, b.start_time, b.end_time, b.status, b.event_id,
+        b.client_id, u.name as client_name, u.phone as client_phone,
+        b.service_id, s.name as service_name, s.price,
+        b.created_at, b.updated_at
+    FROM bookings b
+    LEFT JOIN clients c ON b.client_id = c.id
+    LEFT JOIN users u ON c.user_id = u.id
+    LEFT JOIN services s ON b.service_id = s.id
+    WHERE b.booking_date < %s
+'''
+
+# Ключ удаления - (id, booking_date): диапазон дат пачки отсекает лишние секции bookings.
+# updated_at сверяется, чтобы не удалить запись, изменённую уже после выгрузки
+DELETE_QUERY = '''
+    DELETE FROM bookings b
+    USING unnest(%(ids)s::int[], %(dates)s::date[], %(updated)s::timestamp[]) AS a(id, booking_date, updated_at)
+    WHERE b.booking_date BETWEEN %(first)s AND %(last)s
+    AND b.id = a.id AND b.booking_date = a.booking_date
+    AND b.updated_at IS NOT DISTINCT FROM a.updated_at
+'''
+
+ArchivedKey = Tuple[int, date, Optional[datetime]]
+
+def json_value(value: Any) -> Any:
+    if isinstance(value, (date, datetime)) or hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+class ArchiveWriter:
+    '''Файлы по chunk_rows строк: пишется .part, после fsync переименовывается и попадает в manifest'''
+
+    def __init__(self, output_dir: str, prefix: str, chunk_rows: int):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.chunk_rows = chunk_rows
+        self.files = 0
+        self.bytes = 0
+        self._file = None
+        self._gzip = None
+        self._path = ''
+        self._rows = 0
+        self._first: Optional[date] = None
+        self._last: Optional[date] = None
+
+    @property
+    def full(self) -> bool:
+        return self._rows >= self.chunk_rows
+
+    def write(self, row: Dict[str, Any]) -> None:
+        if self._gzip is None:
+            self.files += 1
+            self._path = os.path.join(self.output_dir, f'{self.prefix}_{self.files:05d}.ndjson.gz')
+            self._file = open(self._path + '.part', 'wb')
+            self._gzip = gzip.GzipFile(fileobj=self._file, mode='wb', compresslevel=6)
+        self._gzip.write(json.dumps(row, ensure_ascii=False, default=json_value).encode('utf-8') + b'\n')
+        self._rows += 1
+        day = row['booking_date']
+        self._first = day if self._first is None or day < self._first else self._first
+        self._last = day if self._last is None or day > self._last else self._last
+
+    def close_chunk(self) -> int:
+        '''Дописывает текущий файл на диск; после возврата его строки можно удалять из БД'''
+        if self._gzip is None:
+            return 0
+        self._gzip.close()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._path + '.part', self._path)
+        size = os.path.getsize(self._path)
+        self.bytes += size
+
+        with open(os.path.join(self.output_dir, 'manifest.ndjson'), 'a', encoding='utf-8') as manifest:
+            manifest.write(json.dumps({
+                'file': os.path.basename(self._path),
+                'rows': self._rows,
+                'bytes': size,
+                'firstDate': self._first.isoformat(),
+                'lastDate': self._last.isoformat()
+            }) + '\n')
+
+        rows = self._rows
+        self._gzip = self._file = None
+        self._rows = 0
+        self._first = self._last = None
+        return rows
+
+def delete_archived(conn, keys: List[ArchivedKey], batch_size: int) -> int:
+    deleted = 0
+    with conn.cursor() as cur:
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            dates = [key[1] for key in batch]
+            cur.execute(DELETE_QUERY, {
+                'ids': [key[0] for key in batch],
+                'dates': dates,
+                'updated': [key[2] for key in batch],
+                'first': min(dates),
+                'last': max(dates)
+            })
+            deleted += cur.rowcount
+            # Короткие транзакции: блокировки строк и WAL не копятся на весь архив
+            conn.commit()
+    return deleted
+
+def archive(args: argparse.Namespace) -> Dict[str, Any]:
+    os.makedirs(args.output_dir, exist_ok=True)
+    prefix = f'bookings_{args.before.isoformat()}_{datetime.now().strftime("%Y%m%d%H%M%S")}'
+    writer = ArchiveWriter(args.output_dir, prefix, args.chunk_rows)
+    totals = {'exported': 0, 'deleted': 0}
+
+    read_conn = psycopg2.connect(args.dsn)
+    delete_conn = None if args.no_delete else psycopg2.connect(args.dsn)
+    try:
+        # Снимок чтения фиксируется при открытии курсора: удаления из второго соединения ему не мешают
+        read_conn.set_session(readonly=True)
+        with read_conn.cursor(name='archive_bookings', cursor_factory=RealDictCursor) as cur:
+            cur.itersize = args.itersize
+            cur.execute(ARCHIVE_QUERY, (args.before,))
+
+            keys: List[ArchivedKey] = []
+            for row in cur:
+                writer.write(row)
+                if delete_conn is not None:
+                    keys.append((row['id'], row['booking_date'], row['updated_at']))
+                if writer.full:
+                    totals['exported'] += writer.close_chunk()
+                    if delete_conn is not None:
+                        totals['deleted'] += delete_archived(delete_conn, keys, args.delete_batch)
+                    keys = []
+                    print(f'{writer.files:5d} files  {totals["exported"]:>10d} rows exported  '
+                          f'{totals["deleted"]:>10d} deleted', file=sys.stderr)
+
+            totals['exported'] += writer.close_chunk()
+            if delete_conn is not None and keys:
+                totals['deleted'] += delete_archived(delete_conn, keys, args.delete_batch)
+        read_conn.rollback()
+
+        if delete_conn is not None and totals['deleted'] and not args.no_vacuum:
+            # Освобождённое место и статистика планировщика - сразу, не дожидаясь autovacuum
+            delete_conn.autocommit = True
+            with delete_conn.cursor() as cur:
+                cur.execute('VACUUM (ANALYZE) bookings')
+                cur.execute('VACUUM (ANALYZE) reminders')
+    finally:
+        read_conn.close()
+        if delete_conn is not None:
+            delete_conn.close()
+
+    return {**totals, 'files': writer.files, 'bytes': writer.bytes}
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Export old bookings to compressed NDJSON and delete them in batches')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'), help='Database (default: $DATABASE_URL)')
+    cutoff = parser.add_mutually_exclusive_group(required=True)
+    cutoff.add_argument('--before', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+                        help='Archive bookings with booking_date before this date (YYYY-MM-DD)')
+    cutoff.add_argument('--older-than-days', type=int, help='Archive bookings older than N days')
+    parser.add_argument('--output-dir', default='archive', help='Directory for .ndjson.gz files and manifest.ndjson')
+    parser.add_argument('--chunk-rows', type=int, default=50000,
+                        help='Rows per archive file; rows are deleted once their file is on disk')
+    parser.add_argument('--itersize', type=int, default=2000, help='Rows fetched from the server-side cursor at once')
+    parser.add_argument('--delete-batch', type=int, default=1000, help='Rows deleted per transaction')
+    parser.add_argument('--no-delete', action='store_true', help='Export only, keep the rows')
+    parser.add_argument('--no-vacuum', action='store_true', help='Skip VACUUM (ANALYZE) after deleting')
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error('--dsn or DATABASE_URL is required')
+    if args.before is None:
+        args.before = date.today() - timedelta(days=args.older_than_days)
+    return args
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    started = time.perf_counter()
+    result = archive(args)
+    elapsed = time.perf_counter() - started
+    # ru_maxrss в Linux - в килобайтах
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'Archived bookings before {args.before}: {result["exported"]} rows in {result["files"]} files '
+          f'({result["bytes"] / 1024 / 1024:.1f} MB), {result["deleted"]} deleted, '
+          f'{elapsed:.1f}s, peak memory {peak_mb:.0f} MB', file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
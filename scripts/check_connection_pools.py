@@ -0,0 +1,81 @@
+'''
+Business: Проверка, что пул соединений единого процесса переиспользует соединения под параллельной нагрузкой
+Args: --requests, --concurrency, --pool-size, DATABASE_URL (засеянная БД)
+Returns: Код выхода 0, если psycopg2.connect вызывался не больше --pool-size раз, иначе 1
+
+Параллельные GET api идут через handler backend/server.py с общим пулом api и бота;
+каждое открытое соединение считается через тот же счётчик, что и в run_backend_tests.py.
+'''
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Dict, Optional, Sequence
+
+from run_backend_tests import BACKEND_DIR, QueryCounter, install_query_counter
+
+# Запросы, которые держат соединение заметное время: иначе параллельные вызовы почти не пересекаются
+PATHS = (
+    ('/api', {'resource': 'bookings', 'owner_id': '1'}),
+    ('/api', {'resource': 'admin_data', 'owner_id': '1'}),
+)
+
+def load_server() -> Any:
+    spec = importlib.util.spec_from_file_location('backend_server', os.path.join(BACKEND_DIR, 'server.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['backend_server'] = module
+    spec.loader.exec_module(module)
+    return module
+
+def request(server: Any, index: int) -> int:
+    path, query = PATHS[index % len(PATHS)]
+    event: Dict[str, Any] = {
+        'httpMethod': 'GET',
+        'path': path,
+        'headers': {},
+        'queryStringParameters': dict(query),
+        'body': '',
+        'isBase64Encoded': False
+    }
+    response = server.handler(event, SimpleNamespace(request_id=f'pool-check-{index}', function_name='api'))
+    return response.get('statusCode')
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Check that the shared connection pool reuses connections')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'), help='Seeded database (default: $DATABASE_URL)')
+    parser.add_argument('--requests', type=int, default=200, help='Requests to send')
+    parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at once')
+    parser.add_argument('--pool-size', type=int, default=10, help='DATABASE_POOL_SIZE of the process')
+    return parser.parse_args(argv)
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    if not args.dsn:
+        print('--dsn or DATABASE_URL is required', file=sys.stderr)
+        return 2
+    os.environ['DATABASE_URL'] = args.dsn
+    os.environ['DATABASE_POOL_SIZE'] = str(args.pool_size)
+
+    counter = QueryCounter()
+    install_query_counter(counter)
+    server = load_server()
+
+    # handler пишет JSON-строку трейса на каждый вызов - в отчёте они не нужны
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        statuses = list(pool.map(lambda index: request(server, index), range(args.requests)))
+
+    failed = sum(1 for status in statuses if status != 200)
+    print(f'{args.requests} requests ({failed} not 200), concurrency {args.concurrency}: '
+          f'{counter.connections} connections opened, pool size {args.pool_size}')
+    if failed or counter.connections > args.pool_size:
+        print('FAIL connections are not reused' if counter.connections > args.pool_size else 'FAIL requests failed')
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+'''
+Business: Проверка, что бот выдерживает retry_after из ответов 429 Bot API - и для вызовов в чат, и без chat_id
+Args: --rate-limit (доля ответов 429 у заглушки, по умолчанию 1 - все), --retry-after, DATABASE_URL для dead letters
+Returns: Код выхода 0, если между 429 и повтором того же вызова прошло не меньше retry_after, иначе 1
+
+Вызовы идут через telegram_request() бота против scripts/telegram_stub.py; время попыток берётся из журнала заглушки.
+'''
+
+import argparse
+import contextlib
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from run_backend_tests import load_handler_module
+from telegram_stub import BotApiStub
+
+# Метка времени вызова в журнале заглушки округлена до миллисекунды
+TIMESTAMP_TOLERANCE = 0.002
+
+CALLS: List[Tuple[str, Dict[str, Any]]] = [
+    ('sendMessage', {'chat_id': 123456789, 'text': 'retry check'}),
+    ('answerCallbackQuery', {'callback_query_id': 'retry-check'}),
+]
+
+def check_calls(calls: List[Dict[str, Any]], retry_after: int, max_attempts: int) -> List[str]:
+    failures = []
+    by_method: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for call in calls:
+        by_method[call['method']].append(call)
+
+    for method, attempts in by_method.items():
+        if len(attempts) > max_attempts:
+            failures.append(f'{method}: {len(attempts)} attempts > {max_attempts}')
+        for previous, current in zip(attempts, attempts[1:]):
+            gap = current['ts'] - previous['ts']
+            if previous['status'] == 429 and gap + TIMESTAMP_TOLERANCE < retry_after:
+                failures.append(f'{method}: retried {gap:.3f}s after 429, retry_after is {retry_after}s')
+    return failures
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Check that Bot API calls honour retry_after from 429 responses')
+    parser.add_argument('--rate-limit', type=float, default=1.0, help='Share of calls answered with 429 (0..1)')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after sent with 429 responses')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'),
+                        help='Database for dead letters (default: $DATABASE_URL)')
+    parser.add_argument('--seed', type=int, help='Seed for reproducible 429 injection')
+    return parser.parse_args(argv)
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.dsn:
+        os.environ['DATABASE_URL'] = args.dsn
+
+    stub = BotApiStub(rate_limit=args.rate_limit, retry_after=args.retry_after, seed=args.seed).start()
+    os.environ['TELEGRAM_API_URL'] = stub.url
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'retry-check')
+    try:
+        module = load_handler_module('telegram-bot')
+        for method, payload in CALLS:
+            started = time.perf_counter()
+            # Dead letter без БД печатается JSON-строкой - в отчёте она не нужна
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                ok, _ = module.telegram_request(method, payload)
+            print(f'{method:<22} {"ok" if ok else "dead letter":<12} {time.perf_counter() - started:6.2f}s')
+    finally:
+        stub.stop()
+
+    failures = check_calls(stub.calls, args.retry_after, module.TELEGRAM_MAX_ATTEMPTS)
+    for failure in failures:
+        print(f'FAIL {failure}')
+    if not failures:
+        print(f'retry_after of {args.retry_after}s honoured by {len(stub.calls)} calls')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
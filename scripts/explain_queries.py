@@ -0,0 +1,379 @@
+'''
+Business: Регрессионный прогон планов запросов: EXPLAIN (FORMAT JSON) каждого SQL-выражения api и telegram-bot
+Args: DATABASE_URL засеянной базы (scripts/generate_dataset.py), --env KEY=VALUE для секретов,
+      --min-rows - с какого размера таблица считается большой, -v - печатать и прошедшие запросы
+Returns: Код выхода 0, если ни один план не фильтрует большую таблицу через Seq Scan и у внешних ключей
+         больших таблиц есть индексы, иначе 1
+
+Запросы не выписываются вручную: сценарии (tests.json функций и SCENARIOS ниже) прогоняются через
+handler, каждое выполненное выражение записывается вместе с параметрами и местом вызова. Изменения
+не сохраняются - commit подменён, соединение при закрытии откатывается. Затем каждое уникальное
+выражение объясняется на отдельном соединении.
+'''
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+from string import Template
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import psycopg2
+
+from run_backend_tests import BACKEND_DIR, block_external_network, build_event, load_handler_module
+
+DEFAULT_MIN_ROWS = 10000
+
+# Значения для сценариев берутся из засеянной БД; в сценариях они подставляются как $name
+FIXTURES = {
+    'client_id': 'SELECT id FROM clients WHERE owner_id = 1 ORDER BY id LIMIT 1',
+    'service_id': 'SELECT id FROM services WHERE owner_id = 1 ORDER BY id LIMIT 1',
+    'pending_booking_id': "SELECT id FROM bookings WHERE owner_id = 1 AND status = 'pending' ORDER BY id LIMIT 1",
+    'event_id': 'SELECT id FROM calendar_events WHERE owner_id = 1 ORDER BY id LIMIT 1',
+    'blocked_id': 'SELECT id FROM blocked_dates WHERE owner_id = 1 ORDER BY id LIMIT 1',
+    'schedule_id': 'SELECT id FROM week_schedule WHERE owner_id = 1 ORDER BY id LIMIT 1',
+    'busy_date': "SELECT to_char(booking_date, 'YYYY-MM-DD') FROM bookings WHERE owner_id = 1 "
+                 "AND booking_date >= CURRENT_DATE GROUP BY booking_date ORDER BY count(*) DESC LIMIT 1",
+    'client_phone': 'SELECT u.phone FROM users u JOIN clients c ON c.user_id = u.id '
+                    'WHERE c.owner_id = 1 ORDER BY c.id LIMIT 1',
+    'unlinked_phone': 'SELECT u.phone FROM users u JOIN clients c ON c.user_id = u.id '
+                      'WHERE c.owner_id = 1 AND u.telegram_id IS NULL ORDER BY c.id LIMIT 1',
+    'client_chat_id': "SELECT u.telegram_id FROM users u JOIN clients c ON c.user_id = u.id "
+                      "WHERE c.owner_id = 1 AND u.telegram_id IS NOT NULL ORDER BY c.id LIMIT 1",
+    'client_booking_id': "SELECT b.id FROM bookings b JOIN clients c ON b.client_id = c.id "
+                         "JOIN users u ON c.user_id = u.id WHERE c.owner_id = 1 AND u.telegram_id IS NOT NULL "
+                         "AND b.status IN ('pending', 'confirmed') ORDER BY c.id, b.id LIMIT 1",
+    'group_id': "SELECT '$TELEGRAM_GROUP_ID'",
+}
+
+def message(chat: str, text: str) -> Dict[str, Any]:
+    return {'method': 'POST', 'path': '/', 'body': {
+        'message': {'message_id': 1, 'chat': {'id': chat}, 'from': {'id': chat}, 'text': text}
+    }}
+
+def callback(chat: str, data: str) -> Dict[str, Any]:
+    return {'method': 'POST', 'path': '/', 'body': {'callback_query': {
+        'id': 'explain', 'data': data, 'from': {'id': chat}, 'message': {'message_id': 1, 'chat': {'id': chat}}
+    }}}
+
+# Ветки, которых нет в tests.json: записи, команды бота, колбэки, рассылка напоминаний
+SCENARIOS = {
+    'api': [
+        {'method': 'GET', 'path': '/?resource=bookings&owner_id=1&date=$busy_date'},
+        {'method': 'POST', 'path': '/?resource=bookings', 'body': {
+            'client_id': '$client_id', 'service_id': '$service_id', 'owner_id': 1,
+            'booking_date': '$busy_date', 'start_time': '21:00', 'end_time': '22:00', 'status': 'confirmed'}},
+        {'method': 'PUT', 'path': '/?resource=bookings', 'body': {'id': '$pending_booking_id', 'status': 'confirmed'}},
+        {'method': 'GET', 'path': '/?resource=events&owner_id=1&date=$busy_date'},
+        {'method': 'POST', 'path': '/?resource=events', 'body': {
+            'owner_id': 1, 'event_date': '$busy_date', 'start_time': '21:00', 'end_time': '22:00',
+            'title': 'explain', 'event_type': 'event'}},
+        {'method': 'DELETE', 'path': '/?resource=events&id=$event_id'},
+        {'method': 'POST', 'path': '/?resource=clients', 'body': {'owner_id': 1, 'name': 'explain', 'phone': '$client_phone'}},
+        {'method': 'POST', 'path': '/?resource=clients', 'body': {'owner_id': 1, 'name': 'explain', 'phone': '+70000000000'}},
+        {'method': 'GET', 'path': '/?resource=settings&owner_id=1'},
+        {'method': 'PUT', 'path': '/?resource=settings', 'body': {'owner_id': 1, 'reminder_hours': '2'}},
+        {'method': 'GET', 'path': '/?resource=available_slots&owner_id=1&date=$busy_date&service_id=$service_id'},
+        {'method': 'GET', 'path': '/?resource=week_schedule&owner_id=1'},
+        {'method': 'GET', 'path': '/?resource=week_schedule&owner_id=1&date=$busy_date'},
+        {'method': 'POST', 'path': '/?resource=week_schedule', 'body': {
+            'owner_id': 1, 'day_of_week': 'monday', 'start_time': '09:00', 'end_time': '12:00',
+            'cycle_start_date': '$busy_date', 'week_number': 1}},
+        {'method': 'DELETE', 'path': '/?resource=week_schedule&id=$schedule_id'},
+        {'method': 'POST', 'path': '/?resource=services', 'body': {
+            'owner_id': 1, 'name': 'explain', 'price': 1000, 'duration_minutes': 60}},
+        {'method': 'PUT', 'path': '/?resource=services', 'body': {
+            'id': '$service_id', 'name': 'explain', 'price': 1000, 'duration_minutes': 60, 'active': True}},
+        {'method': 'DELETE', 'path': '/?resource=services&id=$service_id'},
+        {'method': 'GET', 'path': '/?resource=blocked_dates&owner_id=1'},
+        {'method': 'POST', 'path': '/?resource=blocked_dates', 'body': {'owner_id': 1, 'date': '$busy_date', 'force': True}},
+        {'method': 'DELETE', 'path': '/?resource=blocked_dates&id=$blocked_id'},
+        {'method': 'GET', 'path': '/?resource=booking_data&owner_id=1'},
+    ],
+    'telegram-bot': [
+        message('$group_id', '/tomorrow'),
+        message('$group_id', '/pending'),
+        message('$group_id', '/event_list'),
+        message('$group_id', '/blocked_list'),
+        message('$group_id', '/event_add 2030-01-01 10:00 11:00 explain'),
+        message('$group_id', '/event_delete $event_id'),
+        message('$group_id', '/block_date 2030-01-01'),
+        message('$group_id', '/unblock_date $blocked_id'),
+        callback('$group_id', 'pending_page_1'),
+        callback('$group_id', 'confirm_${pending_booking_id}_0'),
+        callback('$group_id', 'cancel_$pending_booking_id'),
+        message('$client_chat_id', '/start'),
+        message('$client_chat_id', '/start $unlinked_phone'),
+        message('$client_chat_id', '/mybookings'),
+        message('$client_chat_id', '/cancel'),
+        message('$client_chat_id', '/cancel $client_booking_id'),
+        callback('$client_chat_id', 'client_cancel_$client_booking_id'),
+        {'method': 'POST', 'path': '/', 'body': {'action': 'send_reminders'}},
+    ],
+}
+
+class Recorder:
+    '''Уникальные выражения (по тексту запроса) с первым набором параметров и местом вызова'''
+
+    def __init__(self):
+        self.queries: Dict[str, Dict[str, Any]] = {}
+        self.function = ''
+
+    def record(self, cursor, query: Any, params: Any) -> None:
+        text = query if isinstance(query, str) else query.decode('utf-8')
+        key = ' '.join(text.split())
+        if key in self.queries or not key.split(' ', 1)[0].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'):
+            return
+        try:
+            sql = cursor.mogrify(query, params).decode('utf-8')
+        except Exception:
+            return
+        self.queries[key] = {'sql': sql, 'function': self.function, 'location': caller_location()}
+
+def caller_location() -> str:
+    frame = sys._getframe(2)
+    while frame is not None:
+        # execute/executemany в backend - это InstrumentedCursor, нужен вызвавший его код
+        if frame.f_code.co_filename.startswith(BACKEND_DIR) and frame.f_code.co_name not in ('execute', 'executemany'):
+            return f'{os.path.relpath(frame.f_code.co_filename, os.path.dirname(BACKEND_DIR))}:{frame.f_lineno}'
+        frame = frame.f_back
+    return '?'
+
+class RecordingCursor:
+    def __init__(self, cursor, recorder: Recorder):
+        self._cursor = cursor
+        self._recorder = recorder
+
+    def execute(self, query, params=None):
+        self._recorder.record(self._cursor, query, params)
+        return self._cursor.execute(query, params)
+
+    def executemany(self, query, params_seq):
+        params_seq = list(params_seq)
+        if params_seq:
+            self._recorder.record(self._cursor, query, params_seq[0])
+        return self._cursor.executemany(query, params_seq)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._cursor.__exit__(exc_type, exc, tb)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class RollbackConnection:
+    '''Соединение, которое ничего не сохраняет: commit не выполняется, close откатывает транзакцию'''
+
+    def __init__(self, conn, recorder: Recorder):
+        self._conn = conn
+        self._recorder = recorder
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self._conn.cursor(*args, **kwargs), self._recorder)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        if not self._conn.closed:
+            self._conn.rollback()
+        self._conn.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+def install_recorder(recorder: Recorder) -> None:
+    original_connect = psycopg2.connect
+
+    def recording_connect(*args, **kwargs):
+        return RollbackConnection(original_connect(*args, **kwargs), recorder)
+
+    psycopg2.connect = recording_connect
+
+def load_fixtures(dsn: str) -> Dict[str, str]:
+    values = {}
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            for name, query in FIXTURES.items():
+                cur.execute(Template(query).safe_substitute(os.environ))
+                row = cur.fetchone()
+                values[name] = '' if row is None or row[0] is None else str(row[0])
+    finally:
+        conn.close()
+    return values
+
+def scenarios(function_name: str, fixtures: Dict[str, str]) -> Iterator[Dict[str, Any]]:
+    tests_path = os.path.join(BACKEND_DIR, function_name, 'tests.json')
+    if os.path.isfile(tests_path):
+        with open(tests_path, encoding='utf-8') as f:
+            yield from json.load(f).get('tests', [])
+    for scenario in SCENARIOS.get(function_name, []):
+        yield substitute(scenario, fixtures)
+
+def substitute(value: Any, fixtures: Dict[str, str]) -> Any:
+    '''$name в строках сценария; значение целиком из одной подстановки-числа становится int'''
+    if isinstance(value, dict):
+        return {key: substitute(item, fixtures) for key, item in value.items()}
+    if isinstance(value, list):
+        return [substitute(item, fixtures) for item in value]
+    if not isinstance(value, str):
+        return value
+    result = Template(value).safe_substitute(fixtures)
+    if value.startswith('$') and value[1:] in fixtures and result.lstrip('-').isdigit():
+        return int(result)
+    return result
+
+def capture(function_names: Sequence[str], fixtures: Dict[str, str], recorder: Recorder) -> None:
+    for function_name in function_names:
+        module = load_handler_module(function_name)
+        recorder.function = function_name
+        for index, scenario in enumerate(scenarios(function_name, fixtures)):
+            context = SimpleNamespace(request_id=f'explain-{index}', function_name=function_name)
+            # Ответы и трейсы не нужны - только выполненные выражения; ошибки сценария не мешают плану
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                try:
+                    module.handler(build_event(scenario), context)
+                except Exception:
+                    pass
+
+def walk_plan(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk_plan(child)
+
+def table_sizes(conn) -> Tuple[Dict[str, float], Dict[str, str]]:
+    '''Оценка строк по таблицам и родительская таблица секций (bookings_2026_01 -> bookings)'''
+    with conn.cursor() as cur:
+        cur.execute('''
+            SELECT c.relname, CASE WHEN c.relkind = 'p' THEN 0 ELSE GREATEST(c.reltuples, 0) END,
+                   COALESCE(parent.relname, c.relname)
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+            LEFT JOIN pg_class parent ON parent.oid = i.inhparent
+            WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+        ''')
+        rows = cur.fetchall()
+    return {table: size for table, size, _ in rows}, {table: root for table, _, root in rows}
+
+def scanned_rows(scans: List[Dict[str, Any]], sizes: Dict[str, float], roots: Dict[str, str]) -> Dict[str, float]:
+    '''Строки под Seq Scan по таблицам; секции суммируются в родительскую таблицу: перебор всех небольших
+    секций - это всё равно полный перебор большой таблицы, а пустые будущие секции ничего не добавляют'''
+    totals: Dict[str, float] = {}
+    for node in scans:
+        table = node['Relation Name']
+        root = roots.get(table, table)
+        totals[root] = totals.get(root, 0) + sizes.get(table, 0)
+    return totals
+
+def explain(conn, sql: str) -> Dict[str, Any]:
+    with conn.cursor() as cur:
+        try:
+            cur.execute('EXPLAIN (FORMAT JSON) ' + sql)
+            return cur.fetchone()[0][0]['Plan']
+        finally:
+            conn.rollback()
+
+# Внешний ключ без индекса не виден в EXPLAIN: проверка при DELETE/UPDATE родителя идёт внутри триггера
+UNINDEXED_FOREIGN_KEYS_QUERY = '''
+    SELECT c.conrelid::regclass::text AS table_name, a.attname, c.confrelid::regclass::text AS referenced
+    FROM pg_constraint c
+    JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+    WHERE c.contype = 'f' AND c.connamespace = 'public'::regnamespace AND c.conparentid = 0
+    AND NOT EXISTS (
+        SELECT 1 FROM pg_index i WHERE i.indrelid = c.conrelid AND i.indkey[0] = c.conkey[1]
+    )
+'''
+
+def check_foreign_keys(conn, sizes: Dict[str, float], roots: Dict[str, str], min_rows: int) -> int:
+    totals = scanned_rows([{'Relation Name': table} for table in sizes], sizes, roots)
+    with conn.cursor() as cur:
+        cur.execute(UNINDEXED_FOREIGN_KEYS_QUERY)
+        missing = [row for row in cur.fetchall() if totals.get(row[0], 0) >= min_rows]
+    for table, column, referenced in missing:
+        print(f'FAIL foreign key {table}.{column} -> {referenced}: no index, '
+              f'deleting from {referenced} scans {table} (~{int(totals[table])} rows)')
+    return len(missing)
+
+def check_queries(dsn: str, recorder: Recorder, min_rows: int, verbose: bool) -> Tuple[int, int]:
+    conn = psycopg2.connect(dsn)
+    failed = 0
+    try:
+        sizes, roots = table_sizes(conn)
+        for entry in recorder.queries.values():
+            label = f'{entry["function"]}: {entry["location"]}'
+            try:
+                plan = explain(conn, entry['sql'])
+            except psycopg2.Error as e:
+                failed += 1
+                print(f'ERROR {label}  {str(e).strip().splitlines()[0]}')
+                continue
+
+            scans = [node for node in walk_plan(plan) if node.get('Node Type') == 'Seq Scan']
+            # Seq Scan с фильтром отбрасывает строки, которые мог бы не читать индекс. Без фильтра таблица
+            # нужна целиком (хеш-соединение со множеством строк) - это предупреждение, а не ошибка
+            filtered = scanned_rows([node for node in scans if 'Filter' in node], sizes, roots)
+            unfiltered = scanned_rows([node for node in scans if 'Filter' not in node], sizes, roots)
+            large_filtered = {table: rows for table, rows in filtered.items() if rows >= min_rows}
+            large_unfiltered = {table: rows for table, rows in unfiltered.items() if rows >= min_rows}
+
+            summary = f'{plan["Node Type"]} cost={plan["Total Cost"]:.0f}'
+            if large_filtered:
+                failed += 1
+                print(f'FAIL {label}  {summary}')
+            elif large_unfiltered:
+                print(f'WARN {label}  {summary}')
+            elif verbose:
+                print(f'PASS {label}  {summary}')
+            for table, rows in {**large_unfiltered, **large_filtered}.items():
+                print(f'       - Seq Scan on {table} (~{int(rows)} rows)' + (' with Filter' if table in large_filtered else ''))
+            if large_filtered or large_unfiltered:
+                print(f'       | {" ".join(entry["sql"].split())[:300]}')
+
+        failed += check_foreign_keys(conn, sizes, roots, min_rows)
+    finally:
+        conn.close()
+    return failed, len(recorder.queries)
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='EXPLAIN every api/bot query and fail on sequential scans of large tables')
+    parser.add_argument('functions', nargs='*', default=['api', 'telegram-bot'], help='Functions to capture')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'), help='Seeded database (default: $DATABASE_URL)')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra environment variables for handlers (secrets)')
+    parser.add_argument('--min-rows', type=int, default=DEFAULT_MIN_ROWS,
+                        help='Tables with at least this many rows must not be scanned sequentially')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print passing queries too')
+    return parser.parse_args(argv)
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    if not args.dsn:
+        print('DATABASE_URL or --dsn is required', file=sys.stderr)
+        return 2
+    os.environ['DATABASE_URL'] = args.dsn
+    for item in args.env:
+        key, _, value = item.partition('=')
+        os.environ[key] = value
+
+    fixtures = load_fixtures(args.dsn)
+    recorder = Recorder()
+    install_recorder(recorder)
+    block_external_network()
+    capture(args.functions, fixtures, recorder)
+
+    failed, total = check_queries(args.dsn, recorder, args.min_rows, args.verbose)
+    print(f'{total} queries checked, {failed} failures')
+    return 0 if failed == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
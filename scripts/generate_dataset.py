@@ -0,0 +1,410 @@
+'''
+Business: Генератор синтетических данных продакшн-объёма для локальной БД ежедневника
+Args: параметры командной строки (объёмы, период, seed) и DATABASE_URL локальной базы
+Returns: Загруженные через COPY таблицы users, services, settings, clients, week_schedule,
+         calendar_events, blocked_dates, bookings и отчёт о количестве строк
+'''
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import psycopg2
+
+DAY_NAMES = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+FIRST_NAMES = ['Анна', 'Мария', 'Елена', 'Ольга', 'Наталья', 'Ирина', 'Татьяна', 'Светлана',
+               'Юлия', 'Екатерина', 'Алексей', 'Дмитрий', 'Сергей', 'Андрей', 'Павел', 'Игорь']
+LAST_NAMES = ['Иванова', 'Смирнова', 'Кузнецова', 'Попова', 'Соколова', 'Лебедева', 'Козлова',
+              'Новикова', 'Морозова', 'Петрова', 'Волкова', 'Соловьёва', 'Васильева', 'Зайцева']
+
+SERVICE_CATALOG = [
+    ('Access Bars сеанс', 60, 3000),
+    ('Access Bars (сокращённый)', 30, 1500),
+    ('Массаж', 60, 2500),
+    ('Массаж спины', 45, 2000),
+    ('Консультация', 45, 2000),
+    ('Энергетическая практика', 90, 4000),
+    ('Facelift', 120, 5500),
+    ('Первичный приём', 30, 1000),
+]
+
+EVENT_TITLES = {
+    'study': ['Лекция', 'Семинар', 'Экзамен', 'Практикум'],
+    'event': ['Встреча с поставщиком', 'Мастер-класс', 'Вебинар', 'Выездной сеанс', 'Личное'],
+    'booking': ['Групповой сеанс', 'Сеанс вне расписания'],
+}
+
+# Доли статусов записей: прошлые записи в основном завершены,
+# будущие - ожидают подтверждения или подтверждены
+PAST_STATUS_MIX = [('completed', 0.70), ('cancelled', 0.12), ('confirmed', 0.15), ('pending', 0.03)]
+FUTURE_STATUS_MIX = [('pending', 0.35), ('confirmed', 0.55), ('cancelled', 0.10)]
+
+# Относительная загрузка по дням недели (пн..вс)
+WEEKDAY_LOAD = [1.0, 1.0, 1.05, 1.1, 1.25, 0.8, 0.35]
+
+COPY_CHUNK_ROWS = 50000
+
+TABLE_COLUMNS = {
+    'users': ('id', 'telegram_id', 'role', 'name', 'phone', 'email', 'created_at'),
+    'services': ('id', 'owner_id', 'name', 'duration_minutes', 'price', 'description', 'active', 'created_at'),
+    'settings': ('owner_id', 'key', 'value'),
+    'clients': ('id', 'user_id', 'owner_id', 'total_visits', 'last_visit_date', 'created_at'),
+    'week_schedule': ('owner_id', 'day_of_week', 'start_time', 'end_time', 'cycle_start_date', 'week_number'),
+    'calendar_events': ('id', 'owner_id', 'event_type', 'title', 'event_date', 'start_time', 'end_time',
+                        'description', 'created_at'),
+    'blocked_dates': ('owner_id', 'blocked_date'),
+    'bookings': ('id', 'client_id', 'service_id', 'owner_id', 'event_id', 'booking_date', 'start_time',
+                 'end_time', 'status', 'created_at', 'updated_at'),
+}
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Bulk-load a production-scale synthetic dataset via COPY')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'),
+                        help='Target database (default: $DATABASE_URL)')
+    parser.add_argument('--owners', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=30000, help='Total client users across all owners')
+    parser.add_argument('--years', type=float, default=3.0, help='Years of booking history')
+    parser.add_argument('--future-days', type=int, default=60, help='Days of bookings ahead of today')
+    parser.add_argument('--bookings-per-day', type=float, default=6.0,
+                        help='Average bookings per working day for a typical owner')
+    parser.add_argument('--events-per-month', type=float, default=6.0)
+    parser.add_argument('--blocked-per-month', type=float, default=2.0)
+    parser.add_argument('--telegram-share', type=float, default=0.6,
+                        help='Share of clients who linked Telegram (the rest have NULL telegram_id)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--today', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+                        default=date.today(), help='Anchor date for history/future split (YYYY-MM-DD)')
+    parser.add_argument('--no-analyze', action='store_true', help='Skip ANALYZE after loading')
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error('--dsn or DATABASE_URL is required')
+    return args
+
+def copy_value(value) -> str:
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    text = str(value)
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def copy_rows(cur, table: str, rows: Iterable[Tuple]) -> int:
+    '''Стримит строки в COPY кусками по COPY_CHUNK_ROWS, не держа таблицу в памяти'''
+    columns = TABLE_COLUMNS[table]
+    sql = f'COPY {table} ({", ".join(columns)}) FROM STDIN'
+    total = 0
+    buf = io.StringIO()
+    pending = 0
+    for row in rows:
+        buf.write('\t'.join(copy_value(v) for v in row))
+        buf.write('\n')
+        pending += 1
+        if pending >= COPY_CHUNK_ROWS:
+            buf.seek(0)
+            cur.copy_expert(sql, buf)
+            total += pending
+            buf = io.StringIO()
+            pending = 0
+    if pending:
+        buf.seek(0)
+        cur.copy_expert(sql, buf)
+        total += pending
+    return total
+
+def next_id(cur, table: str) -> int:
+    cur.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}')
+    return cur.fetchone()[0]
+
+def sync_sequence(cur, table: str) -> None:
+    cur.execute(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 1))"
+    )
+
+def pick_weighted(rng: random.Random, mix: List[Tuple[str, float]]) -> str:
+    roll = rng.random()
+    acc = 0.0
+    for value, share in mix:
+        acc += share
+        if roll < acc:
+            return value
+    return mix[-1][0]
+
+def poisson(rng: random.Random, mean: float) -> int:
+    # Алгоритм Кнута достаточно быстр для малых средних (единицы записей в день)
+    if mean <= 0:
+        return 0
+    limit = pow(2.718281828459045, -mean)
+    k, p = 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+def fmt_time(minutes: int) -> str:
+    return f'{minutes // 60:02d}:{minutes % 60:02d}:00'
+
+def random_name(rng: random.Random) -> str:
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+def cycle_starts(start: date, end: date) -> List[date]:
+    '''Учебные циклы начинаются 1 сентября и 1 февраля, как в V0009'''
+    starts = [date(year, month, 1) for year in range(start.year - 1, end.year + 1) for month in (2, 9)]
+    first = max((c for c in starts if c <= start), default=start)
+    return [c for c in starts if first <= c <= end]
+
+class Dataset:
+    def __init__(self, args: argparse.Namespace, ids: Dict[str, int]):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.ids = ids
+        self.today: date = args.today
+        self.history_start = self.today - timedelta(days=int(args.years * 365))
+        self.end = self.today + timedelta(days=args.future_days)
+
+        self.owner_ids: List[int] = []
+        # Вес владельца: немногие "крупные" мастера и длинный хвост небольших
+        self.owner_weight: Dict[int, float] = {}
+        self.owner_services: Dict[int, List[Tuple[int, int]]] = {}
+        self.owner_clients: Dict[int, List[int]] = {}
+        self.owner_client_weights: Dict[int, List[float]] = {}
+        self.owner_work_hours: Dict[int, Tuple[int, int]] = {}
+        self.blocked: Dict[int, set] = {}
+        self.client_user_count = 0
+
+    def users(self) -> Iterator[Tuple]:
+        rng = self.rng
+        uid = self.ids['users']
+        tg_base = 7_000_000_000 + self.args.seed * 1_000_000
+        for i in range(self.args.owners):
+            owner_id = uid + i
+            self.owner_ids.append(owner_id)
+            self.owner_weight[owner_id] = 1.0 / (1 + i) ** 0.6
+            created = self.history_start - timedelta(days=rng.randint(0, 365))
+            yield (owner_id, tg_base + i, 'owner', f'Мастер {random_name(rng)}',
+                   f'+7800{owner_id:07d}', f'owner{owner_id}@example.test', created)
+
+        first_client = uid + self.args.owners
+        self.client_user_count = self.args.clients
+        for i in range(self.args.clients):
+            user_id = first_client + i
+            telegram_id = tg_base + 100_000 + i if rng.random() < self.args.telegram_share else None
+            email = f'client{user_id}@example.test' if rng.random() < 0.4 else None
+            created = self.history_start + timedelta(days=rng.randint(0, (self.today - self.history_start).days))
+            yield (user_id, telegram_id, 'client', random_name(rng), f'+7900{user_id:07d}', email, created)
+
+    def services(self) -> Iterator[Tuple]:
+        rng = self.rng
+        sid = self.ids['services']
+        for owner_id in self.owner_ids:
+            catalog = rng.sample(SERVICE_CATALOG, rng.randint(3, len(SERVICE_CATALOG)))
+            self.owner_services[owner_id] = []
+            for name, duration, price in catalog:
+                active = rng.random() > 0.1
+                if active:
+                    self.owner_services[owner_id].append((sid, duration))
+                yield (sid, owner_id, name, duration, price + rng.choice([0, 0, 250, 500]),
+                       f'{name} - описание', active, self.history_start)
+                sid += 1
+            if not self.owner_services[owner_id]:
+                # Хотя бы одна активная услуга должна быть у каждого владельца
+                self.owner_services[owner_id].append((sid - 1, catalog[-1][1]))
+
+    def settings(self) -> Iterator[Tuple]:
+        rng = self.rng
+        for owner_id in self.owner_ids:
+            work_start = rng.choice([9, 10, 10, 11]) * 60
+            work_end = rng.choice([18, 19, 20, 20, 21]) * 60
+            self.owner_work_hours[owner_id] = (work_start, work_end)
+            values = {
+                'work_start': fmt_time(work_start)[:5],
+                'work_end': fmt_time(work_end)[:5],
+                'prep_time': str(rng.choice([0, 0, 10, 15])),
+                'buffer_time': str(rng.choice([0, 10, 15, 30])),
+                'work_priority': rng.choice(['True', 'False']),
+                'reminder_hours': rng.choice(['0', '1', '2', '2.5', '3']),
+            }
+            for key, value in values.items():
+                yield (owner_id, key, value)
+
+    def clients(self) -> Iterator[Tuple]:
+        rng = self.rng
+        cid = self.ids['clients']
+        owners = self.owner_ids
+        weights = [self.owner_weight[o] for o in owners]
+        for owner_id in owners:
+            self.owner_clients[owner_id] = []
+        first_client_user = self.ids['users'] + self.args.owners
+        for i in range(self.client_user_count):
+            user_id = first_client_user + i
+            # ~8% клиентов ходят к двум мастерам
+            chosen = {rng.choices(owners, weights=weights)[0]}
+            if len(owners) > 1 and rng.random() < 0.08:
+                chosen.add(rng.choices(owners, weights=weights)[0])
+            for owner_id in chosen:
+                self.owner_clients[owner_id].append(cid)
+                yield (cid, user_id, owner_id, 0, None, self.history_start)
+                cid += 1
+        for owner_id in owners:
+            if not self.owner_clients[owner_id]:
+                # Пустой владелец всё равно получает одного клиента, иначе записи не к кому привязать
+                self.owner_clients[owner_id].append(cid)
+                yield (cid, first_client_user, owner_id, 0, None, self.history_start)
+                cid += 1
+            # Постоянные клиенты: распределение Парето по частоте визитов
+            self.owner_client_weights[owner_id] = list(
+                self._cumulative([rng.paretovariate(1.3) for _ in self.owner_clients[owner_id]])
+            )
+
+    @staticmethod
+    def _cumulative(values: List[float]) -> Iterator[float]:
+        acc = 0.0
+        for v in values:
+            acc += v
+            yield acc
+
+    def week_schedule(self) -> Iterator[Tuple]:
+        rng = self.rng
+        for owner_id in self.owner_ids:
+            # Только часть мастеров учится
+            if rng.random() > 0.4:
+                continue
+            for cycle in cycle_starts(self.history_start, self.end):
+                for week_number in (1, 2):
+                    for day in DAY_NAMES[:5]:
+                        if rng.random() < 0.45:
+                            continue
+                        start = rng.choice([8, 9, 10, 13]) * 60 + rng.choice([0, 30])
+                        end = start + rng.choice([90, 180, 270])
+                        yield (owner_id, day, fmt_time(start), fmt_time(end), cycle, week_number)
+
+    def calendar_events(self) -> Iterator[Tuple]:
+        rng = self.rng
+        eid = self.ids['calendar_events']
+        months = max(1, int((self.end - self.history_start).days / 30))
+        span = (self.end - self.history_start).days
+        for owner_id in self.owner_ids:
+            for _ in range(poisson(rng, self.args.events_per_month * months)):
+                event_type = pick_weighted(rng, [('event', 0.6), ('study', 0.3), ('booking', 0.1)])
+                event_date = self.history_start + timedelta(days=rng.randint(0, span))
+                start = rng.randint(18, 38) * 30
+                end = start + rng.choice([30, 60, 90, 120, 180])
+                created = datetime.combine(event_date, datetime.min.time()) - timedelta(days=rng.randint(1, 30))
+                yield (eid, owner_id, event_type, rng.choice(EVENT_TITLES[event_type]), event_date,
+                       fmt_time(start), fmt_time(min(end, 23 * 60 + 30)), '', created)
+                eid += 1
+
+    def blocked_dates(self) -> Iterator[Tuple]:
+        rng = self.rng
+        months = max(1, int((self.end - self.history_start).days / 30))
+        span = (self.end - self.history_start).days
+        for owner_id in self.owner_ids:
+            days = set()
+            for _ in range(poisson(rng, self.args.blocked_per_month * months)):
+                days.add(self.history_start + timedelta(days=rng.randint(0, span)))
+            self.blocked[owner_id] = days
+            for day in sorted(days):
+                yield (owner_id, day)
+
+    def bookings(self) -> Iterator[Tuple]:
+        rng = self.rng
+        bid = self.ids['bookings']
+        total_days = (self.end - self.history_start).days + 1
+        for owner_id in self.owner_ids:
+            services = self.owner_services[owner_id]
+            clients = self.owner_clients[owner_id]
+            cum_weights = self.owner_client_weights[owner_id]
+            work_start, work_end = self.owner_work_hours[owner_id]
+            # Нормируем вес так, чтобы средний мастер давал ~bookings_per_day
+            owner_mean = self.args.bookings_per_day * self.owner_weight[owner_id] * 2.2
+            blocked = self.blocked.get(owner_id, set())
+            slots = list(range(work_start, work_end - 30, 30))
+            for offset in range(total_days):
+                day = self.history_start + timedelta(days=offset)
+                if day in blocked:
+                    continue
+                count = min(len(slots), poisson(rng, owner_mean * WEEKDAY_LOAD[day.weekday()]))
+                if not count:
+                    continue
+                starts = sorted(rng.sample(slots, count))
+                client_ids = rng.choices(clients, cum_weights=cum_weights, k=count)
+                mix = PAST_STATUS_MIX if day < self.today else FUTURE_STATUS_MIX
+                busy_until = -1
+                for start, client_id in zip(starts, client_ids):
+                    service_id, duration = rng.choice(services)
+                    status = pick_weighted(rng, mix)
+                    if start < busy_until and status != 'cancelled':
+                        # Активные записи не пересекаются, как и в available_slots
+                        continue
+                    end = min(start + duration, 24 * 60 - 1)
+                    if status != 'cancelled':
+                        busy_until = end
+                    created = datetime.combine(day, datetime.min.time()) - timedelta(
+                        days=rng.randint(0, 21), minutes=rng.randint(0, 1439))
+                    updated = created + timedelta(hours=rng.randint(0, 48))
+                    yield (bid, client_id, service_id, owner_id, None, day, fmt_time(start),
+                           fmt_time(end), status, created, updated)
+                    bid += 1
+
+def load(args: argparse.Namespace) -> Dict[str, int]:
+    conn = psycopg2.connect(args.dsn)
+    counts: Dict[str, int] = {}
+    try:
+        with conn.cursor() as cur:
+            ids = {table: next_id(cur, table)
+                   for table in ('users', 'services', 'clients', 'calendar_events', 'bookings')}
+            dataset = Dataset(args, ids)
+
+            # bookings секционирована по месяцам (V0017): секции на всю историю, иначе она ляжет в bookings_default
+            cur.execute("SELECT to_regproc('create_bookings_partitions') IS NOT NULL")
+            if cur.fetchone()[0]:
+                cur.execute('SELECT create_bookings_partitions(%s, %s)', (dataset.history_start, dataset.end))
+
+            # Порядок важен: внешние ключи ссылаются на уже загруженные таблицы
+            for table in ('users', 'services', 'settings', 'clients', 'week_schedule',
+                          'calendar_events', 'blocked_dates', 'bookings'):
+                started = time.perf_counter()
+                counts[table] = copy_rows(cur, table, getattr(dataset, table)())
+                print(f'{table:16s} {counts[table]:>10d} rows  {time.perf_counter() - started:6.1f}s',
+                      file=sys.stderr)
+
+            for table in ids:
+                sync_sequence(cur, table)
+
+            # Счётчики визитов считаем одной агрегацией, а не построчно
+            cur.execute('''
+                UPDATE clients c
+                SET total_visits = v.visits, last_visit_date = v.last_visit
+                FROM (
+                    SELECT client_id, COUNT(*) AS visits, MAX(booking_date) AS last_visit
+                    FROM bookings
+                    WHERE status = 'completed' AND id >= %s
+                    GROUP BY client_id
+                ) v
+                WHERE c.id = v.client_id
+            ''', (ids['bookings'],))
+        conn.commit()
+
+        if not args.no_analyze:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute('ANALYZE')
+    finally:
+        conn.close()
+    return counts
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    started = time.perf_counter()
+    counts = load(args)
+    print(f'Loaded {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
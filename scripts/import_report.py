@@ -0,0 +1,117 @@
+'''
+Business: Отчёт о времени холодного импорта backend-функций и проверка бюджета импорта
+Args: имена функций (по умолчанию все из backend/), --runs для числа замеров, --budget NAME=MS
+Returns: Таблица медианного времени импорта index.py, загруженных тяжёлых модулей и самых дорогих импортов;
+         код выхода 1, если какая-то функция превысила бюджет
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Sequence
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+# Модули, импорт которых заметен на холодном старте
+HEAVY_MODULES = ('psycopg2', 'urllib.request', 'http.client', 'ssl', 'email.parser', 'traceback', 'concurrent.futures')
+
+# Запускается в чистом интерпретаторе: замеряем только импорт index.py, без накладных расходов самого скрипта
+PROBE = '''
+import sys, time, importlib.util
+sys.stderr.write('--probe--\\n')
+sys.stderr.flush()
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('index', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+elapsed = (time.perf_counter() - started) * 1000
+import json
+print(json.dumps({'importMs': elapsed, 'modules': sorted(sys.modules)}))
+'''
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    '''Кумулятивное время (мкс) по модулям верхнего уровня из вывода -X importtime'''
+    cumulative: Dict[str, int] = {}
+    # Всё до маркера - старт интерпретатора и самой пробы, к index.py не относится
+    stderr = stderr.split('--probe--', 1)[-1]
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        # Модули верхнего уровня идут с отступом в один пробел, вложенные - глубже
+        if len(name) - len(name.lstrip()) == 1:
+            cumulative[name.strip()] = int(fields[1])
+    return cumulative
+
+def measure_import(function_name: str, runs: int = 5) -> Dict[str, object]:
+    path = os.path.join(BACKEND_DIR, function_name, 'index.py')
+    timings: List[float] = []
+    modules: List[str] = []
+    cumulative: Dict[str, int] = {}
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE, path],
+            capture_output=True, text=True, check=True,
+            env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
+        )
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(probe['importMs'])
+        modules = probe['modules']
+        cumulative = parse_importtime(result.stderr)
+    return {
+        'function': function_name,
+        'importMs': statistics.median(timings),
+        'heavy': [name for name in HEAVY_MODULES if name in modules],
+        'top': sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:5],
+    }
+
+def discover_functions() -> List[str]:
+    return sorted(
+        name for name in os.listdir(BACKEND_DIR)
+        if os.path.isfile(os.path.join(BACKEND_DIR, name, 'index.py'))
+    )
+
+def configured_budget(function_name: str) -> Optional[float]:
+    '''Бюджет из tests.json функции (поле maxImportMs верхнего уровня)'''
+    tests_path = os.path.join(BACKEND_DIR, function_name, 'tests.json')
+    if not os.path.isfile(tests_path):
+        return None
+    with open(tests_path, encoding='utf-8') as f:
+        return json.load(f).get('maxImportMs')
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Cold-start import time per backend function')
+    parser.add_argument('functions', nargs='*', help='Function directories under backend/ (default: all)')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per function (median is reported)')
+    parser.add_argument('--budget', action='append', default=[], metavar='NAME=MS',
+                        help='Override maxImportMs from tests.json')
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    for item in args.budget:
+        name, _, value = item.partition('=')
+        overrides[name] = float(value)
+
+    failed = False
+    for function_name in args.functions or discover_functions():
+        report = measure_import(function_name, args.runs)
+        budget = overrides.get(function_name, configured_budget(function_name))
+        verdict = ''
+        if budget is not None:
+            over = report['importMs'] > budget
+            failed = failed or over
+            verdict = f'{"OVER" if over else "ok"} (budget {budget:g}ms)'
+        top = ', '.join(f'{name} {us / 1000:.1f}ms' for name, us in report['top'])
+        print(f'{function_name:14s} {report["importMs"]:7.1f}ms  {verdict}')
+        print(f'{"":14s} heavy loaded: {", ".join(report["heavy"]) or "none"}')
+        print(f'{"":14s} top imports:  {top}')
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+'''
+Business: Реплей webhook-обновлений через handler telegram-bot с заданной частотой против заглушки Bot API
+Args: файлы с обновлениями (NDJSON или JSON-массив) и/или синтетические --text/--callback, --count, --rate,
+      --concurrency, DATABASE_URL; параметры заглушки (--latency-ms, --rate-limit, --failure-rate)
+      или --api-url уже запущенной заглушки
+Returns: Пропускная способность, перцентили задержки, SQL-запросы и вызовы Bot API по командам
+
+Обновления получают новые update_id (иначе их отсечёт журнал processed_updates), --keep-update-ids отключает это.
+Вызов Bot API, возвращённый в теле webhook-ответа, считается как выполненный Telegram.
+Исходящий лимитер бота действует и здесь: в одну группу уходит не больше 20 сообщений в минуту.
+'''
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from run_backend_tests import load_handler_module
+from telegram_stub import BotApiStub, format_counts
+from trace_report import percentile
+
+SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries')
+SERVER_TIMING_HTTP = re.compile(r'http;dur=[\d.]+;desc="(\d+) calls"')
+
+def read_updates(paths: Sequence[str]) -> List[Dict[str, Any]]:
+    updates = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            content = f.read().strip()
+        if content.startswith('['):
+            updates.extend(json.loads(content))
+            continue
+        for line in content.splitlines():
+            line = line.strip()
+            if line:
+                updates.append(json.loads(line))
+    return updates
+
+def synthetic_updates(texts: Sequence[str], callbacks: Sequence[str], chat_id: int) -> List[Dict[str, Any]]:
+    updates = []
+    for text in texts:
+        updates.append({'message': {'message_id': 1, 'chat': {'id': chat_id}, 'from': {'id': chat_id}, 'text': text}})
+    for data in callbacks:
+        updates.append({'callback_query': {
+            'id': 'replay',
+            'data': data,
+            'from': {'id': chat_id},
+            'message': {'message_id': 1, 'chat': {'id': chat_id}}
+        }})
+    return updates
+
+def update_label(update: Dict[str, Any]) -> str:
+    if 'message' in update:
+        text = update['message'].get('text') or ''
+        return text.split()[0] if text.startswith('/') else text or '-'
+    if 'callback_query' in update:
+        # confirm_12_3 и confirm_15_1 - одна и та же команда
+        data = update['callback_query'].get('data') or ''
+        return 'cb:' + '_'.join(part for part in data.split('_') if not part.isdigit())
+    return '-'
+
+def schedule(updates: List[Dict[str, Any]], count: int, keep_ids: bool) -> Iterator[Dict[str, Any]]:
+    first_id = int(time.time() * 1000)
+    for index, update in zip(range(count), itertools.cycle(updates)):
+        update = dict(update)
+        if not keep_ids or 'update_id' not in update:
+            update['update_id'] = first_id + index
+        yield update
+
+class Replay:
+    def __init__(self, module: Any):
+        self.module = module
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.queries: Dict[str, int] = Counter()
+        self.api_calls: Dict[str, int] = Counter()
+        self.statuses: Counter = Counter()
+
+    def run_one(self, update: Dict[str, Any]) -> None:
+        event = {
+            'httpMethod': 'POST',
+            'path': '/',
+            'headers': {},
+            'queryStringParameters': {},
+            'body': json.dumps(update),
+            'isBase64Encoded': False
+        }
+        context = SimpleNamespace(request_id=f'replay-{update["update_id"]}', function_name='telegram-bot')
+        started = time.perf_counter()
+        response = self.module.handler(event, context)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        timing = response.get('headers', {}).get('Server-Timing', '')
+        queries = SERVER_TIMING_QUERIES.search(timing)
+        calls = SERVER_TIMING_HTTP.search(timing)
+        api_calls = int(calls.group(1)) if calls else 0
+        try:
+            body = json.loads(response.get('body') or '{}')
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and 'method' in body:
+            api_calls += 1
+
+        label = update_label(update)
+        with self.lock:
+            self.latencies[label].append(elapsed_ms)
+            self.queries[label] += int(queries.group(1)) if queries else 0
+            self.api_calls[label] += api_calls
+            self.statuses[response.get('statusCode')] += 1
+
+    def run(self, updates: Iterator[Dict[str, Any]], rate: float, concurrency: int) -> float:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = []
+            for index, update in enumerate(updates):
+                if rate > 0:
+                    delay = started + index / rate - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                futures.append(pool.submit(self.run_one, update))
+            for future in futures:
+                future.result()
+        return time.perf_counter() - started
+
+    def report(self, elapsed: float) -> str:
+        total = sum(len(values) for values in self.latencies.values())
+        lines = [
+            f'{total} updates in {elapsed:.2f}s: {total / elapsed:.1f} updates/s, statuses {dict(self.statuses)}',
+            '',
+            f'{"command":<24} {"n":>5} {"p50":>8} {"p95":>8} {"max":>8} {"queries":>8} {"api calls":>10}'
+        ]
+        for label, values in sorted(self.latencies.items(), key=lambda item: -len(item[1])):
+            n = len(values)
+            lines.append(
+                f'{label[:24]:<24} {n:>5} {percentile(values, 50):>8.1f} {percentile(values, 95):>8.1f} '
+                f'{max(values):>8.1f} {self.queries[label] / n:>8.1f} {self.api_calls[label] / n:>10.2f}'
+            )
+        return '\n'.join(lines)
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Replay webhook updates through the telegram-bot handler')
+    parser.add_argument('files', nargs='*', help='Updates as NDJSON or a JSON array (e.g. captured webhook bodies)')
+    parser.add_argument('--text', action='append', default=[], help='Synthetic message text, e.g. /today')
+    parser.add_argument('--callback', action='append', default=[], help='Synthetic callback data, e.g. pending_page_2')
+    parser.add_argument('--chat', type=int,
+                        help='Chat id for synthetic updates (default: $TELEGRAM_GROUP_ID)')
+    parser.add_argument('--count', type=int, help='Updates to send, cycling the input (default: one pass)')
+    parser.add_argument('--rate', type=float, default=0.0, help='Updates per second (0 = as fast as possible)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Updates processed in parallel')
+    parser.add_argument('--keep-update-ids', action='store_true', help='Do not renumber update_id')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'), help='Seeded database (default: $DATABASE_URL)')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra environment variables for the handler')
+    parser.add_argument('--api-url', help='Use an already running Bot API stub instead of starting one')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Embedded stub: mean response latency')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Embedded stub: +/- latency jitter')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Embedded stub: share of 429 responses')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Embedded stub: share of 502 responses')
+    parser.add_argument('--record', metavar='FILE', help='Embedded stub: append every Bot API call as NDJSON')
+    parser.add_argument('--seed', type=int, help='Embedded stub: seed for 429/502 injection')
+    return parser.parse_args(argv)
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.dsn:
+        os.environ['DATABASE_URL'] = args.dsn
+    for item in args.env:
+        key, _, value = item.partition('=')
+        os.environ[key] = value
+
+    updates = read_updates(args.files)
+    if args.text or args.callback:
+        chat_id = args.chat or int(os.environ.get('TELEGRAM_GROUP_ID') or 0)
+        if not chat_id:
+            print('--chat or TELEGRAM_GROUP_ID is required for synthetic updates', file=sys.stderr)
+            return 2
+        updates += synthetic_updates(args.text, args.callback, chat_id)
+    if not updates:
+        print('No updates: pass files or --text/--callback', file=sys.stderr)
+        return 2
+
+    stub = None
+    if not args.api_url:
+        stub = BotApiStub(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate_limit=args.rate_limit,
+                          failure_rate=args.failure_rate, record_path=args.record, seed=args.seed).start()
+    os.environ['TELEGRAM_API_URL'] = args.api_url or stub.url
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'replay')
+
+    module = load_handler_module('telegram-bot')
+    replay = Replay(module)
+    # handler пишет JSON-строку трейса на каждый вызов - в отчёте они не нужны
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        elapsed = replay.run(schedule(updates, args.count or len(updates), args.keep_update_ids),
+                             args.rate, args.concurrency)
+
+    print(replay.report(elapsed))
+    if stub:
+        stub.stop()
+        print()
+        print(format_counts(stub.counts()))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,330 @@
+'''
+Business: Локальный прогон tests.json backend-функций in-process против засеянной БД с бюджетами
+Args: имена функций (по умолчанию все из backend/), DATABASE_URL, --env KEY=VALUE для секретов
+Returns: Код выхода 0, если все проверки и бюджеты выполнены, иначе 1
+
+Поддерживаемые поля теста в tests.json:
+  name, method, path, body, headers      - описание запроса
+  expectedStatus                         - ожидаемый HTTP статус
+  expectedBody, bodyMatcher              - "exact" или "partial"; строки "array", "object", "string",
+                                           "number", "boolean" в expectedBody проверяют только тип
+  maxLatencyMs                           - верхняя граница времени выполнения handler, мс
+  maxQueries                             - верхняя граница числа выполненных SQL-выражений
+  maxResponseBytes                       - верхняя граница размера тела ответа, байт
+  setupSql                               - SQL, выполняемый перед тестом (не входит в замеры), чтобы
+                                           тест можно было гонять повторно на той же БД
+
+На верхнем уровне tests.json поле maxImportMs задаёт бюджет холодного импорта index.py
+(замер в чистом интерпретаторе, см. import_report.py).
+
+Исходящие соединения к внешним хостам (Telegram, соседние функции) блокируются,
+чтобы замеры не зависели от сети; --allow-network снимает ограничение.
+
+Блоки кода, скопированные между функциями (SHARED_BLOCKS), сверяются между копиями:
+функции деплоятся по отдельности, и общий модуль им недоступен.
+'''
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import socket
+import sys
+import time
+from types import ModuleType, SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import psycopg2
+
+from import_report import measure_import
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+TYPE_PLACEHOLDERS = {
+    'array': list,
+    'object': dict,
+    'string': str,
+    'number': (int, float),
+    'boolean': bool,
+}
+
+LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1'}
+
+# Начальная метка блока -> файлы, в которых он должен совпадать; блок заканчивается меткой "# ==== Конец"
+SHARED_BLOCKS = {
+    '# ==== Токен сессии': ('auth/index.py', 'admin-auth/index.py'),
+}
+
+class QueryCounter:
+    def __init__(self):
+        self.queries = 0
+        self.connections = 0
+
+    def reset(self) -> None:
+        self.queries = 0
+        self.connections = 0
+
+class CountingCursor:
+    def __init__(self, cursor, counter: QueryCounter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, query, params=None):
+        self._counter.queries += 1
+        return self._cursor.execute(query, params)
+
+    def executemany(self, query, params_seq):
+        self._counter.queries += 1
+        return self._cursor.executemany(query, params_seq)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._cursor.__exit__(exc_type, exc, tb)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class CountingConnection:
+    def __init__(self, conn, counter: QueryCounter):
+        self._conn = conn
+        self._counter = counter
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self._conn.cursor(*args, **kwargs), self._counter)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+def install_query_counter(counter: QueryCounter) -> None:
+    original_connect = psycopg2.connect
+
+    def counting_connect(*args, **kwargs):
+        counter.connections += 1
+        return CountingConnection(original_connect(*args, **kwargs), counter)
+
+    psycopg2.connect = counting_connect
+
+def block_external_network() -> None:
+    original_create_connection = socket.create_connection
+
+    def guarded_create_connection(address, *args, **kwargs):
+        host = address[0] if isinstance(address, tuple) else address
+        if host not in LOCAL_HOSTS:
+            raise OSError(f'Outbound connection to {host} blocked by test runner')
+        return original_create_connection(address, *args, **kwargs)
+
+    socket.create_connection = guarded_create_connection
+
+def run_setup_sql(sql: str) -> None:
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+        conn.commit()
+    finally:
+        conn.close()
+
+def load_handler_module(function_name: str) -> ModuleType:
+    path = os.path.join(BACKEND_DIR, function_name, 'index.py')
+    module_name = 'backend_' + function_name.replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def build_event(test: Dict[str, Any]) -> Dict[str, Any]:
+    parts = urlsplit(test.get('path', '/'))
+    body = test.get('body')
+    if body is not None and not isinstance(body, str):
+        body = json.dumps(body)
+    return {
+        'httpMethod': test.get('method', 'GET'),
+        'path': parts.path or '/',
+        'headers': test.get('headers', {}),
+        'queryStringParameters': dict(parse_qsl(parts.query)),
+        'body': body if body is not None else '',
+        'isBase64Encoded': False,
+    }
+
+def match_value(expected: Any, actual: Any, partial: bool) -> bool:
+    if isinstance(expected, str) and expected in TYPE_PLACEHOLDERS and actual != expected:
+        expected_type = TYPE_PLACEHOLDERS[expected]
+        return isinstance(actual, expected_type) and not (expected == 'number' and isinstance(actual, bool))
+    if isinstance(expected, dict):
+        if not isinstance(actual, dict):
+            return False
+        if not partial and set(expected) != set(actual):
+            return False
+        return all(key in actual and match_value(value, actual[key], partial) for key, value in expected.items())
+    if isinstance(expected, list):
+        if not isinstance(actual, list) or len(expected) != len(actual):
+            return False
+        return all(match_value(e, a, partial) for e, a in zip(expected, actual))
+    return expected == actual
+
+def check_test(test: Dict[str, Any], response: Dict[str, Any], elapsed_ms: float,
+               counter: QueryCounter) -> List[str]:
+    failures = []
+    status = response.get('statusCode')
+    body = response.get('body', '')
+    body_bytes = len(body.encode('utf-8')) if isinstance(body, str) else len(body or b'')
+
+    if 'expectedStatus' in test and status != test['expectedStatus']:
+        failures.append(f'status {status} != {test["expectedStatus"]}')
+
+    if 'expectedBody' in test:
+        partial = test.get('bodyMatcher', 'exact') == 'partial'
+        expected = test['expectedBody']
+        if isinstance(expected, str):
+            matched = body == expected
+        else:
+            try:
+                matched = match_value(expected, json.loads(body), partial)
+            except ValueError:
+                matched = False
+        if not matched:
+            failures.append(f'body mismatch: {body[:200]}')
+
+    if 'maxLatencyMs' in test and elapsed_ms > test['maxLatencyMs']:
+        failures.append(f'latency {elapsed_ms:.1f}ms > {test["maxLatencyMs"]}ms')
+    if 'maxQueries' in test and counter.queries > test['maxQueries']:
+        failures.append(f'queries {counter.queries} > {test["maxQueries"]}')
+    if 'maxResponseBytes' in test and body_bytes > test['maxResponseBytes']:
+        failures.append(f'response {body_bytes}B > {test["maxResponseBytes"]}B')
+    return failures
+
+def run_function(function_name: str, counter: QueryCounter, verbose: bool) -> Tuple[int, int]:
+    tests_path = os.path.join(BACKEND_DIR, function_name, 'tests.json')
+    with open(tests_path, encoding='utf-8') as f:
+        spec = json.load(f)
+    tests = spec.get('tests', [])
+
+    passed = 0
+    total = len(tests)
+    if 'maxImportMs' in spec:
+        total += 1
+        report = measure_import(function_name)
+        summary = f'{report["importMs"]:8.1f}ms  heavy: {", ".join(report["heavy"]) or "none"}'
+        if report['importMs'] > spec['maxImportMs']:
+            print(f'FAIL {function_name}: cold import  {summary}')
+            print(f'       - import {report["importMs"]:.1f}ms > {spec["maxImportMs"]}ms')
+        else:
+            passed += 1
+            if verbose:
+                print(f'PASS {function_name}: cold import  {summary}')
+
+    module = load_handler_module(function_name)
+    for index, test in enumerate(tests):
+        event = build_event(test)
+        context = SimpleNamespace(request_id=f'{function_name}-test-{index}', function_name=function_name)
+
+        if 'setupSql' in test:
+            run_setup_sql(test['setupSql'])
+
+        counter.reset()
+        # Трейс-строки handler печатает в stdout - показываем их только для упавших тестов
+        output = io.StringIO()
+        started = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(output):
+                response = module.handler(event, context)
+        except Exception as e:
+            response = {'statusCode': None, 'body': f'{type(e).__name__}: {e}'}
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        failures = check_test(test, response, elapsed_ms, counter)
+        body = response.get('body') or ''
+        summary = (f'{elapsed_ms:8.1f}ms  q={counter.queries:<3d} conn={counter.connections:<2d} '
+                   f'{len(body.encode("utf-8")) if isinstance(body, str) else 0:>8d}B')
+        if failures:
+            print(f'FAIL {function_name}: {test.get("name", index)}  {summary}')
+            for failure in failures:
+                print(f'       - {failure}')
+            for line in output.getvalue().splitlines():
+                print(f'       | {line}')
+        else:
+            passed += 1
+            if verbose:
+                print(f'PASS {function_name}: {test.get("name", index)}  {summary}')
+    return passed, total
+
+def extract_block(path: str, marker: str) -> Optional[str]:
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    start = content.find(marker)
+    end = content.find('# ==== Конец', start)
+    if start < 0 or end < 0:
+        return None
+    return content[start:end]
+
+def check_shared_blocks(verbose: bool) -> Tuple[int, int]:
+    passed = 0
+    for marker, paths in SHARED_BLOCKS.items():
+        blocks = [extract_block(os.path.join(BACKEND_DIR, path), marker) for path in paths]
+        if None in blocks or len(set(blocks)) > 1:
+            print(f'FAIL shared block "{marker}" differs or is missing in {", ".join(paths)}')
+        else:
+            passed += 1
+            if verbose:
+                print(f'PASS shared block "{marker}" in {", ".join(paths)}')
+    return passed, len(SHARED_BLOCKS)
+
+def discover_functions() -> List[str]:
+    return sorted(
+        name for name in os.listdir(BACKEND_DIR)
+        if os.path.isfile(os.path.join(BACKEND_DIR, name, 'tests.json'))
+        and os.path.isfile(os.path.join(BACKEND_DIR, name, 'index.py'))
+    )
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Run backend tests.json in-process with latency/query budgets')
+    parser.add_argument('functions', nargs='*', help='Function directories under backend/ (default: all)')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'),
+                        help='Seeded database (default: $DATABASE_URL)')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra environment variables for handlers (secrets)')
+    parser.add_argument('--allow-network', action='store_true', help='Do not block outbound connections')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print passing tests too')
+    return parser.parse_args(argv)
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.dsn:
+        os.environ['DATABASE_URL'] = args.dsn
+    for item in args.env:
+        key, _, value = item.partition('=')
+        os.environ[key] = value
+
+    counter = QueryCounter()
+    install_query_counter(counter)
+    if not args.allow_network:
+        block_external_network()
+
+    total_passed, total = check_shared_blocks(args.verbose)
+    for function_name in args.functions or discover_functions():
+        passed, count = run_function(function_name, counter, args.verbose)
+        total_passed += passed
+        total += count
+
+    print(f'{total_passed}/{total} tests passed')
+    return 0 if total_passed == total else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+'''
+Business: Локальная заглушка Telegram Bot API для нагрузочных прогонов и реплея без настоящего Telegram
+Args: --port, --latency-ms/--jitter-ms (задержка ответа), --rate-limit и --failure-rate (доля ответов 429 и 502),
+      --record файл NDJSON для записи всех вызовов; бот направляется на заглушку через TELEGRAM_API_URL
+Returns: HTTP-сервер до Ctrl-C, затем сводка вызовов по методам и статусам
+
+Поддерживает методы, которыми пользуется бот: sendMessage, editMessageText, editMessageReplyMarkup,
+answerCallbackQuery, deleteWebhook, getMe, а также getUpdates (обновления кладутся через push_update).
+'''
+
+import argparse
+import http.server
+import json
+import random
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+MAX_POLL_TIMEOUT = 50
+
+def error(status: int, description: str, **parameters) -> Tuple[int, Dict[str, Any]]:
+    body = {'ok': False, 'error_code': status, 'description': description}
+    if parameters:
+        body['parameters'] = parameters
+    return status, body
+
+class StubRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        # Без TCP_NODELAY маленькие ответы на keep-alive ждут delayed ACK и искажают замеры
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().setup()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        try:
+            payload = json.loads(raw or b'{}')
+        except ValueError:
+            payload = None
+        method = self.path.rsplit('/', 1)[-1]
+        status, body = self.server.stub.handle(method, payload)
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class BotApiStub:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 rate_limit: float = 0.0, retry_after: int = 1, failure_rate: float = 0.0,
+                 record_path: Optional[str] = None, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.failure_rate = failure_rate
+        self.calls: List[Dict[str, Any]] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._updates: List[Dict[str, Any]] = []
+        self._updates_ready = threading.Condition(self._lock)
+        self._next_message_id = 1
+        self._record = open(record_path, 'a', encoding='utf-8') if record_path else None
+        self.server = http.server.ThreadingHTTPServer((host, port), StubRequestHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'BotApiStub':
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self._record:
+            self._record.close()
+
+    def push_update(self, update: Dict[str, Any]) -> None:
+        '''Обновление, которое получит следующий getUpdates (для проверки long polling)'''
+        with self._updates_ready:
+            self._updates.append(update)
+            self._updates_ready.notify_all()
+
+    def counts(self) -> Counter:
+        with self._lock:
+            return Counter((call['method'], call['status']) for call in self.calls)
+
+    def handle(self, method: str, payload: Any) -> Tuple[int, Dict[str, Any]]:
+        started = time.time()
+        if method != 'getUpdates':
+            delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+            if delay > 0:
+                time.sleep(delay / 1000)
+
+        if not isinstance(payload, dict):
+            status, body = error(400, "Bad Request: can't parse JSON")
+        elif method != 'getUpdates' and self._random.random() < self.rate_limit:
+            status, body = error(429, f'Too Many Requests: retry after {self.retry_after}',
+                                 retry_after=self.retry_after)
+        elif method != 'getUpdates' and self._random.random() < self.failure_rate:
+            status, body = error(502, 'Bad Gateway')
+        else:
+            status, body = self.dispatch(method, payload)
+
+        call = {
+            'ts': round(started, 3),
+            'method': method,
+            'status': status,
+            'ms': round((time.time() - started) * 1000, 2),
+            'payload': payload
+        }
+        with self._lock:
+            self.calls.append(call)
+            if self._record:
+                self._record.write(json.dumps(call, ensure_ascii=False) + '\n')
+                self._record.flush()
+        return status, body
+
+    def dispatch(self, method: str, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        if method == 'sendMessage':
+            if 'chat_id' not in payload:
+                return error(400, 'Bad Request: chat_id is empty')
+            text = payload.get('text') or ''
+            if not text.strip():
+                return error(400, 'Bad Request: message text is empty')
+            if len(text) > TELEGRAM_MESSAGE_LIMIT:
+                return error(400, 'Bad Request: message is too long')
+            with self._lock:
+                message_id = self._next_message_id
+                self._next_message_id += 1
+            return 200, {'ok': True, 'result': self.message(payload, message_id)}
+
+        if method in ('editMessageText', 'editMessageReplyMarkup'):
+            if 'chat_id' not in payload or 'message_id' not in payload:
+                return error(400, 'Bad Request: message identifier is not specified')
+            if method == 'editMessageText' and not (payload.get('text') or '').strip():
+                return error(400, 'Bad Request: message text is empty')
+            return 200, {'ok': True, 'result': self.message(payload, payload['message_id'])}
+
+        if method == 'answerCallbackQuery':
+            if not payload.get('callback_query_id'):
+                return error(400, 'Bad Request: query is too old and response timeout expired or query ID is invalid')
+            return 200, {'ok': True, 'result': True}
+
+        if method in ('deleteWebhook', 'setWebhook', 'deleteMessage'):
+            return 200, {'ok': True, 'result': True}
+
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot'}}
+
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': self.get_updates(payload)}
+
+        return error(404, 'Not Found')
+
+    def message(self, payload: Dict[str, Any], message_id: int) -> Dict[str, Any]:
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': payload['chat_id']},
+            'text': payload.get('text', '')
+        }
+        if payload.get('reply_markup'):
+            message['reply_markup'] = payload['reply_markup']
+        return message
+
+    def get_updates(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(payload.get('offset') or 0)
+        deadline = time.time() + min(float(payload.get('timeout') or 0), MAX_POLL_TIMEOUT)
+        with self._updates_ready:
+            # offset подтверждает всё, что ниже него - как в настоящем Bot API
+            self._updates = [update for update in self._updates if update['update_id'] >= offset]
+            while not self._updates and time.time() < deadline:
+                self._updates_ready.wait(deadline - time.time())
+            return list(self._updates[:100])
+
+def format_counts(counts: Counter) -> str:
+    lines = [f'{"method":<26} {"status":>6} {"calls":>7}']
+    for (method, status), count in sorted(counts.items()):
+        lines.append(f'{method:<26} {status:>6} {count:>7}')
+    return '\n'.join(lines)
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Run a local Telegram Bot API stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Mean response latency')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Uniform +/- jitter around the latency')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Share of calls answered with 429 (0..1)')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after sent with 429 responses')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of calls answered with 502 (0..1)')
+    parser.add_argument('--record', metavar='FILE', help='Append every call to FILE as NDJSON')
+    parser.add_argument('--seed', type=int, help='Seed for reproducible 429/502 injection')
+    return parser.parse_args(argv)
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    stub = BotApiStub(args.host, args.port, args.latency_ms, args.jitter_ms, args.rate_limit,
+                      args.retry_after, args.failure_rate, args.record, args.seed)
+    print(f'Bot API stub listening on {stub.url} (set TELEGRAM_API_URL={stub.url})', file=sys.stderr)
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.stop()
+    print(format_counts(stub.counts()))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+'''
+Business: Офлайн-агрегация JSON-трейсов вызовов backend-функций в перцентили задержки
+Args: файлы с логами функций (или stdin); строки, не являющиеся трейсами, пропускаются
+Returns: Таблица p50/p95/p99 по функции, ресурсу, действию и холодному/тёплому старту
+
+Проверка percentile: python3 -m doctest scripts/trace_report.py
+'''
+
+import argparse
+import fileinput
+import json
+import math
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+METRICS = ('totalMs', 'connectMs', 'dbMs', 'httpMs')
+
+def percentile(values: List[float], pct: float) -> float:
+    '''Nearest rank: наименьшее значение, не меньше которого pct% выборки
+
+    >>> percentile(list(range(1, 11)), 50)
+    5
+    >>> percentile(list(range(1, 21)), 95)
+    19
+    >>> percentile(list(range(1, 101)), 7)
+    7
+    '''
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # pct * n / 100, а не pct / 100 * n: иначе ошибка округления даёт лишний ранг (7% от 100 -> 8)
+    index = max(0, math.ceil(pct * len(ordered) / 100) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+def read_traces(paths: Sequence[str]):
+    for line in fileinput.input(files=paths or ('-',)):
+        # Платформа может добавлять к строке префикс - ищем начало JSON-объекта
+        start = line.find('{"type": "invocation"')
+        if start < 0:
+            continue
+        try:
+            yield json.loads(line[start:])
+        except ValueError:
+            continue
+
+def aggregate(traces, metric: str) -> Dict[Tuple, List[float]]:
+    groups: Dict[Tuple, List[float]] = defaultdict(list)
+    for trace in traces:
+        key = (trace.get('function'), trace.get('resource') or '-', trace.get('action') or '-',
+               'cold' if trace.get('coldStart') else 'warm')
+        groups[key].append(float(trace.get(metric) or 0))
+    return groups
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Latency percentiles from invocation trace lines')
+    parser.add_argument('paths', nargs='*', help='Log files (default: stdin)')
+    parser.add_argument('--metric', choices=METRICS, default='totalMs')
+    args = parser.parse_args(argv)
+
+    groups = aggregate(read_traces(args.paths), args.metric)
+    print(f'{"function":14s} {"resource":16s} {"action":22s} {"start":5s} {"n":>6s} '
+          f'{"p50":>9s} {"p95":>9s} {"p99":>9s} {"max":>9s}')
+    for key in sorted(groups, key=lambda k: tuple(str(part) for part in k)):
+        values = groups[key]
+        function, resource, action, start = key
+        print(f'{str(function):14s} {resource:16s} {action:22s} {start:5s} {len(values):6d} '
+              f'{percentile(values, 50):9.1f} {percentile(values, 95):9.1f} '
+              f'{percentile(values, 99):9.1f} {max(values):9.1f}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,6 +19,15 @@ interface AuthContextType {
 
 const AuthContext = createContext<AuthContextType | undefined>(undefined);
 
+// Токен выдаётся, только если на бэкенде задан AUTH_TOKEN_SECRET
+const saveAuthToken = (token?: string) => {
+  if (token) {
+    localStorage.setItem('authToken', token);
+  } else {
+    localStorage.removeItem('authToken');
+  }
+};
+
 export const useAuth = () => {
   const context = useContext(AuthContext);
   if (!context) {
@@ -49,6 +58,7 @@ export const AuthProvider = ({ children }: { children: ReactNode }) => {
             setUser(adminUser);
             localStorage.setItem('user', JSON.stringify(adminUser));
             localStorage.setItem('groupId', groupId);
+            saveAuthToken(data.token);
           }
         } catch (error) {
           console.error('Auth by groupId failed:', error);
@@ -75,6 +85,7 @@ export const AuthProvider = ({ children }: { children: ReactNode }) => {
       };
       setUser(userData);
       localStorage.setItem('user', JSON.stringify(userData));
+      saveAuthToken(response.token);
     } catch (error) {
       console.error('Login failed:', error);
       throw error;
@@ -97,6 +108,7 @@ export const AuthProvider = ({ children }: { children: ReactNode }) => {
         setUser(adminUser);
         localStorage.setItem('user', JSON.stringify(adminUser));
         localStorage.setItem('groupId', groupId);
+        saveAuthToken(data.token);
       } else {
         throw new Error('Access denied');
       }
@@ -112,6 +124,7 @@ export const AuthProvider = ({ children }: { children: ReactNode }) => {
     setUser(null);
     localStorage.removeItem('user');
     localStorage.removeItem('groupId');
+    localStorage.removeItem('authToken');
   };
 
   const isAdmin = user?.role === 'admin';
@@ -5,6 +5,10 @@ interface ApiResponse<T> {
   [key: string]: T;
 }
 
+// Метка последней записи (по часам сервера, заголовок X-Write-At).
+// Пока она свежая, бэкенд читает с primary, а не с реплики - видим свои изменения.
+let lastWriteAt: string | null = null;
+
 async function apiRequest<T>(
   resource: string,
   method: string = 'GET',
@@ -25,11 +29,21 @@ async function apiRequest<T>(
     url += `&id=${body.id}`;
   }
   
+  const headers: Record<string, string> = {
+    'Content-Type': 'application/json',
+  };
+  if (lastWriteAt) {
+    headers['X-Last-Write-At'] = lastWriteAt;
+  }
+  // Подписанный токен от auth/admin-auth: api проверяет его на админских запросах
+  const authToken = localStorage.getItem('authToken');
+  if (authToken) {
+    headers['X-Auth-Token'] = authToken;
+  }
+  
   const options: RequestInit = {
     method,
-    headers: {
-      'Content-Type': 'application/json',
-    },
+    headers,
   };
 
   if (body && (method === 'POST' || method === 'PUT')) {
@@ -38,6 +52,11 @@ async function apiRequest<T>(
 
   const response = await fetch(url, options);
   
+  const writeAt = response.headers.get('X-Write-At');
+  if (writeAt) {
+    lastWriteAt = writeAt;
+  }
+  
   // Для 409 (конфликт) и 500 (ошибка с деталями) возвращаем JSON
   if (response.status === 409 || response.status === 500 || response.status === 400) {
     try {